@@ -9,13 +9,15 @@ from utils.git_utils import *
 from utils.startup_banner import display_startup_banner, display_shutdown_banner, get_ascii_banner
 from utils.knowledge_base import create_knowledge_base
 from utils.crawler_utils import crawl_and_create_kb
+from utils.streaming_utils import ProgressStream, SSE_HEADERS
+from utils.llm_gateway import LLMGateway, get_llm_governor
 import html as _html
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from uuid import uuid4
 import subprocess
 from utils.tts_utils import *
+from utils.tts_engine import TTSBusyError, TTS_PRELOAD, get_tts_engine
 from fastapi_mcp import FastApiMCP
 import json
 import os
@@ -52,13 +54,13 @@ def init_components():
 
         # instantiate generative LLM
         print(f"Initializing LLM: {llm_model_name} ({llm_type})...", flush=True)
-        llm = get_generative_model(
+        llm = LLMGateway(get_generative_model(
             model_name=llm_model_name,
             type=llm_type,
             base_url=openai_compatible.get(llm_type, 'https://api.openai.com/v1'),
             _tools=None,
             kwargs=llm_kwargs
-        )
+        ))
         print("LLM initialized successfully", flush=True)
 
         # load embeddings and cross-encoder
@@ -70,7 +72,7 @@ def init_components():
         print("Embeddings and cross-encoder loaded successfully", flush=True)
 
         print("Initializing text splitter...", flush=True)
-        text_splitter = TokenTextSplitter(chunk_size=128, chunk_overlap=32)
+        text_splitter = get_token_splitter(chunk_size=128, chunk_overlap=32)
 
         # recreate searxng searcher
         print(f"Initializing SearchWeb with {HOST_SEARXNG}:{PORT_NUM_SEARXNG}...", flush=True)
@@ -138,20 +140,20 @@ else:
     except Exception:
         print("SearxNG docker container is already running.")
 
-llm = get_generative_model(
+llm = LLMGateway(get_generative_model(
     model_name=llm_model_name,
     type=llm_type,
     base_url=llm_base_url,
     _tools=None,
     kwargs=llm_kwargs
-)
+))
 
 hf_embeddings, cross_encoder = load_model(embedding_model_name, 
                                           _embed_mode=embed_mode,
                                           cross_encoder_name=cross_encoder_name,
                                           kwargs=embed_kwargs)
 
-text_splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=128)
+text_splitter = get_token_splitter(chunk_size=512, chunk_overlap=128)
 
 searcher = SearchWeb(PORT_NUM_SEARXNG, HOST_SEARXNG)
 date, day = get_local_data()
@@ -169,6 +171,8 @@ async def lifespan(app_instance):
     app_state['message'] = 'Initializing components...'
     try:
         init_components()
+        if TTS_PRELOAD:
+            await get_tts_engine().start()
         print("="*80 + "\n", flush=True)
     except Exception as e:
         print(f"STARTUP ERROR: {e}", flush=True)
@@ -179,6 +183,8 @@ async def lifespan(app_instance):
     yield
     # Shutdown
     logger.info("FastAPI app shutting down...")
+    shutdown_map_render_pool()
+    get_tts_engine().shutdown()
     app_state['status'] = 'shutting_down'
     app_state['message'] = 'App shutting down'
 
@@ -298,6 +304,12 @@ async def status():
         return app_state
 
 
+@app.get('/admin/llm-metrics')
+async def admin_llm_metrics():
+    """Return LLM gateway metrics: in-flight and queued calls, queue times, retries, errors and tokens."""
+    return get_llm_governor().metrics()
+
+
 @app.get('/admin/config')
 async def admin_get_config():
     """Return the effective model_config plus helper globals for the admin UI."""
@@ -428,6 +440,8 @@ class CrawlerRequest(BaseModel):
     max_delay: float = 2.0  # Maximum delay between requests in seconds
     max_pages: int = 10000  # Maximum number of pages to collect during crawling
     url_keyword: Optional[str] = ""  # Optional keyword to filter URLs by presence in the URL string
+    resume: bool = False  # Resume an interrupted crawl of the same site from its saved state
+    incremental: bool = False  # Update the existing knowledge base, re-embedding only changed pages
 
 @app.post('/clickable-elements', operation_id="get_website_structure")
 async def get_website_structure(request: ClickableElementRequest):
@@ -546,6 +560,47 @@ async def websearch(request: WebSearchRequest):
     except:
         return "No Websites found, Try rephrasing query"
 
+@app.post('/web-search-stream', operation_id="get_web_search_stream")
+async def websearch_stream(request: WebSearchRequest):
+    """
+    Streaming variant of /web-search over Server-Sent Events.
+    Emits `progress` events as the pipeline advances (stage: plan, search, fetched, retrieval, summarize),
+    then `token` events with answer deltas, and finally a `done` event with the full result and sources
+    (or an `error` event).
+    Args:
+        Same as /web-search.
+
+    Returns:
+        text/event-stream: The event stream.
+    """
+    stream = ProgressStream()
+
+    async def pipeline():
+        result = await query_web_response(
+            query=request.query,
+            date=date,
+            day=day,
+            websearcher=searcher,
+            hf_embeddings=hf_embeddings,
+            rerank=request.rerank,
+            cross_encoder=cross_encoder,
+            model=llm,
+            text_model=llm,
+            num_results=min(2,request.num_results),
+            document_paths=request.document_paths,
+            local_mode=request.local_mode,
+            split=request.split,
+            vectordb=request.vectordb,
+            quick_answer=request.quick_answer,
+            stream=stream
+        )
+        if not result or result[0] is None:
+            stream.emit("error", message="No Websites found, Try rephrasing query")
+            return
+        stream.emit("done", result=result[0], sources=result[1])
+
+    return StreamingResponse(stream.sse_events(pipeline()), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post('/create-knowledge-base', operation_id="get_knowledge_base")
 async def create_kb(request: KnowledgeBaseRequest):
     """
@@ -581,6 +636,8 @@ async def crawl_kb(request: CrawlerRequest):
         max_delay: Maximum delay between requests in seconds (default: 3.0)
         max_pages: Maximum number of pages to collect during crawling (default: 100)
         url_keyword: Optional keyword to filter URLs by presence in the URL string
+        resume: Resume an interrupted crawl of the same site from its saved state
+        incremental: Update the existing knowledge base, re-embedding only changed pages
         
     Returns:
         str: Message with the collection name and list of scraped URLs.
@@ -595,7 +652,9 @@ async def crawl_kb(request: CrawlerRequest):
             max_delay=request.max_delay,
             max_pages=request.max_pages,
             url_keyword=request.url_keyword,
-            hf_embeddings=hf_embeddings
+            hf_embeddings=hf_embeddings,
+            resume=request.resume,
+            incremental=request.incremental
         )
         return f"Crawled knowledge base created successfully. Collection name: {collection_name}. Scraped URLs: {scraped_urls}"
     except Exception as e:
@@ -622,6 +681,29 @@ async def websummarize(request: WebSummarizeRequest):
     except:
         return "URL is not reacheable, try different URL"
 
+@app.post('/web-summarize-stream', operation_id="get_web_summarize_stream")
+async def websummarize_stream(request: WebSummarizeRequest):
+    """Streaming variant of /web-summarize over Server-Sent Events.
+    Emits a `progress` event once the page is fetched, `token` events with summary deltas, and a final
+    `done` event with the full summary (or an `error` event).
+    Args:
+        Same as /web-summarize.
+    Returns:
+        text/event-stream: The event stream."""
+    stream = ProgressStream()
+
+    async def pipeline():
+        result = await summary_of_url(
+            query=request.query,
+            url=request.url,
+            model=llm,
+            local_mode=request.local_mode,
+            stream=stream
+        )
+        stream.emit("done", result=result)
+
+    return StreamingResponse(stream.sse_events(pipeline()), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post('/youtube-search', operation_id="get_youtube_search")
 async def youtube_search(request: YouTubeSearchRequest):
     """Performs a YouTube search and return summaries of it.
@@ -632,7 +714,7 @@ async def youtube_search(request: YouTubeSearchRequest):
     Returns:
         str: response from the YouTube transcripts based on the given query"""
     # You may need to adjust the model argument as per your setup
-    result = youtube_transcript_response(
+    result = await youtube_transcript_response(
         request.query,
         request.prompt,
         n = request.n, #number of videos to summarise
@@ -658,7 +740,7 @@ async def reddit_search(request: RedditSearchRequest):
     # You may need to adjust the model argument as per your setup
     if request.search_query:
         request.url_type = 'search'
-    result = reddit_reader_response(
+    result = await reddit_reader_response(
         subreddit=request.subreddit,
         url_type=request.url_type,
         n=request.n,
@@ -684,7 +766,7 @@ async def map_search(request: MapSearchRequest):
             else by default is "route_and_pois" - if route and POIs are needed.
     Returns:
         dict: location or route and POIs or both"""
-    result = generate_map(request.start_location,
+    result = await agenerate_map(request.start_location,
                         request.end_location,
                         pois_radius=request.pois_radius,
                         amenities=request.amenities,
@@ -767,21 +849,20 @@ Text: {request.text}
     podcast_segments = await parse_podcast(result.content, voice_choices)
 
     try:
-        if os.path.exists("output/podcasts") is False:
-            os.makedirs("output/podcasts")
-        file_path = f"output/podcasts/podcast_{str(uuid4())[:8]}.wav"
-        _ = await podcasting(podcast_segments, filename=file_path)
-        logger.info(f"Current working directory: {os.getcwd()}")
-        
+        file_path = await podcasting(podcast_segments)
+        if not file_path:
+            return {"error": "Error occurred while creating podcast: no audio was generated"}
         logger.info(f"Podcast file created at: {file_path}")
         try:
             return FileResponse(
             file_path,
             media_type="audio/wav",
-            filename=os.path.basename(file_path)
+            filename=f"podcast_{os.path.basename(file_path)[:8]}.wav"
             )
         except:
             return f"Generated podcast and stored at {file_path}"
+    except TTSBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '10'})
     except Exception as e:
         return {"error": f"Error occurred while creating podcast: {e}"}
 
@@ -803,25 +884,29 @@ async def basic_tts(request: BasicTTSRequest):
     lang = request.lang
     filename = request.filename
 
-    if not filename:
-        filename = f"output/basic_tts_{str(uuid4())[:8]}.wav"
-
     if not text:
         return {"error": "Text is required for TTS."}
 
     try:
-        await text_to_speech(text, voice, filename, lang)
+        # Without a filename the cached audio file is served directly
+        file_path = await text_to_speech(text, voice, filename, lang)
+        if not file_path:
+            return {"error": "Error occurred while creating TTS: audio could not be saved"}
         return FileResponse(
-            filename,
+            file_path,
             media_type="audio/wav",
-            filename=os.path.basename(filename)
+            filename=os.path.basename(filename) if filename else f"basic_tts_{os.path.basename(file_path)[:8]}.wav"
         )
+    except TTSBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '10'})
     except Exception as e:
         return {"error": f"Error occurred while creating TTS: {e}"}
     
     
 mcp = FastApiMCP(app,include_operations=['get_web_search',
+                                         'get_web_search_stream',
                                          'get_web_summarize',
+                                         'get_web_summarize_stream',
                                          'get_youtube_search',
                                          'get_reddit_search',
                                          'get_map_search',
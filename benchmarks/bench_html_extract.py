@@ -0,0 +1,95 @@
+"""
+Benchmark the HTML-to-markdown engines in utils/html_extract.py over a saved corpus of pages.
+
+Usage:
+    # Save a corpus once (one URL per line in urls.txt)
+    python benchmarks/bench_html_extract.py --save urls.txt --corpus ./bench_corpus
+    # Compare engines
+    python benchmarks/bench_html_extract.py --corpus ./bench_corpus --repeat 3
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.html_extract import ENGINES
+
+
+def save_corpus(urls_file, corpus_dir):
+    import requests
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    with open(urls_file) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    for url in urls:
+        try:
+            response = requests.get(url, headers=headers, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"skip {url}: {e}")
+            continue
+        name = hashlib.md5(url.encode()).hexdigest()[:12] + '.html'
+        with open(os.path.join(corpus_dir, name), 'wb') as out:
+            out.write(response.content)
+        print(f"saved {url} -> {name} ({len(response.content)} bytes)")
+
+
+def load_corpus(corpus_dir):
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith(('.html', '.htm')):
+            with open(os.path.join(corpus_dir, name), 'rb') as f:
+                pages.append(f.read())
+    return pages
+
+
+def run(pages, engines, repeat):
+    total_bytes = sum(len(p) for p in pages)
+    results = {}
+    for name in engines:
+        func = ENGINES[name]
+        errors = 0
+        out_chars = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                try:
+                    out_chars += len(func(page))
+                except Exception:
+                    errors += 1
+        elapsed = time.perf_counter() - start
+        n = len(pages) * repeat
+        results[name] = elapsed
+        print(
+            f"{name:12s} {n / elapsed:8.1f} pages/s  {total_bytes * repeat / elapsed / 1e6:7.2f} MB/s  "
+            f"avg output {out_chars // max(n, 1):7d} chars  errors {errors}"
+        )
+    if 'markdownify' in results:
+        for name, elapsed in results.items():
+            if name != 'markdownify':
+                print(f"{name} speedup over markdownify: {results['markdownify'] / elapsed:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', required=True, help='Directory of saved .html pages')
+    parser.add_argument('--save', help='File with URLs to download into the corpus directory first')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), help='Engines to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus per engine')
+    args = parser.parse_args()
+
+    if args.save:
+        save_corpus(args.save, args.corpus)
+    pages = load_corpus(args.corpus)
+    if not pages:
+        sys.exit(f"No .html files in {args.corpus}")
+    print(f"{len(pages)} pages, {sum(len(p) for p in pages) / 1e6:.2f} MB, {args.repeat} passes")
+    run(pages, args.engines, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,26 @@
 import logging
 import asyncio
+import os
 from typing import Union
 from pydantic import BaseModel, Field
 
 from utils.config import *
 from utils.utils import *
 from utils.utils import get_local_data
+from utils.dedup_utils import filter_near_duplicates
+from utils.streaming_utils import astream_text
+from utils.chunking_utils import count_tokens, split_text_on_tokens
+from utils.llm_gateway import BATCH, llm_priority
 
 logger = logging.getLogger(__name__)
 
+# Token budget of the documents packed into one summarization call
+SUMMARY_BATCH_TOKENS = int(os.environ.get('SUMMARY_BATCH_TOKENS', 6000))
+# Summarization calls in flight at once, shared by all requests
+SUMMARY_MAX_CONCURRENCY = int(os.environ.get('SUMMARY_MAX_CONCURRENCY', 4))
+# Reduce rounds before the remaining partial summaries are trimmed into one final call
+SUMMARY_MAX_ROUNDS = int(os.environ.get('SUMMARY_MAX_ROUNDS', 6))
+
 date, day = get_local_data()
 
 
@@ -185,127 +197,193 @@ async def response_gen(model, query, context):
     return answer, sources
 
 
-async def summarizer(query, docs, llm, batch,max_docs=30,max_words_per_doc=3000):
+async def response_gen_stream(model, query, context, stream):
     """
-    Summarizes a list of documents iteratively in batches using an LLM.
+    Streaming variant of response_gen: generates the answer with the prompt-based template and
+    emits token deltas on `stream` as they arrive (structured output cannot be streamed).
+
+    Args:
+        model: The language model instance used for generating content.
+        query (str): The query for which a response is needed.
+        context (str): The context to be included in the response generation.
+        stream (ProgressStream): Where token deltas are emitted.
+
+    Returns:
+        tuple: The answer in markdown and an empty sources string.
+    """
+    logger.info("Streaming answer for query: %s", query)
+    prompt = prompts['qa_response_generation'].format(context=context, query=query)
+    response = await astream_text(model, prompt, stream)
+    return "#### Answer: \n" + response, ''
+
+
+def _response_text(response):
+    """Extracts the text of an LLM response (message objects, plain strings or provider-specific types)."""
+    if hasattr(response, 'content') and not callable(response.content):
+        return response.content
+    if hasattr(response, 'text') and not callable(response.text):
+        return response.text
+    if hasattr(response, 'content') and callable(response.content):
+        return response.content()
+    if hasattr(response, 'text') and callable(response.text):
+        return response.text()
+    return str(response)
+
+
+_summary_semaphores = {}
+
+
+def get_summary_semaphore(max_concurrency: int = SUMMARY_MAX_CONCURRENCY) -> asyncio.Semaphore:
+    """Returns the process-wide semaphore limiting in-flight summarization calls."""
+    if max_concurrency not in _summary_semaphores:
+        _summary_semaphores[max_concurrency] = asyncio.Semaphore(max_concurrency)
+    return _summary_semaphores[max_concurrency]
+
+
+def _pack_batches(items, max_tokens, max_items=None):
+    """Greedily packs (text, tokens) items, in order, into batches of at most `max_tokens` tokens."""
+    batches, current, current_tokens = [], [], 0
+    for text, tokens in items:
+        if current and (current_tokens + tokens > max_tokens or (max_items and len(current) >= max_items)):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((text, tokens))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def summarizer(query, docs, llm, batch=None, max_batch_tokens=SUMMARY_BATCH_TOKENS,
+                     max_concurrency=SUMMARY_MAX_CONCURRENCY, stream=None):
+    """
+    Map-reduce summarization of documents, batched by token count.
+
+    Documents are packed in order into batches that fill `max_batch_tokens`; documents too long
+    for one batch are split into token chunks rather than truncated. Each round summarizes its
+    batches concurrently (bounded by a shared semaphore) and the summaries are packed again until
+    a single batch remains, which produces the final summary. A batch holding a single summary is
+    carried into the next round as-is, and a batch whose call fails is retried once and otherwise
+    carried forward trimmed, so no document is dropped silently.
 
     Args:
         query (str): The initial query guiding the summarization.
         docs (list): A list of documents to be summarized.
         llm: The language model instance used for generating content.
-        batch (int): The number of documents to process in each batch.
+        batch (int, optional): Maximum number of documents per batch. Defaults to no limit.
+        max_batch_tokens (int): Token budget of the documents in one call.
+        max_concurrency (int): Maximum number of summarization calls in flight (shared across requests).
+        stream (ProgressStream, optional): If given, progress is reported on it and the final
+            summary is streamed as token deltas.
 
     Returns:
-        list: A summarized version of the input documents.
+        str: The summary, or 'SUMMARIZATION FAILED'.
     """
 
     if not docs or not isinstance(docs, list):
         logger.warning("No documents provided or docs is not a list.")
         return []
     logger.info(f"Deduping docs: {len(docs)}")
-    logger.warning(f"Capping max words to {max_words_per_doc}")
-    docs = list(set([f'source:{k.metadata["source"]}\ncontent:{" ".join(k.page_content.split(" ")[:max_words_per_doc])}' for k in docs]))
+    docs = [f'source:{k.metadata["source"]}\ncontent:{k.page_content}' for k in docs]
+    docs = filter_near_duplicates(dict.fromkeys(docs), lambda d: d.split('\ncontent:', 1)[-1])
     logger.info(f"Arrived Len of Docs: {len(docs)}")
-    len_docs = len(docs)
-    if len_docs == 1:
-        logger.info("Only one document provided, summarizing it.")
-        try:
-            comb_docs = f'Document 0: {str(docs[0])}'
-            prompt = prompts['summary_generation'].format(comb_docs=comb_docs, query=query)
-            response = await llm.ainvoke(prompt)
-            logger.info(f"Response type: {type(response)}")
-            logger.info(f"Response attributes: {dir(response)}")
-            logger.info(f"Response: {response}")
-            
-            # Handle different response types from async LLM calls
-            if hasattr(response, 'content') and not callable(response.content):
-                summary_text = response.content
-            elif hasattr(response, 'text') and not callable(response.text):
-                summary_text = response.text
-            elif hasattr(response, 'content') and callable(response.content):
-                # If content is a method, call it
-                summary_text = response.content()
-            elif hasattr(response, 'text') and callable(response.text):
-                # If text is a method, call it
-                summary_text = response.text()
-            else:
-                summary_text = str(response)
-            
-            if summary_text and isinstance(summary_text, str):
-                return summary_text.strip()
-            else:
-                logger.warning("Empty or invalid summary for single document.")
-                return 'SUMMARIZATION FAILED'
-        except Exception as e:
-            logger.error(f"Summarization failed for single document: {e}")
-            return 'SUMMARIZATION FAILED'
-
-    print(f"Summarising using {len_docs} documents")
-    if len_docs > max_docs:
-        logger.warning(f"Too many documents ({len_docs}) provided, limiting to {max_docs}. This may lead to loss of information.")
-        docs = docs[:max_docs]
-        len_docs = max_docs
-    while len_docs > 1:
-        summaries = []
-        
-        # Create async tasks for parallel batch processing
-        async def process_batch(batch_docs, batch_index):
-            if not batch_docs:
-                return None
-            
-            comb_docs = '\n'.join(
-                [f'Document {j+batch_index}:' + str(d) for j, d in enumerate(batch_docs)]
-            )
-            
+
+    overhead = count_tokens(prompts['summary_generation'].format(comb_docs='', query=query))
+    budget = max(256, max_batch_tokens - overhead)
+    items = []
+    for d in docs:
+        tokens = count_tokens(d)
+        if tokens <= budget:
+            items.append((d, tokens))
+            continue
+        # Long documents are split into budget-sized pieces, each keeping its source line
+        source, content = d.split('\ncontent:', 1)
+        piece_budget = budget - count_tokens(source) - 8
+        for piece in split_text_on_tokens(content, chunk_size=piece_budget, chunk_overlap=0):
+            text = f'{source}\ncontent:{piece}'
+            items.append((text, count_tokens(text)))
+    logger.info(f"Summarising {len(docs)} documents as {len(items)} items "
+                f"({sum(t for _, t in items)} tokens, {budget} tokens per batch)")
+    semaphore = get_summary_semaphore(max_concurrency)
+
+    async def summarize_batch(batch_items, batch_index, final=False):
+        comb_docs = '\n'.join(
+            [f'Document {j+batch_index}:' + text for j, (text, _) in enumerate(batch_items)]
+        )
+        prompt = prompts['summary_generation'].format(comb_docs=comb_docs, query=query)
+        for attempt in range(2):
             try:
-                prompt = prompts['summary_generation'].format(comb_docs=comb_docs, query=query)
-                response = await llm.ainvoke(prompt)
-                # Handle different response types from async LLM calls
-                if hasattr(response, 'content') and not callable(response.content):
-                    summary_text = response.content
-                elif hasattr(response, 'text') and not callable(response.text):
-                    summary_text = response.text
-                elif hasattr(response, 'content') and callable(response.content):
-                    # If content is a method, call it
-                    summary_text = response.content()
-                elif hasattr(response, 'text') and callable(response.text):
-                    # If text is a method, call it
-                    summary_text = response.text()
-                else:
-                    summary_text = str(response)
-                
+                async with semaphore:
+                    if final and stream is not None:
+                        summary_text = await astream_text(llm, prompt, stream)
+                    elif final:
+                        summary_text = _response_text(await llm.ainvoke(prompt))
+                    else:
+                        # Map steps yield to interactive calls of other requests
+                        with llm_priority(BATCH):
+                            summary_text = _response_text(await llm.ainvoke(prompt))
                 if summary_text and isinstance(summary_text, str):
                     return summary_text.strip()
-                else:
-                    logger.warning(f"Empty or invalid summary for batch starting at {batch_index}.")
-                    return None
+                logger.warning(f"Empty or invalid summary for batch starting at {batch_index}.")
             except Exception as e:
-                logger.error(f"Async summarization failed for batch starting at {batch_index}: {e}")
-                return None
-        
-        # Create tasks for all batches
-        batch_tasks = []
-        for i in range(0, len_docs, batch):
-            batch_docs = docs[i:i + batch]
-            batch_tasks.append(process_batch(batch_docs, i))
-        
-        # Execute all batch tasks in parallel
-        if batch_tasks:
-            logger.info(f"Processing {len(batch_tasks)} batches in parallel")
-            batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
-            
-            # Collect successful results
-            for result in batch_results:
-                if isinstance(result, Exception):
-                    logger.error(f"Batch processing failed: {result}")
-                elif result is not None:
-                    summaries.append(result)
-
-        if not summaries:
-            logger.error("No summaries generated in this async iteration, aborting.")
-            return 'SUMMARIZATION FAILED'
-
-        len_docs = len(summaries)
-        docs = summaries
-
-    return '\n'.join(docs)
+                logger.error(f"Summarization failed for batch starting at {batch_index} (attempt {attempt + 1}): {e}")
+        return None
+
+    for round_index in range(SUMMARY_MAX_ROUNDS):
+        batches = _pack_batches(items, budget, batch)
+        if stream is not None:
+            stream.emit("progress", stage="summarize", round=round_index, documents=len(items), batches=len(batches))
+        if len(batches) == 1:
+            summary = await summarize_batch(batches[0], 0, final=True)
+            return summary if summary else 'SUMMARIZATION FAILED'
+
+        logger.info(f"Round {round_index}: summarizing {len(items)} items in {len(batches)} batches "
+                    f"(max {max_concurrency} in flight)")
+        tasks, offset = [], 0
+        for batch_items in batches:
+            if len(batch_items) == 1 and round_index > 0:
+                # A lone partial summary gains nothing from being summarized again
+                tasks.append(None)
+            else:
+                tasks.append(summarize_batch(batch_items, offset))
+            offset += len(batch_items)
+        results = await asyncio.gather(*[t for t in tasks if t is not None])
+        results = iter(results)
+
+        next_items = []
+        for batch_items, task in zip(batches, tasks):
+            if task is None:
+                next_items.extend(batch_items)
+                continue
+            summary = next(results)
+            if summary:
+                next_items.append((summary, count_tokens(summary)))
+            else:
+                # Keep the batch's content, trimmed to an even share of the batch budget
+                share = max(32, budget // (2 * len(batch_items)))
+                logger.warning(f"Carrying {len(batch_items)} unsummarized documents into the next round")
+                for text, tokens in batch_items:
+                    if tokens > share:
+                        text = split_text_on_tokens(text, chunk_size=share, chunk_overlap=0)[0]
+                        tokens = count_tokens(text)
+                    next_items.append((text, tokens))
+
+        if len(next_items) >= len(items):
+            # No batch could be merged (every partial summary fills half a batch or calls failed)
+            items = next_items
+            break
+        items = next_items
+
+    # Did not converge: give every remaining item an equal share of one final batch. Each item
+    # needs at least 32 tokens plus its "Document N:" label, so the lowest ranked items (last in
+    # source order) are dropped when there are more than the budget can hold.
+    max_items = max(1, budget // (32 + 8))
+    if len(items) > max_items:
+        logger.warning(f"Dropping {len(items) - max_items} lowest ranked items to fit the final batch")
+        items = items[:max_items]
+    share = budget // len(items) - 8
+    logger.warning(f"Summarization did not converge; trimming {len(items)} items to {share} tokens each")
+    items = [(split_text_on_tokens(text, chunk_size=share, chunk_overlap=0)[0], min(tokens, share))
+             for text, tokens in items]
+    summary = await summarize_batch(items, 0, final=True)
+    return summary if summary else 'SUMMARIZATION FAILED'
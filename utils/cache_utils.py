@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache whose entries expire after a time-to-live, bounded by entry count
+    (least recently used entries are evicted first).
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        """
+        Args:
+            ttl (float): Default lifetime of an entry in seconds (0 disables the cache).
+            max_entries (int): Maximum number of entries kept.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_MISSING = object()
+
+
+class SQLiteTTLCache:
+    """
+    Persistent key-value cache with per-entry TTLs, stored in SQLite. Values must be JSON
+    serializable; entries are grouped by namespace so one file can serve several caches.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, expires_at REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            # Drop what expired while the process was down
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                             (namespace, key, json.dumps(value), time.time() + ttl))
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock, self._db:
+            if namespace is None:
+                self._db.execute("DELETE FROM cache")
+            else:
+                self._db.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from langchain.docstore.document import Document
+from langchain_text_splitters import MarkdownHeaderTextSplitter, TokenTextSplitter
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by TokenTextSplitter by default, kept so chunk boundaries do not change
+TOKEN_ENCODING = os.environ.get('CHUNK_TOKEN_ENCODING', 'gpt2')
+# Total characters of chunk text kept in the chunk cache (0 disables it)
+CHUNK_CACHE_MAX_CHARS = int(os.environ.get('CHUNK_CACHE_MAX_CHARS', 50_000_000))
+
+HEADERS_TO_SPLIT_ON = [
+    ("#", "Header 1"),
+    ("##", "Header 2"),
+    ("###", "Header 3"),
+]
+
+_markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=HEADERS_TO_SPLIT_ON)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name: str = TOKEN_ENCODING):
+    """Returns a shared tiktoken encoding (loading an encoding is expensive, so it is done once)."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def encode(text: str, encoding_name: str = TOKEN_ENCODING) -> List[int]:
+    # Special-token strings inside page text are treated as plain text
+    return get_tokenizer(encoding_name).encode(text, disallowed_special=())
+
+
+def count_tokens(text: str, encoding_name: str = TOKEN_ENCODING) -> int:
+    """
+    Counts the tokens of a text with the shared tokenizer.
+
+    Args:
+        text (str): The text.
+        encoding_name (str): tiktoken encoding name.
+
+    Returns:
+        int: Number of tokens.
+    """
+    if not text:
+        return 0
+    return len(encode(text, encoding_name))
+
+
+@lru_cache(maxsize=None)
+def get_token_splitter(chunk_size: int = 512, chunk_overlap: int = 128) -> TokenTextSplitter:
+    """Returns a shared TokenTextSplitter for the given parameters."""
+    return TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+class ChunkCache:
+    """
+    LRU cache of token chunks keyed by content hash and chunking parameters, bounded by the
+    total number of cached characters. Lets repeated pages and re-ingested files skip re-chunking.
+    """
+
+    def __init__(self, max_chars: int = CHUNK_CACHE_MAX_CHARS):
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, chunk_size: int, chunk_overlap: int, encoding_name: str = TOKEN_ENCODING) -> str:
+        digest = hashlib.sha1(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+        return f"{digest}:{encoding_name}:{chunk_size}:{chunk_overlap}"
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            chunks = self._entries.get(key)
+            if chunks is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return chunks
+
+    def put(self, key: str, chunks: List[str]):
+        size = sum(len(c) for c in chunks)
+        if not self.max_chars or size > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = chunks
+            self._chars += size
+            while self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= sum(len(c) for c in evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+
+_chunk_cache = ChunkCache()
+
+
+def get_chunk_cache() -> ChunkCache:
+    """Get the process-wide chunk cache"""
+    return _chunk_cache
+
+
+def split_text_on_tokens(text: str, chunk_size: int = 512, chunk_overlap: int = 128,
+                         encoding_name: str = TOKEN_ENCODING, use_cache: bool = True) -> List[str]:
+    """
+    Splits text into windows of `chunk_size` tokens overlapping by `chunk_overlap` tokens,
+    with the same boundaries as TokenTextSplitter. The text is encoded once; results are cached.
+
+    Args:
+        text (str): The text to split.
+        chunk_size (int): Tokens per chunk.
+        chunk_overlap (int): Tokens shared by consecutive chunks.
+        encoding_name (str): tiktoken encoding name.
+        use_cache (bool): Whether to use the chunk cache.
+
+    Returns:
+        List[str]: The chunks.
+    """
+    if not text:
+        return []
+    cache = get_chunk_cache()
+    key = cache.key(text, chunk_size, chunk_overlap, encoding_name) if use_cache else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    tokenizer = get_tokenizer(encoding_name)
+    ids = tokenizer.encode(text, disallowed_special=())
+    if len(ids) <= chunk_size:
+        chunks = [text]
+    else:
+        chunks = []
+        step = max(1, chunk_size - chunk_overlap)
+        start = 0
+        while start < len(ids):
+            end = min(start + chunk_size, len(ids))
+            chunks.append(tokenizer.decode(ids[start:end]))
+            if end == len(ids):
+                break
+            start += step
+
+    if key is not None:
+        cache.put(key, chunks)
+    return chunks
+
+
+def chunk_documents(docs: List[Document], chunk_size: int = 512, chunk_overlap: int = 128,
+                    encoding_name: str = TOKEN_ENCODING) -> List[Document]:
+    """
+    Token-splits documents (drop-in for TokenTextSplitter.split_documents) using the shared
+    tokenizer and chunk cache. Each chunk gets a copy of its document's metadata.
+
+    Args:
+        docs (List[Document]): Documents to split.
+        chunk_size (int): Tokens per chunk.
+        chunk_overlap (int): Tokens shared by consecutive chunks.
+        encoding_name (str): tiktoken encoding name.
+
+    Returns:
+        List[Document]: The chunked documents.
+    """
+    chunked = []
+    for doc in docs:
+        for chunk in split_text_on_tokens(doc.page_content, chunk_size, chunk_overlap, encoding_name):
+            chunked.append(Document(page_content=chunk, metadata=dict(doc.metadata)))
+    cache = get_chunk_cache()
+    logger.info(f"Chunked {len(docs)} documents into {len(chunked)} chunks (cache hits {cache.hits}, misses {cache.misses})")
+    return chunked
+
+
+def markdown_to_docs(markdown_content: str, url: str, split: bool = True) -> List[Document]:
+    """
+    Builds the section documents for a converted page: splits on markdown headers (with the
+    shared splitter) when `split` is set, and wraps each section with its header path.
+
+    Args:
+        markdown_content (str): The page markdown.
+        url (str): Source URL or path, stored in metadata.
+        split (bool): Split on '#', '##' and '###' headers.
+
+    Returns:
+        List[Document]: Documents with 'source' and 'url' metadata.
+    """
+    if split:
+        sections = _markdown_splitter.split_text(markdown_content)
+    else:
+        sections = [Document(page_content=markdown_content)]
+    for doc in sections:
+        metadata = doc.metadata
+        section = f"{metadata.get('Header 1', '')} {metadata.get('Header 2', '')} {metadata.get('Header 3', '')}"
+        metadata['source'] = f"{url} Section: {section}"
+        metadata['url'] = url
+        doc.page_content = f" Section: {section}<content>{doc.page_content.strip()}</content>"
+    return sections
+
+
+def chunk_markdown(markdown_content: str, url: str, chunk_size: int = 512, chunk_overlap: int = 128) -> List[Document]:
+    """
+    One-pass header + token chunking: splits a page on markdown headers and token-splits only the
+    sections longer than `chunk_size` tokens.
+
+    Returns:
+        List[Document]: Chunks with section metadata.
+    """
+    return chunk_documents(markdown_to_docs(markdown_content, url, split=True), chunk_size, chunk_overlap)
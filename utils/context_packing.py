@@ -0,0 +1,149 @@
+import logging
+import os
+import re
+from collections import defaultdict
+from typing import List, Optional
+
+from utils.chunking_utils import encode, get_tokenizer, count_tokens
+from utils.dedup_utils import section_text
+
+logger = logging.getLogger(__name__)
+
+# Token budget of the context handed to response_gen (0 disables packing)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 6000))
+# Share of the budget reserved for search-engine snippets
+SNIPPET_BUDGET_SHARE = float(os.environ.get('SNIPPET_BUDGET_SHARE', 0.15))
+# Maximum tokens kept per search snippet
+SNIPPET_MAX_TOKENS = int(os.environ.get('SNIPPET_MAX_TOKENS', 96))
+# A chunk is trimmed to fit the remaining budget only if at least this many content tokens remain
+MIN_TRIMMED_TOKENS = int(os.environ.get('MIN_TRIMMED_TOKENS', 48))
+
+_SUBQUERY = re.compile(r'Subquery:\s*(.*?)\s*\n')
+# Source markers of web chunks/snippets, local files and vector DB results, in priority order
+_SOURCES = (re.compile(r'url:\s*(\S+)'), re.compile(r'File:\s*(\S+)'), re.compile(r'search result: (\S+)'))
+_CONTENT = re.compile(r'<content>(.*?)</content>', re.DOTALL)
+
+
+class ContextSection:
+    """One retrieved chunk or search snippet of the response context."""
+
+    def __init__(self, text: str, position: int):
+        self.text = text
+        self.position = position
+        subquery = _SUBQUERY.search(text)
+        self.subquery = subquery.group(1) if subquery else None
+        self.is_snippet = self.subquery is None and 'search result::' in text
+        self.source = next((m.group(1) for m in (p.search(text) for p in _SOURCES) if m), '')
+        self.rank = 0
+        self.tokens = count_tokens(text)
+
+    def trimmed(self, max_tokens: int) -> Optional[str]:
+        """Returns the section with its content cut so the whole section fits in `max_tokens`, or None."""
+        match = _CONTENT.search(self.text)
+        if not match:
+            return None
+        content = match.group(1)
+        content_budget = max_tokens - (self.tokens - count_tokens(content)) - 1  # room for the ellipsis
+        if content_budget < MIN_TRIMMED_TOKENS:
+            return None
+        content = get_tokenizer().decode(encode(content)[:content_budget]).rstrip() + ' ...'
+        return self.text[:match.start(1)] + content + self.text[match.end(1):]
+
+
+def parse_sections(context: List[str]) -> List[ContextSection]:
+    """
+    Parses context sections (as produced by context_to_docs and split on </content>).
+
+    Chunks keep their retrieval order, which is the rerank order when reranking is enabled; `rank`
+    is the position of a chunk among the chunks retrieved for the same subquery and source.
+    """
+    sections = []
+    seen = defaultdict(int)
+    for i, text in enumerate(context):
+        if not text or not section_text(text):
+            continue
+        section = ContextSection(text, i)
+        key = (section.subquery, section.source)
+        section.rank = seen[key]
+        seen[key] += 1
+        sections.append(section)
+    return sections
+
+
+def _pick_chunks(chunks: List[ContextSection], budget: int):
+    """
+    Round-robin over subqueries so each subquery gets covered; within a subquery, picks the best
+    ranked chunk from the least used source so one page cannot fill the budget.
+    """
+    queues = defaultdict(list)
+    for section in chunks:
+        queues[section.subquery].append(section)
+    order = list(queues)
+    source_use = defaultdict(int)
+    selected, used = {}, 0
+
+    while order and used < budget:
+        for subquery in list(order):
+            queue = queues[subquery]
+            if not queue:
+                order.remove(subquery)
+                continue
+            best = min(queue, key=lambda s: (source_use[s.source], s.rank, s.position))
+            queue.remove(best)
+            remaining = budget - used
+            text = best.text if best.tokens <= remaining else best.trimmed(remaining)
+            if text is None:
+                continue
+            selected[best.position] = text
+            used += best.tokens if text is best.text else count_tokens(text)
+            source_use[best.source] += 1
+    return selected, used
+
+
+def pack_context(context: List[str], budget: int = CONTEXT_TOKEN_BUDGET,
+                 snippet_share: float = SNIPPET_BUDGET_SHARE,
+                 snippet_max_tokens: int = SNIPPET_MAX_TOKENS) -> List[str]:
+    """
+    Fits the context sections into a token budget.
+
+    Retrieved chunks are picked by rerank order, spread across sources and across subqueries, and
+    the last one is trimmed to the remaining budget. Search snippets are trimmed to
+    `snippet_max_tokens` each and fill the reserved snippet share plus whatever the chunks left.
+    Selected sections keep their original order.
+
+    Args:
+        context (List[str]): Context sections (deduplicated).
+        budget (int): Token budget; 0 or less returns the context unchanged.
+        snippet_share (float): Share of the budget reserved for search snippets.
+        snippet_max_tokens (int): Maximum tokens per snippet.
+
+    Returns:
+        List[str]: The packed sections.
+    """
+    if budget <= 0:
+        return context
+    sections = parse_sections(context)
+    chunks = [s for s in sections if not s.is_snippet]
+    snippets = [s for s in sections if s.is_snippet]
+    total = sum(s.tokens for s in sections)
+    if total <= budget:
+        return [s.text for s in sections]
+
+    snippet_budget = int(budget * snippet_share) if snippets else 0
+    selected, used = _pick_chunks(chunks, budget - snippet_budget)
+
+    remaining = budget - used
+    for section in snippets:
+        if remaining <= 0:
+            break
+        limit = min(snippet_max_tokens, remaining)
+        text = section.text if section.tokens <= limit else section.trimmed(limit)
+        if text is None:
+            continue
+        selected[section.position] = text
+        remaining -= section.tokens if text is section.text else count_tokens(text)
+
+    packed = [selected[p] for p in sorted(selected)]
+    logger.info(f"Packed context: {len(sections)} sections / {total} tokens -> "
+                f"{len(packed)} sections / {budget - remaining} tokens (budget {budget})")
+    return packed
@@ -0,0 +1,313 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Parent-side cache of converted markdown (number of documents, 0 disables it)
+CONVERTER_CACHE_SIZE = int(os.environ.get('CONVERTER_CACHE_SIZE', 256))
+# Concurrent LLM captioning calls for images
+IMAGE_CONVERTER_CONCURRENCY = int(os.environ.get('IMAGE_CONVERTER_CONCURRENCY', 2))
+# Rows rendered per CSV file before the table is cut off
+CSV_MAX_ROWS = int(os.environ.get('CSV_MAX_ROWS', 5000))
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tiff', '.svg')
+
+
+class Converter:
+    """
+    A registered document converter.
+
+    Attributes:
+        name (str): Registry name.
+        func (callable): func(url, content, resource) -> markdown. `content` holds the raw bytes
+            (read from disk for local files when `needs_bytes` is set) and `resource` is the
+            object built by `loader`.
+        mime_types (tuple): MIME types handled by this converter.
+        extensions (tuple): File extensions handled by this converter.
+        loader (callable, optional): Builds the heavy resource (library instance, client) on first
+            use; it is created once per worker process.
+        max_concurrency (int, optional): Maximum number of conversions in flight at once.
+        cache (bool): Whether converted results may be cached.
+        needs_bytes (bool): Whether func needs the document bytes rather than just its location.
+        source_prefix (bool): Prepend "Content from <url>" to the result.
+    """
+
+    def __init__(self, name: str, func: Callable, mime_types=(), extensions=(), loader: Optional[Callable] = None,
+                 max_concurrency: Optional[int] = None, cache: bool = False, needs_bytes: bool = True,
+                 source_prefix: bool = True):
+        self.name = name
+        self.func = func
+        self.mime_types = tuple(mime_types)
+        self.extensions = tuple(extensions)
+        self.loader = loader
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.needs_bytes = needs_bytes
+        self.source_prefix = source_prefix
+        self._resource = None
+        self._lock = threading.Lock()
+
+    def resource(self):
+        if self.loader is None:
+            return None
+        if self._resource is None:
+            with self._lock:
+                if self._resource is None:
+                    logger.info(f"Loading converter '{self.name}'")
+                    self._resource = self.loader()
+        return self._resource
+
+    def convert(self, url: str, content, local: bool = False) -> str:
+        if self.needs_bytes and local and not content:
+            with open(url, 'rb') as f:
+                content = f.read()
+        return self.prefix(url) + self.func(url, content, self.resource())
+
+    def prefix(self, url: str) -> str:
+        """The "Content from <url>" line convert() puts in front of its result ('' if disabled)."""
+        return f"Content from {url}\n\n" if self.source_prefix else ''
+
+
+_registry = OrderedDict()
+_by_mime = {}
+_by_extension = {}
+
+
+def register_converter(converter: Converter):
+    """Registers a converter; later registrations override earlier ones for the same MIME type/extension."""
+    _registry[converter.name] = converter
+    for mime in converter.mime_types:
+        _by_mime[mime] = converter
+    for ext in converter.extensions:
+        _by_extension[ext] = converter
+
+
+def get_converter(url: str, content_type: str = '') -> Converter:
+    """
+    Looks up the converter for a document by MIME type, then by file extension.
+
+    Args:
+        url (str): URL or local path of the document.
+        content_type (str): Content-Type header ('internal_pdf' for local files).
+
+    Returns:
+        Converter: The matching converter, or the MarkItDown fallback.
+    """
+    mime = (content_type or '').split(';', 1)[0].strip().lower()
+    if mime in _by_mime:
+        return _by_mime[mime]
+    path = urlparse(url).path if '://' in url else url
+    ext = os.path.splitext(path.lower())[1]
+    if ext in _by_extension:
+        return _by_extension[ext]
+    if mime.startswith('image/'):
+        return _registry['image']
+    if mime.startswith('text/') and mime != 'text/html':
+        return _registry['text']
+    return _registry['markitdown']
+
+
+# --- converter implementations -----------------------------------------------------
+
+def _decode(content) -> str:
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        from charset_normalizer import from_bytes
+        best = from_bytes(content).best()
+        return str(best) if best is not None else content.decode('utf-8', errors='replace')
+
+
+def _convert_html(url, content, resource):
+    from utils.html_extract import html_to_markdown
+    return html_to_markdown(content)
+
+
+def _convert_pdf(url, content, resource):
+    import fitz
+    import pymupdf4llm
+    if not content:
+        return pymupdf4llm.to_markdown(url)
+    from markdownify import markdownify
+    pdf_document = fitz.open(stream=content, filetype="pdf")
+    return markdownify(pymupdf4llm.to_markdown(pdf_document))
+
+
+def _convert_text(url, content, resource):
+    return _decode(content)
+
+
+def _rows_to_markdown(rows) -> str:
+    lines = []
+    width = 0
+    for i, row in enumerate(rows):
+        if i >= CSV_MAX_ROWS:
+            lines.append(f"\n[Truncated after {CSV_MAX_ROWS} rows]")
+            break
+        cells = ['' if c is None else str(c).replace('|', '\\|').replace('\n', ' ') for c in row]
+        if i == 0:
+            width = len(cells)
+            lines.append('| ' + ' | '.join(cells) + ' |')
+            lines.append('|' + ' --- |' * width)
+        else:
+            cells = (cells + [''] * width)[:max(width, len(cells))]
+            lines.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(lines)
+
+
+def _convert_csv(url, content, resource):
+    text = _decode(content)
+    if url.lower().endswith('.tsv'):
+        delimiter = '\t'
+    else:
+        try:
+            delimiter = csv.Sniffer().sniff(text[:4096], delimiters=',;\t|').delimiter
+        except csv.Error:
+            delimiter = ','
+    return _rows_to_markdown(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+def _convert_json(url, content, resource):
+    text = _decode(content)
+    try:
+        if url.lower().endswith(('.jsonl', '.ndjson')):
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+            body = '\n'.join(json.dumps(r, ensure_ascii=False) for r in records)
+        else:
+            body = json.dumps(json.loads(text), indent=2, ensure_ascii=False)
+    except json.JSONDecodeError:
+        # Truncated or malformed documents are kept as-is
+        body = text
+    return f"```json\n{body}\n```"
+
+
+def _load_markitdown():
+    from markitdown import MarkItDown
+    return MarkItDown(enable_plugins=False) # Set to True to enable plugins
+
+
+def _convert_markitdown(url, content, resource):
+    return resource.convert(url).text_content
+
+
+def _load_image_captioner():
+    from markitdown import MarkItDown
+    from openai import OpenAI
+    from model_config import llm_api_key, model_config, openai_compatible
+    client = OpenAI(base_url=openai_compatible[model_config['llm_type']],
+                    api_key=llm_api_key)
+    return MarkItDown(llm_client=client,
+                      llm_model=model_config['llm_model_name'],
+                      llm_prompt='Answer in 2 sections 1. OCR output if there is any text (without losing structure) 2. What exactly is this?')
+
+
+def _convert_image(url, content, resource):
+    logger.info("Converting image to markdown caption")
+    return resource.convert(url).text_content
+
+
+register_converter(Converter('markitdown', _convert_markitdown, loader=_load_markitdown, cache=True, needs_bytes=False,
+                             mime_types=('application/msword',
+                                         'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                                         'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+                                         'application/vnd.ms-excel',
+                                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+                             extensions=('.docx', '.doc', '.pptx', '.xlsx', '.xls', '.epub')))
+register_converter(Converter('html', _convert_html, mime_types=('text/html', 'application/xhtml+xml'),
+                             extensions=('.html', '.htm', '.xhtml'), source_prefix=False))
+register_converter(Converter('pdf', _convert_pdf, mime_types=('application/pdf',), extensions=('.pdf',),
+                             cache=True, needs_bytes=False))
+register_converter(Converter('text', _convert_text, mime_types=('text/plain', 'text/markdown', 'text/x-rst', 'text/xml', 'application/xml'),
+                             extensions=('.txt', '.md', '.markdown', '.rst', '.log', '.text')))
+register_converter(Converter('csv', _convert_csv, mime_types=('text/csv', 'text/tab-separated-values'),
+                             extensions=('.csv', '.tsv')))
+register_converter(Converter('json', _convert_json, mime_types=('application/json', 'application/x-ndjson', 'application/ld+json'),
+                             extensions=('.json', '.jsonl', '.ndjson')))
+register_converter(Converter('image', _convert_image, loader=_load_image_captioner, cache=True, needs_bytes=False,
+                             max_concurrency=IMAGE_CONVERTER_CONCURRENCY, extensions=IMAGE_EXTENSIONS))
+
+
+# --- parent-side concurrency limits and cache -----------------------------------------
+
+_semaphores = {}
+
+
+def converter_semaphore(converter: Converter) -> Optional[asyncio.Semaphore]:
+    """Returns the asyncio semaphore limiting in-flight conversions for a converter, if it has a limit."""
+    if not converter.max_concurrency:
+        return None
+    if converter.name not in _semaphores:
+        _semaphores[converter.name] = asyncio.Semaphore(converter.max_concurrency)
+    return _semaphores[converter.name]
+
+
+class ConverterCache:
+    """
+    LRU cache of converted markdown, keyed by converter and document identity
+    (content hash for fetched bodies, path/mtime/size for local files; anything else is not cached).
+    Values are stored without the converter's source prefix, since the same bytes may be served
+    from several URLs; callers add `Converter.prefix(url)` back on a hit.
+    """
+
+    def __init__(self, max_entries: int = CONVERTER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(converter: Converter, url: str, content, local: bool = False) -> Optional[str]:
+        if not converter.cache:
+            return None
+        if local:
+            try:
+                stat = os.stat(url)
+            except OSError:
+                return None
+            identity = f"{os.path.abspath(url)}|{stat.st_mtime_ns}|{stat.st_size}"
+        elif content:
+            identity = hashlib.sha1(content).hexdigest()
+        else:
+            # Without a content hash a changed remote document could not be told apart
+            return None
+        return f"{converter.name}:{identity}"
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None or not self.max_entries:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Optional[str], value: Optional[str]):
+        if key is None or not value or not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_converter_cache = ConverterCache()
+
+
+def get_converter_cache() -> ConverterCache:
+    """Get the process-wide converter cache"""
+    return _converter_cache
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CRAWL_STATE_DIR = os.environ.get('CRAWL_STATE_DIR', './crawl_state')
+
+
+def default_state_path(base_url: str, depth: Optional[int] = None, url_keyword: Optional[str] = None) -> str:
+    """
+    Returns the state file used for a crawl of `base_url` with the given parameters.
+    """
+    host = urlparse(base_url).netloc.replace('.', '_').replace(':', '_') or 'crawl'
+    key = hashlib.md5(f"{base_url}|{depth}|{url_keyword or ''}".encode()).hexdigest()[:8]
+    return os.path.join(CRAWL_STATE_DIR, f"{host}_{key}.sqlite")
+
+
+def content_hash(text: str) -> str:
+    """SHA256 of page content, used to detect changed pages between crawls."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CrawlStateStore:
+    """
+    SQLite-backed crawl state that survives process restarts.
+
+    Keeps the crawl status and the URLs collected so far for the current run, plus per-URL
+    validators (ETag, Last-Modified), outgoing links and a content hash that persist across
+    runs so re-crawls can use conditional requests and only re-embed changed pages.
+    The same file holds the checkpointed CrawlFrontier.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS collected (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE, depth INTEGER)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "links TEXT, content_hash TEXT, checked_run INTEGER, not_modified INTEGER DEFAULT 0, updated_at REAL)"
+            )
+
+    # --- run lifecycle -------------------------------------------------------------
+    def _get_meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def run_id(self) -> int:
+        return int(self._get_meta('run_id', 0))
+
+    def is_in_progress(self) -> bool:
+        """True if a previous run was interrupted before completing."""
+        return self._get_meta('status') == 'running'
+
+    def start_run(self) -> int:
+        """Starts a new run: clears the collected list but keeps per-URL validators and hashes."""
+        run_id = self.run_id + 1
+        with self._db:
+            self._db.execute("DELETE FROM collected")
+        self._set_meta('run_id', run_id)
+        self._set_meta('status', 'running')
+        self._set_meta('started_at', time.time())
+        return run_id
+
+    def complete_run(self):
+        self._set_meta('status', 'complete')
+        self._set_meta('completed_at', time.time())
+
+    # --- collected URLs ------------------------------------------------------------
+    def add_collected(self, url: str, depth: int = 0):
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO collected (url, depth) VALUES (?, ?)", (url, depth))
+
+    def collected_urls(self) -> List[str]:
+        return [r[0] for r in self._db.execute("SELECT url FROM collected ORDER BY seq")]
+
+    def collected_with_links(self):
+        """Yields (url, depth, links) for pages collected in the current run whose links were recorded."""
+        rows = self._db.execute(
+            "SELECT c.url, c.depth, p.links FROM collected c JOIN pages p ON p.url = c.url "
+            "WHERE p.checked_run = ? AND p.links IS NOT NULL ORDER BY c.seq",
+            (self.run_id,)
+        ).fetchall()
+        for url, depth, links in rows:
+            yield url, depth, [l for l in links.split('\n') if l]
+
+    # --- per-URL state -------------------------------------------------------------
+    def get_page(self, url: str) -> Optional[dict]:
+        row = self._db.execute(
+            "SELECT etag, last_modified, links, content_hash, checked_run, not_modified, updated_at FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'links': None if row[2] is None else [l for l in row[2].split('\n') if l],
+            'content_hash': row[3],
+            'checked_run': row[4],
+            'not_modified': bool(row[5]),
+            'updated_at': row[6] or 0.0,
+        }
+
+    def conditional_headers(self, url: str) -> dict:
+        """Returns If-None-Match / If-Modified-Since headers for a previously fetched URL."""
+        page = self.get_page(url)
+        headers = {}
+        if page and page['links'] is not None:
+            if page['etag']:
+                headers['If-None-Match'] = page['etag']
+            if page['last_modified']:
+                headers['If-Modified-Since'] = page['last_modified']
+        return headers
+
+    def record_fetch(self, url: str, etag: Optional[str], last_modified: Optional[str], links: List[str]):
+        """Stores validators and outgoing links of a page fetched with status 200."""
+        with self._db:
+            self._db.execute(
+                "INSERT INTO pages (url, etag, last_modified, links, checked_run, not_modified, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?) ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, "
+                "last_modified = excluded.last_modified, links = excluded.links, checked_run = excluded.checked_run, "
+                "not_modified = 0, updated_at = excluded.updated_at",
+                (url, etag, last_modified, '\n'.join(links), self.run_id, time.time())
+            )
+
+    def record_not_modified(self, url: str):
+        """Marks a page as unchanged (HTTP 304) in the current run."""
+        with self._db:
+            self._db.execute(
+                "UPDATE pages SET checked_run = ?, not_modified = 1, updated_at = ? WHERE url = ?",
+                (self.run_id, time.time(), url)
+            )
+
+    def set_content_hash(self, url: str, digest: str):
+        with self._db:
+            self._db.execute(
+                "INSERT INTO pages (url, content_hash, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash, updated_at = excluded.updated_at",
+                (url, digest, time.time())
+            )
+
+    def unchanged_urls(self, urls: List[str]) -> set:
+        """URLs that answered 304 in the current run and were embedded before."""
+        unchanged = set()
+        for url in urls:
+            page = self.get_page(url)
+            if page and page['not_modified'] and page['checked_run'] == self.run_id and page['content_hash']:
+                unchanged.add(url)
+        return unchanged
+
+    def embedded_urls(self) -> List[str]:
+        """URLs whose content was embedded in a previous run."""
+        return [r[0] for r in self._db.execute("SELECT url FROM pages WHERE content_hash IS NOT NULL")]
+
+    def forget(self, urls: List[str]):
+        with self._db:
+            self._db.executemany("UPDATE pages SET content_hash = NULL WHERE url = ?", [(u,) for u in urls])
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
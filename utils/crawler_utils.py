@@ -2,7 +2,7 @@ import asyncio
 import aiohttp
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import logging
 import re
 import time
@@ -10,38 +10,46 @@ import random
 from typing import List, Optional, Union
 from utils.knowledge_base import create_knowledge_base
 from utils.websearch_utils import urls_to_docs
-from langchain_text_splitters import TokenTextSplitter
-from utils.retriever_utils import create_vectorstore_async
+from utils.chunking_utils import chunk_documents
+from utils.dedup_utils import dedup_documents
+from utils.retriever_utils import create_vectorstore_async, update_vectorstore_async
+from utils.crawl_frontier import CrawlFrontier, SeenSet, canonicalize_url
+from utils.crawl_state import CrawlStateStore, content_hash, default_state_path
+from utils.sitemap_utils import get_sitemap_entries
 import chromadb
 from chromadb.config import Settings
 import hashlib
-import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
 
-def get_sitemap_urls(base_url: str, headers: dict) -> List[str]:
+def extract_links(content, page_url: str) -> List[str]:
     """
-    Attempt to fetch and parse sitemap.xml for additional URLs.
+    Extracts canonical absolute URLs of all anchors and frames on a page.
     """
-    sitemap_urls = []
-    sitemap_url = urljoin(base_url, '/sitemap.xml')
-    try:
-        response = requests.get(sitemap_url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            for loc in root.iter('{http://www.sitemaps.org/schemas/sitemap/0.9}loc'):
-                url = loc.text
-                if url and urlparse(url).netloc == urlparse(base_url).netloc:
-                    sitemap_urls.append(url)
-            logger.info(f"Found {len(sitemap_urls)} URLs in sitemap")
-    except Exception as e:
-        logger.info(f"No sitemap found or error parsing: {e}")
-    return sitemap_urls
+    soup = BeautifulSoup(content, 'lxml')
+    links = []
+    for link in soup.find_all('a', href=True):
+        links.append(link['href'])
+    for frame in soup.find_all(['frame', 'iframe'], src=True):
+        links.append(frame['src'])
+    canonical = []
+    for href in links:
+        url = canonicalize_url(href, base_url=page_url)
+        if url:
+            canonical.append(url)
+    return canonical
 
-def crawl_website(base_url: str, depth: Optional[int] = None, max_pages: int = 100, min_delay: float = 1.0, max_delay: float = 3.0, url_keyword: Optional[str] = None) -> List[str]:
+def crawl_website(base_url: str, depth: Optional[int] = None, max_pages: int = 100, min_delay: float = 1.0, max_delay: float = 3.0, url_keyword: Optional[str] = None, max_frontier_in_memory: int = 50000, state_path: Optional[str] = None, checkpoint_every: int = 20) -> List[str]:
     """
     Crawl a website starting from base_url up to the specified depth (or full website if depth is None).
     Includes random delays between requests to avoid rate limiting.
+    URLs are canonicalized (host case, default ports, trailing slashes, tracking params) and
+    deduplicated through a CrawlFrontier, so variants of the same page are only visited once.
+
+    With a state_path, progress is persisted in a CrawlStateStore: an interrupted crawl resumes
+    where it stopped, and pages fetched in earlier runs are requested conditionally
+    (If-None-Match / If-Modified-Since) with their stored links reused on 304. Sitemap URLs whose
+    lastmod predates the previous fetch are not requested at all.
     
     Args:
         base_url: The starting URL to crawl
@@ -50,14 +58,17 @@ def crawl_website(base_url: str, depth: Optional[int] = None, max_pages: int = 1
         min_delay: Minimum delay between requests in seconds (default: 1.0)
         max_delay: Maximum delay between requests in seconds (default: 3.0)
         url_keyword: Optional keyword to filter URLs by presence in the URL string
+        max_frontier_in_memory: Queued URLs kept in memory before the frontier spills to disk
+        state_path: Optional SQLite file to persist crawl state in (see crawl_state.default_state_path)
+        checkpoint_every: Number of collected pages between frontier checkpoints when state_path is set
         
     Returns:
         List of URLs found during crawling
     """
-    visited = set()
-    collected_urls = set()
+    collected_urls = []
     
-    base_domain = urlparse(base_url).netloc
+    start_url = canonicalize_url(base_url) or base_url
+    base_domain = urlparse(start_url).netloc
     
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -67,172 +78,116 @@ def crawl_website(base_url: str, depth: Optional[int] = None, max_pages: int = 1
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
     }
-    
-    # Try to get URLs from sitemap
-    sitemap_urls = get_sitemap_urls(base_url, headers)
-    sitemap_urls = [url.split('#')[0].split('?')[0] for url in sitemap_urls if url not in visited][:max_pages // 2]  # Limit to half max_pages
-    if url_keyword:
-        sitemap_urls = [url for url in sitemap_urls if url_keyword.lower() in url.lower()]
-    
-    if depth is None:
-        # Full website crawl without depth limit
-        to_visit = [base_url] + sitemap_urls
-        
-        while to_visit and len(collected_urls) < max_pages:
-            current_url = to_visit.pop(0)
-            
-            if current_url in visited:
-                continue
-                
-            visited.add(current_url)
-            collected_urls.add(current_url)
-                
-            try:
-                # Use requests for simplicity, could be made async later
-                response = requests.get(current_url, headers=headers, timeout=15, allow_redirects=True)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'lxml')
-                
-                # Find all links (anchors and frames)
-                links = []
-                for link in soup.find_all('a', href=True):
-                    links.append(link['href'])
-                for frame in soup.find_all(['frame', 'iframe'], src=True):
-                    links.append(frame['src'])
-                
-                logger.info(f"Found {len(links)} links on {current_url}")
-                
-                for href in links:
-                    full_url = urljoin(current_url, href)
-                    
-                    # Only include URLs from the same domain
-                    if urlparse(full_url).netloc == base_domain and full_url not in visited:
-                        # Skip fragments and query params that don't change the page
-                        clean_url = full_url.split('#')[0].split('?')[0]
-                        if clean_url not in visited:
-                            if url_keyword and url_keyword.lower() not in clean_url.lower():
-                                continue
-                            to_visit.append(clean_url)
-                            
-                # Add random delay between requests to avoid rate limiting
-                delay = random.uniform(min_delay, max_delay)
-                logger.info(f"Waiting {delay:.2f} seconds before next request...")
-                time.sleep(delay)
-                            
-            except Exception as e:
-                logger.warning(f"Error crawling {current_url}: {e}")
-                # Still add a delay even on error to be respectful
-                delay = random.uniform(min_delay, min(max_delay, min_delay + 1.0))  # Shorter delay on error
-                time.sleep(delay)
-                continue
-    else:
-        # Depth-limited crawl
-        sitemap_urls = get_sitemap_urls(base_url, headers)
-        sitemap_urls = [url.split('#')[0].split('?')[0] for url in sitemap_urls if url not in visited][:max_pages // 2]  # Limit to half max_pages
-        if url_keyword:
-            sitemap_urls = [url for url in sitemap_urls if url_keyword.lower() in url.lower()]
-        
-        if depth == 0:
-            to_visit = [(base_url, 0)]
+
+    def keep(url):
+        if urlparse(url).netloc != base_domain:
+            return False
+        return not url_keyword or url_keyword.lower() in url.lower()
+
+    state = CrawlStateStore(state_path) if state_path else None
+    # Sitemap lastmod of seeded URLs, used to skip pages unchanged since the previous run
+    sitemap_lastmod = {}
+    resuming = bool(state and state.is_in_progress())
+
+    with CrawlFrontier(max_in_memory=max_frontier_in_memory, spill_path=state_path, resume=resuming) as frontier:
+        if resuming:
+            collected_urls = state.collected_urls()
+            for url in collected_urls:
+                frontier.seen.add(url)
+            # Re-expand visited pages: links queued after the last checkpoint are recovered from the stored outlinks
+            for url, url_depth, links in state.collected_with_links():
+                for link in links:
+                    if keep(link):
+                        frontier.push(link, depth=url_depth + 1)
+            logger.info(f"Resuming crawl of {base_url}: {len(collected_urls)} pages collected, {len(frontier)} queued")
         else:
-            # For depth > 0, first scrape the base_url to get immediate links
-            try:
-                response = requests.get(base_url, headers=headers, timeout=15, allow_redirects=True)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'lxml')
-                
-                # Find all links (anchors and frames)
-                links = []
-                for link in soup.find_all('a', href=True):
-                    links.append(link['href'])
-                for frame in soup.find_all(['frame', 'iframe'], src=True):
-                    links.append(frame['src'])
-                
-                initial_links = []
-                for href in links:
-                    full_url = urljoin(base_url, href)
-                    
-                    # Only include URLs from the same domain
-                    if urlparse(full_url).netloc == base_domain:
-                        # Skip fragments and query params that don't change the page
-                        clean_url = full_url.split('#')[0].split('?')[0]
-                        if url_keyword and url_keyword.lower() not in clean_url.lower():
-                            continue
-                        initial_links.append(clean_url)
-                
-                # Remove duplicates
-                initial_links = list(set(initial_links))
-                
-                # Add random delay after initial scrape
-                delay = random.uniform(min_delay, max_delay)
-                logger.info(f"Initial scrape done, waiting {delay:.2f} seconds...")
-                time.sleep(delay)
-                
-            except Exception as e:
-                logger.warning(f"Error scraping base_url {base_url}: {e}")
-                initial_links = []
-                # Still add a delay
-                delay = random.uniform(min_delay, min(max_delay, min_delay + 1.0))
-                time.sleep(delay)
-            
-            to_visit = [(url, 1) for url in initial_links + sitemap_urls]
-        
-        while to_visit and len(collected_urls) < max_pages:
-            current_url, current_depth = to_visit.pop(0)
-            
-            if current_url in visited or current_depth > depth:
+            if state:
+                state.start_run()
+                frontier.reset()
+        frontier.push(start_url, depth=0)
+
+        # Seed from the sitemaps (newest entries first, limited to half of max_pages). Also done when
+        # resuming, since seeded URLs may not have been checkpointed; the seen-set drops duplicates.
+        for url, lastmod in get_sitemap_entries(start_url, headers, max_urls=max_pages // 2, url_keyword=url_keyword):
+            url = canonicalize_url(url)
+            if url and keep(url):
+                frontier.push(url, depth=1)
+                if lastmod is not None:
+                    sitemap_lastmod[url] = lastmod
+
+        # Entries checkpointed before a restart may already have been collected afterwards
+        already_collected = SeenSet(collected_urls) if resuming else None
+
+        while frontier and len(collected_urls) < max_pages:
+            current_url, current_depth = frontier.pop()
+            if depth is not None and current_depth > depth:
                 continue
-                
-            visited.add(current_url)
-            collected_urls.add(current_url)
-            
-            if current_depth > depth:
+            if already_collected is not None and current_url in already_collected:
                 continue
-                
+
+            collected_urls.append(current_url)
+            if state:
+                state.add_collected(current_url, current_depth)
+                if len(collected_urls) % checkpoint_every == 0:
+                    frontier.checkpoint()
+
+            # Pages at the depth limit are collected but not expanded, so there is no need to fetch them here
+            if depth is not None and current_depth >= depth:
+                continue
+
+            if state and current_url in sitemap_lastmod:
+                page = state.get_page(current_url)
+                if page and page['links'] is not None and sitemap_lastmod[current_url] <= page['updated_at']:
+                    state.record_not_modified(current_url)
+                    logger.info(f"{current_url} unchanged since last crawl per sitemap lastmod, reusing {len(page['links'])} stored links")
+                    for url in page['links']:
+                        if keep(url):
+                            frontier.push(url, depth=current_depth + 1)
+                    continue
+
             try:
+                request_headers = {**headers, **state.conditional_headers(current_url)} if state else headers
                 # Use requests for simplicity, could be made async later
-                response = requests.get(current_url, headers=headers, timeout=15, allow_redirects=True)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'lxml')
-                
-                # Find all links (anchors and frames)
-                links = []
-                for link in soup.find_all('a', href=True):
-                    links.append(link['href'])
-                for frame in soup.find_all(['frame', 'iframe'], src=True):
-                    links.append(frame['src'])
-                
-                logger.info(f"Found {len(links)} links on {current_url}")
-                
-                for href in links:
-                    full_url = urljoin(current_url, href)
-                    
-                    # Only include URLs from the same domain
-                    if urlparse(full_url).netloc == base_domain and full_url not in visited:
-                        # Skip fragments and query params that don't change the page
-                        clean_url = full_url.split('#')[0].split('?')[0]
-                        if clean_url not in visited:
-                            if url_keyword and url_keyword.lower() not in clean_url.lower():
-                                continue
-                            to_visit.append((clean_url, current_depth + 1))
-                            
+                response = requests.get(current_url, headers=request_headers, timeout=15, allow_redirects=True)
+
+                if state and response.status_code == 304:
+                    links = state.get_page(current_url)['links']
+                    state.record_not_modified(current_url)
+                    logger.info(f"{current_url} not modified, reusing {len(links)} stored links")
+                else:
+                    response.raise_for_status()
+                    links = extract_links(response.content, response.url or current_url)
+                    logger.info(f"Found {len(links)} links on {current_url}")
+                    if state:
+                        state.record_fetch(
+                            current_url,
+                            response.headers.get('ETag'),
+                            response.headers.get('Last-Modified'),
+                            links
+                        )
+
+                for url in links:
+                    if keep(url):
+                        frontier.push(url, depth=current_depth + 1)
+
                 # Add random delay between requests to avoid rate limiting
                 delay = random.uniform(min_delay, max_delay)
                 logger.info(f"Waiting {delay:.2f} seconds before next request...")
                 time.sleep(delay)
-                            
+
             except Exception as e:
                 logger.warning(f"Error crawling {current_url}: {e}")
                 # Still add a delay even on error to be respectful
                 delay = random.uniform(min_delay, min(max_delay, min_delay + 1.0))  # Shorter delay on error
                 time.sleep(delay)
                 continue
-    
-    logger.info(f"Total collected URLs: {len(collected_urls)}")
-    return list(collected_urls)
+
+        logger.info(f"Total collected URLs: {len(collected_urls)} (seen {len(frontier.seen)}, {len(frontier)} left in frontier)")
+        if state:
+            frontier.checkpoint()
+            state.complete_run()
+            state.close()
+    return collected_urls
 
 def filter_docs_by_keywords(docs_map: dict, keywords: List[str]) -> dict:
     """
@@ -272,7 +227,9 @@ async def crawl_and_create_kb(
     max_delay: float = 3.0,
     max_pages: int = 100,
     url_keyword: Optional[str] = None,
-    hf_embeddings = None
+    hf_embeddings = None,
+    resume: bool = False,
+    incremental: bool = False
 ) -> tuple[str, List[str]]:
     """
     Crawl website(s) and create a knowledge base from the content.
@@ -281,22 +238,31 @@ async def crawl_and_create_kb(
         url_or_urls: Single URL to crawl or list of URLs to scrape directly
         keywords: Optional list of keywords to filter content by
         depth: Maximum crawl depth for crawling (None for full website crawl, default: None)
-        crawl: Whether to crawl (TruFe) or process URLs directly (False)
+        crawl: Whether to crawl (True) or process URLs directly (False)
         min_delay: Minimum delay between requests in seconds (default: 1.0)
         max_delay: Maximum delay between requests in seconds (default: 3.0)
         max_pages: Maximum number of pages to collect during crawling (default: 100)
         url_keyword: Optional keyword to filter URLs by presence in the URL string
         hf_embeddings: HuggingFace embeddings instance
+        resume: Persist crawl state and resume an interrupted crawl of the same site(s)
+        incremental: Re-crawl into a stable collection, re-embedding only pages that changed
+            (HTTP 304 or identical content hash) and dropping pages that disappeared
         
     Returns:
         Tuple of (collection_name, list_of_scraped_urls)
     """
+    use_state = resume or incremental
+    # Maps every URL to the state file holding its validators and content hash
+    url_state_paths = {}
+
     if isinstance(url_or_urls, str):
         # Single URL
         if crawl:
             # Crawl the website
             logger.info(f"Crawling website: {url_or_urls} with depth {depth if depth is not None else 'unlimited'}")
-            urls_to_process = crawl_website(url_or_urls, depth=depth, min_delay=min_delay, max_delay=max_delay, max_pages=max_pages, url_keyword=url_keyword)
+            state_path = default_state_path(url_or_urls, depth, url_keyword) if use_state else None
+            urls_to_process = crawl_website(url_or_urls, depth=depth, min_delay=min_delay, max_delay=max_delay, max_pages=max_pages, url_keyword=url_keyword, state_path=state_path)
+            url_state_paths.update({url: state_path for url in urls_to_process})
             logger.info(f"Found {len(urls_to_process)} URLs to process")
         else:
             # Process single URL directly
@@ -310,9 +276,12 @@ async def crawl_and_create_kb(
             all_urls = []
             for url in url_or_urls:
                 logger.info(f"Crawling starting from: {url}")
-                crawled_urls = crawl_website(url, depth=depth, min_delay=min_delay, max_delay=max_delay, max_pages=max_pages, url_keyword=url_keyword)
+                state_path = default_state_path(url, depth, url_keyword) if use_state else None
+                crawled_urls = crawl_website(url, depth=depth, min_delay=min_delay, max_delay=max_delay, max_pages=max_pages, url_keyword=url_keyword, state_path=state_path)
+                for crawled_url in crawled_urls:
+                    url_state_paths.setdefault(crawled_url, state_path)
                 all_urls.extend(crawled_urls)
-            urls_to_process = list(set(all_urls))  # Remove duplicates
+            urls_to_process = list(dict.fromkeys(all_urls))  # Remove duplicates, keep crawl order
             logger.info(f"Found {len(urls_to_process)} total URLs to process")
         else:
             # Process URLs directly
@@ -330,9 +299,45 @@ async def crawl_and_create_kb(
     
     if not urls_to_process:
         raise ValueError("No URLs to process after filtering")
+
+    # Incremental mode: skip fetching pages that answered 304 during the crawl
+    stores = {}
+    urls_to_fetch = urls_to_process
+    if incremental:
+        direct_state_path = default_state_path(
+            url_or_urls if isinstance(url_or_urls, str) else 'direct://' + ''.join(sorted(url_or_urls)), depth, url_keyword
+        )
+        for url in urls_to_process:
+            url_state_paths[url] = url_state_paths.get(url) or direct_state_path
+        stores = {path: CrawlStateStore(path) for path in set(url_state_paths.values())}
+        unchanged = set()
+        for path, store in stores.items():
+            unchanged |= store.unchanged_urls([u for u in urls_to_process if url_state_paths[u] == path])
+        urls_to_fetch = [url for url in urls_to_process if url not in unchanged]
+        logger.info(f"Incremental mode: {len(unchanged)} URLs not modified, fetching {len(urls_to_fetch)}")
     
     # Convert URLs to documents
-    docs_map = await urls_to_docs(urls_to_process, local_mode=False, split=False)
+    docs_map = await urls_to_docs(urls_to_fetch, local_mode=False, split=False)
+
+    changed_urls = list(docs_map.keys())
+    removed_urls = []
+    new_hashes = {}
+    if incremental:
+        changed_urls = []
+        for url, docs in docs_map.items():
+            if not docs:
+                continue
+            digest = content_hash(''.join(d.page_content for d in docs))
+            page = stores[url_state_paths[url]].get_page(url)
+            if page and page['content_hash'] == digest:
+                continue
+            changed_urls.append(url)
+            new_hashes[url] = digest
+        docs_map = {url: docs_map[url] for url in changed_urls}
+        current = set(urls_to_process)
+        for store in stores.values():
+            removed_urls.extend(u for u in store.embedded_urls() if u not in current)
+        logger.info(f"Incremental mode: {len(changed_urls)} changed, {len(removed_urls)} removed URLs")
     
     # Filter by keywords if provided
     if keywords:
@@ -345,14 +350,10 @@ async def crawl_and_create_kb(
     for docs in docs_map.values():
         all_docs.extend(docs)
     
-    if not all_docs:
-        raise ValueError("No documents found after processing and filtering")
-    
     logger.info(f"Total documents: {len(all_docs)}")
     
     # Split documents
-    text_splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=128)
-    all_docs = text_splitter.split_documents(all_docs)
+    all_docs = dedup_documents(chunk_documents(all_docs, chunk_size=512, chunk_overlap=128))
     
     logger.info(f"Total documents after splitting: {len(all_docs)}")
     
@@ -371,7 +372,11 @@ async def crawl_and_create_kb(
     if url_keyword:
         base_name += f"_urlkeyword_{url_keyword.replace(' ', '_').replace('-', '_')}"
     
-    sorted_urls = ''.join(sorted(urls_to_process))
+    if incremental:
+        # Stable across re-crawls so the same collection is updated in place
+        sorted_urls = f"{url_or_urls}|{depth}|{url_keyword}|{keywords}"
+    else:
+        sorted_urls = ''.join(sorted(urls_to_process))
     hash_suffix = hashlib.md5(sorted_urls.encode()).hexdigest()[:8]
     collection_name = f"{crawl_mode}_{base_name}_{hash_suffix}"
     
@@ -394,27 +399,52 @@ async def crawl_and_create_kb(
     
     # Create vectorstore
     client = chromadb.PersistentClient(path="./chroma_db", settings=Settings(anonymized_telemetry=False, allow_reset=True))
-    
-    # Delete existing collection if it exists
-    try:
-        client.delete_collection(collection_name)
-        logger.info(f"Deleted existing collection {collection_name}")
-    except Exception as e:
-        logger.info(f"Collection {collection_name} not found or error deleting: {e}")
-    
-    try:
-        await create_vectorstore_async(
-            docs=all_docs,
-            collection_name=collection_name,
-            hf_embeddings=hf_embeddings,
-            top_k=3,
-            ensemble_weights=[0.4, 0.6],
-            local_mode=True,
-            persist_directory="./chroma_db"
-        )
-        logger.info(f"Knowledge base created: {collection_name}")
-    except Exception as e:
-        logger.error(f"Error creating knowledge base: {e}")
-        raise
-    
-    return collection_name, urls_to_process
\ No newline at end of file
+    existing_collections = [c.name for c in client.list_collections()]
+
+    if incremental and collection_name in existing_collections:
+        try:
+            await update_vectorstore_async(
+                docs=all_docs,
+                collection_name=collection_name,
+                hf_embeddings=hf_embeddings,
+                remove_urls=changed_urls + removed_urls,
+                persist_directory="./chroma_db"
+            )
+            logger.info(f"Knowledge base updated: {collection_name}")
+        except Exception as e:
+            logger.error(f"Error updating knowledge base: {e}")
+            raise
+    else:
+        if not all_docs:
+            raise ValueError("No documents found after processing and filtering")
+
+        # Delete existing collection if it exists
+        try:
+            client.delete_collection(collection_name)
+            logger.info(f"Deleted existing collection {collection_name}")
+        except Exception as e:
+            logger.info(f"Collection {collection_name} not found or error deleting: {e}")
+        
+        try:
+            await create_vectorstore_async(
+                docs=all_docs,
+                collection_name=collection_name,
+                hf_embeddings=hf_embeddings,
+                top_k=3,
+                ensemble_weights=[0.4, 0.6],
+                local_mode=True,
+                persist_directory="./chroma_db"
+            )
+            logger.info(f"Knowledge base created: {collection_name}")
+        except Exception as e:
+            logger.error(f"Error creating knowledge base: {e}")
+            raise
+
+    # Record what is embedded now so the next re-crawl can skip it
+    for url, digest in new_hashes.items():
+        stores[url_state_paths[url]].set_content_hash(url, digest)
+    for store in stores.values():
+        store.forget(removed_urls)
+        store.close()
+    
+    return collection_name, urls_to_process
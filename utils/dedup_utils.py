@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Estimated Jaccard similarity (of word shingles) above which two texts count as near-duplicates
+NEAR_DUP_THRESHOLD = float(os.environ.get('NEAR_DUP_THRESHOLD', 0.8))
+NEAR_DUP_ENABLED = os.environ.get('NEAR_DUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r'\w+')
+_CONTENT = re.compile(r'<content>(.*?)</content>', re.DOTALL)
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in set(shingles)),
+        dtype=np.uint64
+    )
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH banding index for near-duplicate detection.
+
+    Each text is reduced to a MinHash signature over its word shingles; signatures are split into
+    bands and texts sharing any band become candidates, which are then confirmed by the estimated
+    Jaccard similarity. Lookups cost O(bands) instead of comparing against every indexed text.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, num_perm: int = 64, bands: int = 8,
+                 shingle_size: int = 3, seed: int = 1):
+        """
+        Args:
+            threshold (float): Estimated Jaccard similarity at which texts are near-duplicates.
+            num_perm (int): Number of MinHash permutations (signature length).
+            bands (int): Number of LSH bands; num_perm must be divisible by it. With 64/8 the
+                candidate probability is ~50% at similarity 0.77 and above 99% at 0.9.
+            shingle_size (int): Words per shingle.
+            seed (int): Seed of the permutation parameters.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a, b < 2^32 and 32-bit shingle hashes keep a * h + b below 2^64
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = []
+        self._keys = []
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text, self.shingle_size)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def query(self, text: str = None, signature: np.ndarray = None):
+        """Returns the key of an indexed near-duplicate of `text`, or None."""
+        if signature is None:
+            signature = self.signature(text)
+        checked = set()
+        for band, bucket in enumerate(self._buckets):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for idx in bucket.get(band_key, ()):
+                if idx in checked:
+                    continue
+                checked.add(idx)
+                if np.mean(self._signatures[idx] == signature) >= self.threshold:
+                    return self._keys[idx]
+        return None
+
+    def add(self, key, text: str = None, signature: np.ndarray = None):
+        if signature is None:
+            signature = self.signature(text)
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        self._keys.append(key)
+        for band, bucket in enumerate(self._buckets):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            bucket.setdefault(band_key, []).append(idx)
+
+    def add_if_new(self, key, text: str) -> Optional[object]:
+        """
+        Indexes `text` unless it near-duplicates an indexed text.
+
+        Returns:
+            The key of the existing near-duplicate, or None if the text was added.
+        """
+        signature = self.signature(text)
+        duplicate_of = self.query(signature=signature)
+        if duplicate_of is None:
+            self.add(key, signature=signature)
+        return duplicate_of
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def section_text(text: str) -> str:
+    """Returns the text inside <content></content> tags if present (the part compared for duplicates)."""
+    match = _CONTENT.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def filter_near_duplicates(items: Iterable, text_fn: Callable = lambda x: x, threshold: float = NEAR_DUP_THRESHOLD,
+                           index: Optional[NearDuplicateIndex] = None) -> List:
+    """
+    Removes near-duplicate items, keeping the first occurrence (order is preserved).
+
+    Args:
+        items (iterable): Items to filter.
+        text_fn (callable): Maps an item to the text that is compared.
+        threshold (float): Estimated Jaccard similarity at which items are near-duplicates.
+        index (NearDuplicateIndex, optional): Existing index to check against and extend, e.g. to
+            deduplicate across several calls.
+
+    Returns:
+        list: The kept items.
+    """
+    items = list(items)
+    if not NEAR_DUP_ENABLED:
+        return items
+    index = index if index is not None else NearDuplicateIndex(threshold=threshold)
+    kept = []
+    for i, item in enumerate(items):
+        text = text_fn(item)
+        if not text or not text.strip():
+            kept.append(item)
+            continue
+        if index.add_if_new(i, text) is None:
+            kept.append(item)
+    if len(kept) < len(items):
+        logger.info(f"Near-duplicate filter: {len(items)} -> {len(kept)}")
+    return kept
+
+
+def dedup_documents(docs: List, threshold: float = NEAR_DUP_THRESHOLD,
+                    index: Optional[NearDuplicateIndex] = None) -> List:
+    """Near-duplicate filter for Documents, comparing the section content of page_content."""
+    return filter_near_duplicates(docs, lambda d: section_text(d.page_content), threshold, index)
+
+
+def dedup_docs_map(docs_map: dict, threshold: float = NEAR_DUP_THRESHOLD) -> dict:
+    """
+    Near-duplicate filter across all documents of a url -> docs map, so mirrored or syndicated
+    pages are embedded once. Earlier URLs win; URLs left without documents map to an empty list.
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    return {url: dedup_documents(docs, threshold, index) for url, docs in docs_map.items()}
@@ -0,0 +1,125 @@
+import logging
+import os
+from typing import Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+FETCH_CHUNK_SIZE = int(os.environ.get('FETCH_CHUNK_SIZE', 64 * 1024))
+# HTML and text bodies beyond this many bytes are truncated rather than rejected
+FETCH_MAX_HTML_BYTES = int(os.environ.get('FETCH_MAX_HTML_BYTES', 5 * 1024 * 1024))
+# PDFs larger than this are skipped
+FETCH_MAX_PDF_BYTES = int(os.environ.get('FETCH_MAX_PDF_BYTES', 50 * 1024 * 1024))
+
+# Types that are never converted (videos, audio streams, archives, ...)
+SKIPPED_TYPE_PREFIXES = ('video/', 'audio/', 'font/')
+SKIPPED_TYPES = {'application/zip', 'application/gzip', 'application/x-tar', 'application/x-7z-compressed',
+                 'application/x-rar-compressed', 'application/vnd.rar', 'application/x-msdownload'}
+# Structured/plain text types converted from the downloaded body (truncated like HTML)
+TEXT_TYPES = {'application/json', 'application/x-ndjson', 'application/ld+json', 'application/xml'}
+# Types that say nothing about the payload and are sniffed from the first bytes instead
+GENERIC_TYPES = {'', 'application/octet-stream', 'binary/octet-stream', 'application/download', 'application/force-download'}
+
+
+class ContentTooLargeError(Exception):
+    """Raised when a response exceeds the size cap of its content type."""
+
+
+class UnsupportedContentError(Exception):
+    """Raised for content types that are not converted to markdown."""
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Guesses a MIME type from the first bytes of a body (PDF and HTML only)."""
+    stripped = head.lstrip()[:1024].lower()
+    if stripped.startswith(b'%pdf-'):
+        return 'application/pdf'
+    if stripped.startswith((b'<!doctype html', b'<html')) or b'<html' in stripped or b'<body' in stripped:
+        return 'text/html'
+    return None
+
+
+def route_content(url: str, content_type: str, head: bytes = b'') -> Tuple[str, str]:
+    """
+    Decides how a response is handled from its Content-Type and, for generic types, its first bytes.
+
+    Returns:
+        tuple: (kind, content_type) where kind is 'pdf', 'html', 'text', 'skip' or 'other'. 'other' bodies are
+        not downloaded, since process_content converts them from the URL itself.
+    """
+    mime = content_type.split(';', 1)[0].strip().lower()
+    if mime in GENERIC_TYPES:
+        sniffed = sniff_content_type(head)
+        if sniffed:
+            return ('pdf' if sniffed == 'application/pdf' else 'html'), sniffed
+    if 'pdf' in mime or (url.lower().endswith('.pdf') and mime in GENERIC_TYPES):
+        return 'pdf', content_type or 'application/pdf'
+    if 'text/html' in mime or 'application/xhtml' in mime:
+        return 'html', content_type
+    if mime in TEXT_TYPES or (mime.startswith('text/') and mime not in ('text/calendar', 'text/vcard')):
+        return 'text', content_type
+    if mime.startswith(SKIPPED_TYPE_PREFIXES) or mime in SKIPPED_TYPES:
+        return 'skip', content_type
+    return 'other', content_type
+
+
+async def fetch_content(session: aiohttp.ClientSession, url: str, headers: Optional[dict] = None,
+                        max_html_bytes: int = FETCH_MAX_HTML_BYTES, max_pdf_bytes: int = FETCH_MAX_PDF_BYTES,
+                        chunk_size: int = FETCH_CHUNK_SIZE) -> Tuple[str, bytes]:
+    """
+    Streams a URL in chunks, routing on the (sniffed) content type before the body is downloaded.
+
+    HTML and text are truncated at `max_html_bytes`; PDFs over `max_pdf_bytes` (by Content-Length or while
+    streaming) are rejected; media and archives are rejected without reading the body; other types
+    are not downloaded here because process_content fetches them itself. Memory per request is
+    therefore bounded by the larger of the two caps.
+
+    Args:
+        session (aiohttp.ClientSession): Session to fetch with.
+        url (str): The URL.
+        headers (dict, optional): Request headers.
+        max_html_bytes (int): Byte budget for HTML and text bodies.
+        max_pdf_bytes (int): Maximum PDF size.
+        chunk_size (int): Read size per chunk.
+
+    Returns:
+        tuple: (content_type, content). content is empty for 'other' types.
+
+    Raises:
+        ContentTooLargeError: If a PDF exceeds max_pdf_bytes.
+        UnsupportedContentError: For media, archives and other skipped types.
+    """
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', '')
+        head = await response.content.read(chunk_size)
+        kind, content_type = route_content(url, content_type, head)
+
+        if kind == 'skip':
+            raise UnsupportedContentError(f"Skipping {url}: unsupported content type {content_type}")
+        if kind == 'other':
+            logger.info(f"Not downloading {url} ({content_type}); it is converted from the URL")
+            return content_type, b''
+
+        limit = max_pdf_bytes if kind == 'pdf' else max_html_bytes
+        if kind == 'pdf' and response.content_length and response.content_length > limit:
+            raise ContentTooLargeError(f"Skipping {url}: {response.content_length} bytes exceeds PDF limit of {limit}")
+
+        body = bytearray(head[:limit])
+        truncated = len(head) > limit
+        while not truncated:
+            chunk = await response.content.read(chunk_size)
+            if not chunk:
+                break
+            if len(body) + len(chunk) > limit:
+                body.extend(chunk[:limit - len(body)])
+                truncated = True
+                break
+            body.extend(chunk)
+
+        if truncated:
+            if kind == 'pdf':
+                raise ContentTooLargeError(f"Skipping {url}: PDF exceeds limit of {limit} bytes")
+            logger.info(f"Truncated {url} to {limit} bytes")
+        return content_type, bytes(body)
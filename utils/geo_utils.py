@@ -0,0 +1,148 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    """
+    Encodes a coordinate as a geohash of `precision` characters (7 characters is a cell of about
+    150 m x 150 m, 6 about 1.2 km x 0.6 km).
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Returns the (min_lat, min_lon, max_lat, max_lon) box of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cells_covering(lat: float, lon: float, radius: float, precision: int) -> List[str]:
+    """
+    Lists the geohash cells of `precision` characters that intersect a circle.
+
+    Args:
+        lat (float): Latitude of the center.
+        lon (float): Longitude of the center.
+        radius (float): Radius in meters.
+        precision (int): Geohash length of the cells.
+
+    Returns:
+        list: Geohashes, nearest first.
+    """
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash_encode(lat, lon, precision))
+    height, width = max_lat - min_lat, max_lon - min_lon
+    dlat = math.degrees(radius / EARTH_RADIUS_M)
+    dlon = math.degrees(radius / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    rows = range(math.floor((lat - dlat - min_lat) / height), math.floor((lat + dlat - min_lat) / height) + 1)
+    cols = range(math.floor((lon - dlon - min_lon) / width), math.floor((lon + dlon - min_lon) / width) + 1)
+
+    cells = {}
+    for i in rows:
+        cell_lat = min_lat + (i + 0.5) * height
+        if not -90 < cell_lat < 90:
+            continue
+        for j in cols:
+            cell_lon = min_lon + (j + 0.5) * width
+            # Distance from the center to the nearest point of the cell
+            near_lat = min(max(lat, cell_lat - height / 2), cell_lat + height / 2)
+            near_lon = min(max(lon, cell_lon - width / 2), cell_lon + width / 2)
+            distance = haversine_m(lat, lon, near_lat, near_lon)
+            if distance <= radius:
+                # Longitudes past the antimeridian wrap around
+                cells.setdefault(geohash_encode(cell_lat, (cell_lon + 180) % 360 - 180, precision), distance)
+    return sorted(cells, key=cells.get)
+
+
+def covering_grid_size(lat: float, lon: float, radius: float, precision: int) -> int:
+    """
+    Upper bound of len(cells_covering(...)): the cells of the circle's bounding box, computed
+    without enumerating them.
+    """
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash_encode(lat, lon, precision))
+    dlat = math.degrees(radius / EARTH_RADIUS_M)
+    dlon = math.degrees(radius / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return (math.ceil(2 * dlat / (max_lat - min_lat)) + 1) * (math.ceil(2 * dlon / (max_lon - min_lon)) + 1)
+
+
+def simplify_line(points: List[List[float]], tolerance: float) -> List[List[float]]:
+    """
+    Simplifies a polyline with the Douglas-Peucker algorithm, keeping the points that deviate
+    more than `tolerance` meters from the simplified line.
+
+    Args:
+        points (list): [lon, lat] pairs, as in GeoJSON geometries.
+        tolerance (float): Maximum deviation in meters (0 keeps every point).
+
+    Returns:
+        list: The retained [lon, lat] pairs, endpoints included.
+    """
+    if tolerance <= 0 or len(points) < 3:
+        return list(points)
+    coords = np.asarray(points, dtype=np.float64)
+    # Local equirectangular projection to meters, accurate enough at route scale
+    scale = math.radians(1) * EARTH_RADIUS_M
+    xy = np.column_stack((coords[:, 0] * scale * math.cos(math.radians(coords[:, 1].mean())), coords[:, 1] * scale))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, segment = xy[first], xy[last] - xy[first]
+        offsets = xy[first + 1:last] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return coords[keep].tolist()
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from utils.cache_utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GIT_CACHE_PATH = os.environ.get('GIT_CACHE_PATH', './git_cache/repos.sqlite')
+# Bytes of cached repository content; least recently used repositories are dropped beyond it
+GIT_CACHE_MAX_BYTES = int(os.environ.get('GIT_CACHE_MAX_BYTES', 512 * 1024 ** 2))
+# Seconds a resolved remote revision is trusted before asking the remote again
+GIT_REVISION_TTL = float(os.environ.get('GIT_REVISION_TTL', 60))
+GIT_COMMAND_TIMEOUT = float(os.environ.get('GIT_COMMAND_TIMEOUT', 20))
+
+# Header of one entry in gitingest's content output ("FILE: path" or "SYMLINK: path -> target")
+_ENTRY_HEADER = re.compile(r'^={48}\n(?:FILE|SYMLINK): (.+?)(?: -> .*)?\n={48}\n', re.M)
+
+_remote_revisions = TTLCache(GIT_REVISION_TTL, max_entries=256)
+
+
+async def _git(*args) -> Optional[str]:
+    """Runs a git command, returning its stdout or None if it fails."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'git', *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        stdout, _ = await asyncio.wait_for(process.communicate(), GIT_COMMAND_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.warning(f"git {args[0]} failed: {e}")
+        return None
+    return stdout.decode('utf-8', 'replace') if process.returncode == 0 else None
+
+
+async def repo_revision(url: str) -> Optional[str]:
+    """
+    Identifies the current revision of a repository without cloning it.
+
+    For a remote URL this is the commit SHA of its default branch (`git ls-remote`). For a local
+    repository it is HEAD plus a fingerprint of uncommitted changes, so edits invalidate the cache.
+
+    Returns:
+        str or None: The revision, or None if it cannot be determined (then nothing is cached).
+    """
+    if os.path.isdir(url):
+        head = await _git('-C', url, 'rev-parse', 'HEAD')
+        if head is None:
+            return None
+        status = await _git('-C', url, 'status', '--porcelain', '-z')
+        if status is None:
+            return None
+        fingerprint = hashlib.sha1(status.encode('utf-8'))
+        for entry in filter(None, status.split('\0')):
+            try:
+                stat = os.stat(os.path.join(url, entry[3:]))
+                fingerprint.update(f"{stat.st_mtime_ns}:{stat.st_size}".encode())
+            except OSError:
+                continue
+        return f"{head.strip()}+{fingerprint.hexdigest()[:12]}" if status else head.strip()
+
+    cached = _remote_revisions.get(url)
+    if cached is not None:
+        return cached
+    output = await _git('ls-remote', url, 'HEAD')
+    revision = output.split()[0] if output and output.strip() else None
+    if revision:
+        _remote_revisions.set(url, revision)
+    return revision
+
+
+def split_ingest_content(content: str) -> List[Tuple[str, str]]:
+    """Splits gitingest content into (path, entry text) pairs, entry text including its header."""
+    matches = list(_ENTRY_HEADER.finditer(content))
+    return [
+        (match.group(1), content[match.start():matches[i + 1].start() if i + 1 < len(matches) else len(content)])
+        for i, match in enumerate(matches)
+    ]
+
+
+class GitRepoCache:
+    """
+    Cache of gitingest results keyed by (repository, revision), stored in SQLite.
+
+    Each repository is ingested once per revision; its tree, summary and per-path content are kept
+    so later requests for subfolders or files are answered without cloning again. Repositories
+    are evicted least recently used first once the stored content exceeds `max_bytes`.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, path: str = GIT_CACHE_PATH, max_bytes: int = GIT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS repos (repo_key TEXT PRIMARY KEY, url TEXT, revision TEXT, summary TEXT, "
+                "tree TEXT, size INTEGER, last_used REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (repo_key TEXT, idx INTEGER, path TEXT, text TEXT, "
+                "PRIMARY KEY (repo_key, idx))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_path ON entries (repo_key, path)")
+
+    @staticmethod
+    def key(url: str, revision: str) -> str:
+        return hashlib.sha256(f"{url}\n{revision}".encode('utf-8')).hexdigest()
+
+    def get_tree(self, repo_key: str) -> Optional[str]:
+        with self._lock, self._db:
+            row = self._db.execute("SELECT tree FROM repos WHERE repo_key = ?", (repo_key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE repos SET last_used = ? WHERE repo_key = ?", (time.time(), repo_key))
+        return None if row is None else row[0]
+
+    def get_entries(self, repo_key: str, part: str = '', exact: bool = False) -> List[str]:
+        """
+        Returns the entry texts of a cached repository under `part` (all entries if empty), in
+        ingest order. With `exact`, only the entry whose path equals `part` is returned.
+        """
+        if not part:
+            query, params = "SELECT text FROM entries WHERE repo_key = ? ORDER BY idx", (repo_key,)
+        elif exact:
+            query, params = "SELECT text FROM entries WHERE repo_key = ? AND path = ? ORDER BY idx", (repo_key, part)
+        else:
+            # Prefix range: '0' is the character right after '/'
+            query = ("SELECT text FROM entries WHERE repo_key = ? AND (path = ? OR (path >= ? || '/' AND path < ? || '0')) "
+                     "ORDER BY idx")
+            params = (repo_key, part, part, part)
+        with self._lock, self._db:
+            self._db.execute("UPDATE repos SET last_used = ? WHERE repo_key = ?", (time.time(), repo_key))
+            return [row[0] for row in self._db.execute(query, params)]
+
+    def put(self, repo_key: str, url: str, revision: str, summary: str, tree: str, content: str):
+        entries = split_ingest_content(content)
+        size = len(content) + len(tree) + len(summary)
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE repo_key = ?", (repo_key,))
+            self._db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)",
+                                 [(repo_key, i, path, text) for i, (path, text) in enumerate(entries)])
+            self._db.execute("INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (repo_key, url, revision, summary, tree, size, time.time()))
+            # Older revisions of the same repository are superseded
+            stale = [r[0] for r in self._db.execute(
+                "SELECT repo_key FROM repos WHERE url = ? AND repo_key != ?", (url, repo_key))]
+            self._delete(stale)
+            self._evict()
+        logger.info(f"Cached {len(entries)} entries of {url} at {revision[:12]}")
+
+    def _delete(self, repo_keys: List[str]):
+        # Caller holds the lock inside a transaction
+        self._db.executemany("DELETE FROM entries WHERE repo_key = ?", [(k,) for k in repo_keys])
+        self._db.executemany("DELETE FROM repos WHERE repo_key = ?", [(k,) for k in repo_keys])
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM repos").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        # The most recently used repository is always kept, even if it alone exceeds the budget
+        for repo_key, size in self._db.execute("SELECT repo_key, size FROM repos ORDER BY last_used").fetchall()[:-1]:
+            if total <= self.max_bytes:
+                break
+            evict.append(repo_key)
+            total -= size
+        self._delete(evict)
+        logger.info(f"Evicted {len(evict)} cached repositories ({total} bytes kept)")
+
+
+_git_cache = None
+_git_cache_lock = threading.Lock()
+
+
+def get_git_cache() -> GitRepoCache:
+    """Get the process-wide repository cache (opened on first use)"""
+    global _git_cache
+    if _git_cache is None:
+        with _git_cache_lock:
+            if _git_cache is None:
+                _git_cache = GitRepoCache()
+    return _git_cache
@@ -1,6 +1,61 @@
 from gitingest import ingest_async
+import asyncio
+import logging
 import os
-import aiofiles.os
+from concurrent.futures import ThreadPoolExecutor
+from utils.cache_utils import TTLCache
+from utils.git_cache import get_git_cache, repo_revision
+
+logger = logging.getLogger(__name__)
+
+# Seconds a folder tree listing is reused (0 disables the cache)
+FOLDER_TREE_CACHE_TTL = float(os.environ.get('FOLDER_TREE_CACHE_TTL', 10))
+# Threads listing directories for folder_tree
+FOLDER_TREE_WORKERS = int(os.environ.get('FOLDER_TREE_WORKERS', 8))
+
+_folder_tree_cache = TTLCache(FOLDER_TREE_CACHE_TTL, max_entries=128)
+_tree_executor = None
+
+_ingest_tasks = {}
+
+
+async def _cached_repo(url):
+    """
+    Makes sure a repository is in the repository cache at its current revision, ingesting it at most
+    once per revision (concurrent callers share the ingest).
+
+    Args:
+        url (str): Remote repository URL or local repository path.
+
+    Returns:
+        str or None: The cache key of the repository, or None if its revision cannot be determined.
+    """
+    revision = await repo_revision(url)
+    if revision is None:
+        return None
+    cache = get_git_cache()
+    repo_key = cache.key(url, revision)
+    if await asyncio.to_thread(cache.get_tree, repo_key) is not None:
+        logger.info(f"Repository cache hit for {url} at {revision[:12]}")
+        return repo_key
+
+    task = _ingest_tasks.get(repo_key)
+    if task is None:
+        async def ingest():
+            try:
+                summary, tree, content = await ingest_async(url)
+                await asyncio.to_thread(cache.put, repo_key, url, revision, summary, tree, content)
+            finally:
+                _ingest_tasks.pop(repo_key, None)
+        task = _ingest_tasks[repo_key] = asyncio.ensure_future(ingest())
+    # A cancelled caller must not cancel the ingest other callers wait on
+    await asyncio.shield(task)
+    return repo_key
+
+
+def _repo_url(url):
+    return os.path.abspath(url) if os.path.exists(url) else url.rstrip('/')
+
 
 async def git_tree_search(url):
     """
@@ -25,6 +80,12 @@ async def git_tree_search(url):
         raise ValueError("Provided 'url' is neither a valid local path nor a valid URL.")
 
     try:
+        try:
+            repo_key = await _cached_repo(_repo_url(url))
+            if repo_key is not None:
+                return await asyncio.to_thread(get_git_cache().get_tree, repo_key)
+        except Exception as e:
+            logger.warning(f"Repository cache unavailable for {url}, ingesting it directly: {e}")
         summary, tree, content  = await ingest_async(url)
         return tree
     except Exception as e:
@@ -35,6 +96,7 @@ async def git_specific_content(base_url, part,type):
     Fetches the content of a specific part (directory or file) from either:
     - a GitHub repository (via URL), or
     - a local Git repository (via local path).
+    The part is served from the cached ingest of the repository at its current revision when available.
 
     Args:
         base_url (str): The base URL of the GitHub repository (e.g., 'https://github.com/user/repo'),
@@ -72,17 +134,104 @@ async def git_specific_content(base_url, part,type):
         print(url_or_path)
 
     try:
+        # Answer from the cached ingest of the whole repository when possible
+        try:
+            repo_key = await _cached_repo(_repo_url(base_url))
+            if repo_key is not None:
+                selected = await asyncio.to_thread(get_git_cache().get_entries, repo_key,
+                                                   part.replace(os.sep, '/').strip('/'), type == 'file')
+                if selected:
+                    return ''.join(selected)
+                logger.info(f"'{part}' not in the cached ingest of {base_url}, ingesting it directly")
+        except Exception as e:
+            # e.g. the whole repository is too large to ingest while the part alone is not
+            logger.warning(f"Repository cache unavailable for {base_url}, ingesting '{part}' directly: {e}")
         summary, tree, content = await ingest_async(url_or_path)
         return content
     except Exception as e:
         raise Exception(f"Failed to fetch content for '{url_or_path}': {e}")
 
+def _is_visible(entry):
+    lower = entry.lower()
+    hidden = entry.startswith('.')
+    system = lower in ('desktop.ini', 'thumbs.db', '$recycle.bin', 'system volume information')
+    cache = 'cache' in lower
+    return not (hidden or system or cache)
+
+
+def _scan_dir(path):
+    """
+    Lists the visible entries of a directory with os.scandir, whose DirEntry types come from the
+    directory listing itself (no stat per entry except for symlinks).
+
+    Returns:
+        list: Sorted (name, path, is_dir, is_file, recurse) tuples; `recurse` excludes symlinked folders.
+    """
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if not _is_visible(entry.name):
+                continue
+            is_dir = entry.is_dir()
+            entries.append((entry.name, entry.path, is_dir, entry.is_file(), is_dir and not entry.is_symlink()))
+    entries.sort()
+    return entries
+
+
+def _folder_tree_pool():
+    global _tree_executor
+    if _tree_executor is None:
+        _tree_executor = ThreadPoolExecutor(max_workers=FOLDER_TREE_WORKERS, thread_name_prefix='folder-tree')
+    return _tree_executor
+
+
+async def _tree_lines(path, level, prefix, cur_depth, max_depth):
+    try:
+        entries = await asyncio.get_running_loop().run_in_executor(_folder_tree_pool(), _scan_dir, path)
+    except FileNotFoundError:
+        return [f"{prefix}!! [Error: Folder not found]\n"]
+    except PermissionError:
+        return [f"{prefix}!! [Error: Permission denied]\n"]
+    except Exception as e:
+        return [f"{prefix}!! [Error: {str(e)}]\n"]
+
+    if level.startswith('broad'):
+        # Separate folders and files
+        items = [e for e in entries if e[2]] + [e for e in entries if e[3]]
+    else:
+        items = entries
+
+    async def subtree(full_path, extension):
+        try:
+            return await _tree_lines(full_path, level, prefix + extension, cur_depth + 1, max_depth)
+        except Exception as e:
+            return [f"{prefix + extension}!! [Error: {str(e)}]\n"]
+
+    # Sibling folders are walked concurrently and stitched back in order
+    children = {}
+    for idx, (name, full_path, _, _, recurse) in enumerate(items):
+        if recurse and cur_depth < max_depth:
+            extension = '    ' if idx == len(items) - 1 else '│   '
+            children[idx] = asyncio.ensure_future(subtree(full_path, extension))
+    subtrees = dict(zip(children, await asyncio.gather(*children.values()))) if children else {}
+
+    lines = []
+    for idx, (name, _, _, _, _) in enumerate(items):
+        connector = '└── ' if idx == len(items) - 1 else '├── '
+        lines.append(f"{prefix}{connector}{name}\n")
+        lines.extend(subtrees.get(idx, ()))
+    return lines
+
+
 async def folder_tree(
     path, level='broad-first', prefix='', cur_depth=1, max_depth=None
     ):
     """
     Async Markdown folder tree.
 
+    Directories are listed with os.scandir in a thread pool and sibling subtrees are walked
+    concurrently. Results are cached for FOLDER_TREE_CACHE_TTL seconds, keyed by the folder's mtime.
+
     Args:
         path (str): Root directory.
         level (str):
@@ -95,23 +244,6 @@ async def folder_tree(
     Returns:
         str: Markdown tree string
     """
-    def is_visible(entry):
-        lower = entry.lower()
-        hidden = entry.startswith('.')
-        system = lower in ('desktop.ini', 'thumbs.db', '$recycle.bin', 'system volume information')
-        cache = 'cache' in lower
-        return not (hidden or system or cache)
-
-    try:
-        entries = await aiofiles.os.listdir(path)
-        entries = sorted([e for e in entries if is_visible(e)])
-    except FileNotFoundError:
-        return f"{prefix}!! [Error: Folder not found]\n"
-    except PermissionError:
-        return f"{prefix}!! [Error: Permission denied]\n"
-    except Exception as e:
-        return f"{prefix}!! [Error: {str(e)}]\n"
-
     if max_depth is None:
         if level == 'broad-first':
             max_depth = 1
@@ -120,33 +252,18 @@ async def folder_tree(
         else:
             max_depth = float('inf')
 
-    tree_str = ""
-
-    if level.startswith('broad'):
-        # Separate folders and files
-        folders = [e for e in entries if os.path.isdir(os.path.join(path, e))]
-        files = [e for e in entries if os.path.isfile(os.path.join(path, e))]
-        items = folders + files
-    else:
-        items = entries
+    try:
+        # The mtime changes when entries are added or removed directly in the folder; deeper
+        # changes are picked up once the short TTL expires
+        cache_key = (os.path.abspath(path), level, prefix, cur_depth, max_depth, os.stat(path).st_mtime_ns)
+    except OSError:
+        cache_key = None
+    if cache_key is not None:
+        cached = _folder_tree_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    for idx, entry in enumerate(items):
-        full_path = os.path.join(path, entry)
-        is_last = idx == len(items) - 1
-        connector = '└── ' if is_last else '├── '
-        tree_str += f"{prefix}{connector}{entry}\n"
-        if os.path.isdir(full_path) and not os.path.islink(full_path):
-            if cur_depth < max_depth:
-                extension = '    ' if is_last else '│   '
-                try:
-                    subtree = await folder_tree(
-                        full_path,
-                        level,
-                        prefix + extension,
-                        cur_depth=cur_depth + 1,
-                        max_depth=max_depth,
-                    )
-                    tree_str += subtree
-                except Exception as e:
-                    tree_str += f"{prefix + extension}!! [Error: {str(e)}]\n"
-    return tree_str
\ No newline at end of file
+    tree_str = ''.join(await _tree_lines(path, level, prefix, cur_depth, max_depth))
+    if cache_key is not None:
+        _folder_tree_cache.set(cache_key, tree_str)
+    return tree_str
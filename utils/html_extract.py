@@ -0,0 +1,335 @@
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Engine used by html_to_markdown: 'fast' (single lxml tree walk) or 'markdownify' (BeautifulSoup + markdownify)
+HTML_EXTRACT_ENGINE = os.environ.get('HTML_EXTRACT_ENGINE', 'fast')
+
+# Elements that never carry page content
+BOILERPLATE_TAGS = (
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object', 'embed',
+    'header', 'footer', 'nav', 'aside', 'form', 'button', 'input', 'select', 'textarea', 'label', 'dialog',
+)
+# class/id tokens marking navigation, ads and other chrome
+BOILERPLATE_PATTERN = re.compile(
+    r'(?:^|[\s_-])(?:menu|sidebar|advert\w*|ads?|banner|cookie\w*|popup|modal|newsletter|social|share|sharing|'
+    r'breadcrumbs?|comments?|footer|header|nav\w*|promo\w*|related|sponsor\w*|subscribe|widget|skip)(?:$|[\s_-])',
+    re.IGNORECASE
+)
+# Tokens that keep an element even if it also matches BOILERPLATE_PATTERN (e.g. "content-with-sidebar")
+CONTENT_PATTERN = re.compile(r'article|body|content|main|post|entry|story|text', re.IGNORECASE)
+
+HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'body', 'html', 'figure', 'figcaption', 'dl', 'dt', 'dd',
+    'address', 'details', 'summary', 'center', 'caption',
+}
+PARAGRAPH_TAGS = ('p', 'pre', 'td', 'blockquote')
+
+# Main content must have at least this many characters, otherwise the whole cleaned body is used
+MIN_MAIN_CONTENT_CHARS = 250
+
+_WHITESPACE = re.compile(r'\s+')
+_LONG_TOKEN = re.compile(r"\S{21,}")
+
+
+def clean_html(soup):
+    """
+    Cleans an HTML document by removing unwanted elements such as header, footer, navigation, lists, and advertisements.
+    """
+    try:
+        for tag in soup(['header', 'footer', 'nav', 'aside', 'li']):
+            tag.decompose()
+        for tag in soup.find_all(class_=['menu', 'sidebar', 'advertisement']):
+            tag.decompose()
+        return str(soup)
+    except Exception as e:
+        logger.error(f"Error cleaning HTML: {e}", exc_info=True)
+        return str(soup)
+
+
+def _postprocess(markdown_content: str) -> str:
+    markdown_content = re.sub(r"\n{3,}", "", markdown_content)
+    return _LONG_TOKEN.sub("", markdown_content)
+
+
+def markdownify_to_markdown(content) -> str:
+    """
+    Original conversion path: BeautifulSoup cleanup, re-serialization and markdownify.
+    """
+    from bs4 import BeautifulSoup
+    from markdownify import markdownify
+
+    soup = BeautifulSoup(content, 'lxml', from_encoding="iso-8859-1")
+    soup = clean_html(soup)
+    markdown_content = markdownify(str(soup), strip=['a'])
+    return _postprocess(markdown_content)
+
+
+# --- fast lxml engine ----------------------------------------------------------------
+
+def _is_boilerplate(el) -> bool:
+    if el.tag in BOILERPLATE_TAGS:
+        return True
+    if el.tag in ('html', 'body', 'main', 'article'):
+        return False
+    if el.get('aria-hidden') == 'true' or el.get('hidden') is not None or el.get('role') in ('navigation', 'banner', 'contentinfo'):
+        return True
+    attrs = f"{el.get('class', '')} {el.get('id', '')}"
+    return bool(attrs.strip()) and bool(BOILERPLATE_PATTERN.search(attrs)) and not CONTENT_PATTERN.search(attrs)
+
+
+def _remove_boilerplate(root):
+    # Collect first: dropping while iterating would skip siblings
+    to_drop = [el for el in root.iter() if not isinstance(el.tag, str) or _is_boilerplate(el)]
+    for el in to_drop:
+        if el.getparent() is not None:
+            el.drop_tree()
+
+
+def _link_density(el, text_len: int) -> float:
+    if not text_len:
+        return 1.0
+    link_len = sum(len(a.text_content()) for a in el.iter('a'))
+    return min(1.0, link_len / text_len)
+
+
+def find_main_content(body):
+    """
+    Density-based main content detection.
+
+    Every paragraph-like element with enough text scores its parent fully and its grandparent
+    by half; scores are discounted by link density and the best element is returned (or its
+    parent when sibling blocks score comparably). Falls back to `body` for short pages.
+    """
+    scores = {}
+    for p in body.iter(*PARAGRAPH_TAGS):
+        text = p.text_content().strip()
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = p.getparent()
+        grandparent = parent.getparent() if parent is not None else None
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + score / 2
+    if not scores:
+        return body
+
+    best, best_score = None, 0.0
+    for node, score in scores.items():
+        text_len = len(node.text_content())
+        score *= 1 - _link_density(node, text_len)
+        if node.tag in ('article', 'main'):
+            score *= 1.25
+        if score > best_score:
+            best, best_score = node, score
+    if best is None or len(best.text_content().strip()) < MIN_MAIN_CONTENT_CHARS:
+        return body
+
+    # Content split across sibling blocks (e.g. one div per section): take the common parent
+    parent = best.getparent()
+    if parent is not None and parent is not body.getparent():
+        siblings = sum(1 for sib in parent if sib is not best and scores.get(sib, 0) >= best_score * 0.3)
+        if siblings:
+            return parent
+    return best
+
+
+class _MarkdownWriter:
+    """Emits markdown for an lxml element tree in one recursive walk."""
+
+    def __init__(self):
+        self.out = []
+
+    def flush(self, buffer):
+        text = _WHITESPACE.sub(' ', ''.join(buffer)).strip()
+        buffer.clear()
+        if text:
+            self.out.append(text)
+
+    def inline(self, el) -> str:
+        buffer = []
+        if el.text:
+            buffer.append(el.text)
+        for child in el:
+            self.walk(child, buffer)
+            if child.tail:
+                buffer.append(child.tail)
+        return _WHITESPACE.sub(' ', ''.join(buffer)).strip()
+
+    def walk_children(self, el, buffer):
+        if el.text:
+            buffer.append(el.text)
+        for child in el:
+            self.walk(child, buffer)
+            if child.tail:
+                buffer.append(child.tail)
+        self.flush(buffer)
+
+    def nested(self, el) -> str:
+        writer = _MarkdownWriter()
+        writer.walk_children(el, [])
+        return '\n\n'.join(writer.out)
+
+    def walk(self, el, buffer):
+        tag = el.tag
+        if not isinstance(tag, str):
+            return
+        if tag in HEADING_TAGS:
+            self.flush(buffer)
+            text = self.inline(el)
+            if text:
+                self.out.append('#' * HEADING_TAGS[tag] + ' ' + text)
+        elif tag in BLOCK_TAGS:
+            self.flush(buffer)
+            self.walk_children(el, buffer)
+        elif tag in ('ul', 'ol'):
+            self.flush(buffer)
+            self.render_list(el)
+        elif tag == 'pre':
+            self.flush(buffer)
+            code = el.text_content().strip('\n')
+            if code.strip():
+                self.out.append(f"```\n{code}\n```")
+        elif tag == 'table':
+            self.flush(buffer)
+            self.render_table(el)
+        elif tag == 'blockquote':
+            self.flush(buffer)
+            inner = self.nested(el)
+            if inner:
+                self.out.append('\n'.join('> ' + line if line else '>' for line in inner.split('\n')))
+        elif tag == 'hr':
+            self.flush(buffer)
+            self.out.append('---')
+        elif tag == 'br':
+            buffer.append('\n')
+            self.flush(buffer)
+        elif tag in ('strong', 'b'):
+            text = self.inline(el)
+            if text:
+                buffer.append(f" **{text}** ")
+        elif tag in ('em', 'i'):
+            text = self.inline(el)
+            if text:
+                buffer.append(f" *{text}* ")
+        elif tag == 'code':
+            text = el.text_content().strip()
+            if text:
+                buffer.append(f" `{text}` ")
+        elif tag in ('img', 'head', 'title', 'meta', 'link'):
+            return
+        else:
+            # Inline element (a, span, ...): keep text only, like markdownify(strip=['a'])
+            if el.text:
+                buffer.append(el.text)
+            for child in el:
+                self.walk(child, buffer)
+                if child.tail:
+                    buffer.append(child.tail)
+
+    def render_list(self, el):
+        ordered = el.tag == 'ol'
+        lines = []
+        index = 1
+        for li in el:
+            if li.tag != 'li':
+                continue
+            item = self.nested(li)
+            if not item:
+                continue
+            marker = f"{index}. " if ordered else "- "
+            index += 1
+            item_lines = item.split('\n')
+            lines.append(marker + item_lines[0])
+            lines.extend(' ' * len(marker) + line if line else '' for line in item_lines[1:])
+        if lines:
+            self.out.append('\n'.join(line for line in lines if line))
+
+    def render_table(self, el):
+        rows = []
+        for tr in el.iter('tr'):
+            cells = [self.inline(cell).replace('|', '\\|') for cell in tr if cell.tag in ('td', 'th')]
+            if any(cells):
+                rows.append(cells)
+        if not rows:
+            return
+        width = max(len(r) for r in rows)
+        lines = []
+        for i, row in enumerate(rows):
+            row = row + [''] * (width - len(row))
+            lines.append('| ' + ' | '.join(row) + ' |')
+            if i == 0:
+                lines.append('|' + ' --- |' * width)
+        self.out.append('\n'.join(lines))
+
+
+def lxml_to_markdown(content) -> str:
+    """
+    Fast conversion path: a single lxml parse, boilerplate removal, main content detection and
+    direct markdown emission, without re-serializing or re-parsing the document.
+    """
+    import lxml.html
+
+    parser = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+    if isinstance(content, str):
+        # lxml rejects str input carrying an XML encoding declaration
+        content = content.encode('utf-8')
+    root = lxml.html.document_fromstring(content, parser=parser)
+    _remove_boilerplate(root)
+    body = root.find('body')
+    if body is None:
+        body = root
+    main = find_main_content(body)
+    writer = _MarkdownWriter()
+    writer.walk_children(main, [])
+    return _postprocess('\n\n'.join(writer.out))
+
+
+ENGINES = {
+    'fast': lxml_to_markdown,
+    'markdownify': markdownify_to_markdown,
+}
+
+
+def register_engine(name: str, func):
+    """
+    Registers an HTML-to-markdown engine selectable through HTML_EXTRACT_ENGINE.
+
+    Args:
+        name (str): Engine name.
+        func (callable): Function taking raw HTML (bytes or str) and returning markdown.
+    """
+    ENGINES[name] = func
+
+
+def html_to_markdown(content, engine: str = None) -> str:
+    """
+    Converts an HTML page to markdown with the selected engine, falling back to the
+    markdownify path if the engine fails or extracts nothing.
+
+    Args:
+        content (bytes or str): Raw HTML.
+        engine (str, optional): Engine name; defaults to HTML_EXTRACT_ENGINE.
+
+    Returns:
+        str: The markdown content.
+    """
+    engine = engine or HTML_EXTRACT_ENGINE
+    func = ENGINES.get(engine)
+    if func is None:
+        logger.warning(f"Unknown HTML extraction engine '{engine}', using markdownify")
+        func = markdownify_to_markdown
+    if func is not markdownify_to_markdown:
+        try:
+            markdown_content = func(content)
+            if markdown_content.strip():
+                return markdown_content
+            logger.info(f"Engine '{engine}' extracted no content, falling back to markdownify")
+        except Exception as e:
+            logger.warning(f"Engine '{engine}' failed ({e}), falling back to markdownify")
+    return markdownify_to_markdown(content)
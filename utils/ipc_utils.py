@@ -0,0 +1,130 @@
+import logging
+import os
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Union
+
+logger = logging.getLogger(__name__)
+
+# Payloads at least this large cross the process boundary through shared memory instead of pickling
+IPC_SHM_THRESHOLD = int(os.environ.get('IPC_SHM_THRESHOLD', 1024 * 1024))
+
+
+class SharedBytes:
+    """
+    Picklable handle to a byte buffer living in a shared memory block.
+
+    Only the block name and size are pickled, so handing a multi-MB body to a pool worker costs
+    a few bytes of IPC instead of a full copy in each direction.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    def __repr__(self):
+        return f"SharedBytes(name={self.name!r}, size={self.size})"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+: the creator owns the block, attaching must not register it for cleanup
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Older versions register on attach too; pool workers share the parent's resource tracker,
+        # so the extra registration is dropped again when the owner unlinks the block
+        return shared_memory.SharedMemory(name=name)
+
+
+def to_shared(data: bytes, threshold: int = IPC_SHM_THRESHOLD) -> Union[bytes, SharedBytes]:
+    """
+    Copies `data` into a new shared memory block if it is at least `threshold` bytes.
+
+    The receiver must release the block with `from_shared(payload, unlink=True)`.
+
+    Args:
+        data (bytes): The payload.
+        threshold (int): Minimum size for the shared memory path.
+
+    Returns:
+        bytes or SharedBytes: The data itself for small payloads, otherwise a handle.
+    """
+    if not data or len(data) < threshold:
+        return data
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    handle = SharedBytes(shm.name, len(data))
+    shm.close()
+    return handle
+
+
+def from_shared(payload: Union[bytes, SharedBytes], unlink: bool = False) -> bytes:
+    """
+    Returns the bytes behind a payload produced by `to_shared`.
+
+    Args:
+        payload (bytes or SharedBytes): The payload.
+        unlink (bool): Free the shared memory block after reading it (receiver side).
+
+    Returns:
+        bytes: The payload data.
+    """
+    if not isinstance(payload, SharedBytes):
+        return payload
+    shm = _attach(payload.name)
+    try:
+        return bytes(shm.buf[:payload.size])
+    finally:
+        shm.close()
+        if unlink:
+            release(payload)
+
+
+def release(payload: Union[bytes, SharedBytes]):
+    """Frees the shared memory block behind a payload, if any."""
+    if not isinstance(payload, SharedBytes):
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=payload.name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def shared_payload(data: bytes, threshold: int = IPC_SHM_THRESHOLD):
+    """
+    Context manager for sending `data` to a worker: yields bytes or a SharedBytes handle and frees
+    the shared memory block on exit. Workers read it with `from_shared(payload)`.
+    """
+    payload = to_shared(data, threshold)
+    if isinstance(payload, SharedBytes):
+        logger.debug(f"Passing {payload.size} bytes to worker through shared memory")
+    try:
+        yield payload
+    finally:
+        release(payload)
+
+
+def text_to_shared(text: str, threshold: int = IPC_SHM_THRESHOLD) -> Union[str, SharedBytes]:
+    """Worker side: returns large result strings as a shared memory handle (UTF-8 encoded)."""
+    if not text or len(text) < threshold // 4:
+        # Cheap pre-check: fewer characters than threshold/4 can never encode to threshold bytes
+        return text
+    data = text.encode('utf-8')
+    if len(data) < threshold:
+        return text
+    return to_shared(data, threshold)
+
+
+def text_from_shared(payload: Union[str, SharedBytes, None]):
+    """Parent side: resolves a result from `text_to_shared` and frees its shared memory block."""
+    if isinstance(payload, SharedBytes):
+        return from_shared(payload, unlink=True).decode('utf-8')
+    return payload
@@ -5,7 +5,7 @@ from utils.retriever_utils import create_vectorstore_async
 from chromadb.config import Settings
 import chromadb
 import logging
-from langchain_text_splitters import TokenTextSplitter
+from utils.dedup_utils import dedup_documents
 
 async def create_knowledge_base(document_paths, hf_embeddings):
     """
@@ -38,7 +38,7 @@ async def create_knowledge_base(document_paths, hf_embeddings):
     logger.info(f"Found {len(all_paths[0])} file paths to process")
 
     # Process documents
-    docs_map = await urls_to_docs(all_paths[0], local_mode=True, split=False)
+    docs_map = await urls_to_docs(all_paths[0], local_mode=True, chunk_size=512, chunk_overlap=128)
 
     logger.info(f"docs_map has {len(docs_map)} entries")
     for url, docs in docs_map.items():
@@ -48,13 +48,12 @@ async def create_knowledge_base(document_paths, hf_embeddings):
     for docs in docs_map.values():
         all_docs.extend(docs)
 
-    logger.info(f"Total documents before splitting: {len(all_docs)}")
+    logger.info(f"Total chunks before deduplication: {len(all_docs)}")
 
-    # Split documents
-    text_splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=128)
-    all_docs = text_splitter.split_documents(all_docs)
+    # Pages were already chunked by urls_to_docs
+    all_docs = dedup_documents(all_docs)
 
-    logger.info(f"Total documents after splitting: {len(all_docs)}")
+    logger.info(f"Total chunks after deduplication: {len(all_docs)}")
 
     if not all_docs:
         raise ValueError("No documents could be processed.")
@@ -0,0 +1,327 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# LLM calls in flight at once across all endpoints
+LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', 4))
+# Tokens per minute allowed by the provider (prompt + expected completion); 0 disables budgeting
+LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 0))
+# Completion tokens assumed per call until the provider reports actual usage
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.environ.get('LLM_EXPECTED_OUTPUT_TOKENS', 512))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 1.0))
+LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 30.0))
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+_priority = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+_RETRIABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_RETRIABLE_NAMES = ('RateLimit', 'Timeout', 'APIConnection', 'ServiceUnavailable', 'ResourceExhausted',
+                    'InternalServerError', 'Overloaded')
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Runs the LLM calls made inside the block with the given priority class (INTERACTIVE or BATCH)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_retriable(error: Exception) -> bool:
+    """Whether an LLM error is transient (rate limits, overload, timeouts, connection errors)."""
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in _RETRIABLE_STATUS:
+        return True
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return any(name in type(error).__name__ for name in _RETRIABLE_NAMES)
+
+
+def _retry_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _estimate_tokens(prompt) -> int:
+    from utils.chunking_utils import count_tokens
+    if isinstance(prompt, (list, tuple)):
+        text = '\n'.join(str(getattr(m, 'content', m)) for m in prompt)
+    else:
+        text = str(getattr(prompt, 'text', prompt)) if not isinstance(prompt, str) else prompt
+    return count_tokens(text) + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class LLMGovernor:
+    """
+    Admission control shared by every LLM call of the process.
+
+    Calls wait in a priority queue (INTERACTIVE before BATCH, FIFO within a class) until both one
+    of `max_in_flight` slots and their estimated tokens in a tokens-per-minute bucket are available;
+    slot and tokens are taken together, so no call holds a slot while waiting for budget. Only the
+    head of the queue is admitted, so a waiting BATCH call never takes budget ahead of an
+    INTERACTIVE one. Queue time, retries and errors are recorded for `metrics()`.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, tokens_per_minute: int = LLM_TOKENS_PER_MINUTE):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self._in_flight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._timer = None
+        self._stats = {
+            'calls': 0, 'errors': 0, 'retries': 0, 'queued': 0,
+            'queue_time_total': 0.0, 'queue_time_max': 0.0, 'tokens': 0,
+        }
+
+    def _cost(self, tokens: int) -> int:
+        return min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+
+    def _refill(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60)
+        self._refilled_at = now
+
+    def _try_take(self, cost: int) -> float:
+        """Takes `cost` tokens if available, returning 0, or else how long until they will be."""
+        if not cost:
+            return 0.0
+        with self._lock:
+            self._refill()
+            if self._tokens >= cost:
+                self._tokens -= cost
+                return 0.0
+            return (cost - self._tokens) * 60 / self.tokens_per_minute
+
+    def _dispatch(self):
+        """Admits waiters from the head of the queue while slots and tokens allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self._in_flight < self.max_in_flight:
+            _, _, future, cost = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._try_take(cost)
+            if delay > 0:
+                # The head waits for budget; nobody behind it may take tokens first
+                self._timer = self._loop.call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _wake(self):
+        # Budget may have been returned from a worker thread
+        if self._loop is not None and self._waiters:
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    async def acquire(self, priority: int = INTERACTIVE, tokens: int = 0):
+        """Waits for a slot and `tokens` of budget; both are taken when this returns."""
+        start = time.monotonic()
+        cost = self._cost(tokens)
+        self._loop = asyncio.get_running_loop()
+        if not self._waiters and self._in_flight < self.max_in_flight and self._try_take(cost) == 0:
+            self._in_flight += 1
+        else:
+            future = self._loop.create_future()
+            entry = (priority, next(self._seq), future, cost)
+            heapq.heappush(self._waiters, entry)
+            self._stats['queued'] += 1
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Admitted just before cancellation
+                    self.release()
+                    self.refund(tokens)
+                else:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._dispatch()
+                raise
+        waited = time.monotonic() - start
+        self._stats['queue_time_total'] += waited
+        self._stats['queue_time_max'] = max(self._stats['queue_time_max'], waited)
+        if waited > 1:
+            logger.info(f"LLM call waited {waited:.2f}s for admission (priority {priority})")
+
+    def release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def reserve_sync(self, tokens: int):
+        """Blocks until `tokens` of budget are available and takes them (for calls outside the event loop)."""
+        cost = self._cost(tokens)
+        while True:
+            delay = self._try_take(cost)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def refund(self, tokens: int):
+        """Returns the budget of an attempt that failed."""
+        cost = self._cost(tokens)
+        if cost:
+            with self._lock:
+                self._tokens = min(self.tokens_per_minute, self._tokens + cost)
+            self._wake()
+
+    def settle(self, estimated: int, actual: int = None):
+        """Corrects the bucket with the usage reported by the provider."""
+        used = actual if actual else estimated
+        self._stats['tokens'] += used
+        if actual and self.tokens_per_minute:
+            with self._lock:
+                self._tokens = min(self.tokens_per_minute, self._tokens + self._cost(estimated) - actual)
+            self._wake()
+
+    def record(self, key: str, value=1):
+        self._stats[key] += value
+
+    def metrics(self) -> dict:
+        stats = dict(self._stats)
+        calls = max(1, stats['calls'])
+        stats.update(
+            in_flight=self._in_flight,
+            waiting=sum(1 for w in self._waiters if not w[2].done()),
+            max_in_flight=self.max_in_flight,
+            tokens_per_minute=self.tokens_per_minute,
+            queue_time_avg=stats['queue_time_total'] / calls,
+        )
+        return stats
+
+
+_governor = LLMGovernor()
+
+
+def get_llm_governor() -> LLMGovernor:
+    """Get the process-wide LLM governor"""
+    return _governor
+
+
+def _usage_tokens(result):
+    usage = getattr(result, 'usage_metadata', None)
+    if isinstance(usage, dict):
+        return usage.get('total_tokens')
+    return None
+
+
+class LLMGateway:
+    """
+    Wraps a LangChain chat model so `ainvoke`, `astream` and `invoke` go through the shared
+    LLMGovernor (admission, priority, token budget) and retry transient errors with jittered
+    backoff. `with_structured_output` returns a gateway around the structured runnable; other
+    attributes are passed through to the wrapped model.
+
+    Synchronous `invoke` is budgeted and retried but does not take a slot, since it runs
+    outside the event loop's queue.
+    """
+
+    def __init__(self, llm, governor: LLMGovernor = None, max_retries: int = LLM_MAX_RETRIES):
+        self.llm = llm
+        self.governor = governor or get_llm_governor()
+        self.max_retries = max_retries
+
+    def __getattr__(self, name):
+        if name == 'llm':
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def with_structured_output(self, *args, **kwargs):
+        return LLMGateway(self.llm.with_structured_output(*args, **kwargs), self.governor, self.max_retries)
+
+    async def ainvoke(self, input, *args, **kwargs):
+        estimated = _estimate_tokens(input)
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self.governor.acquire(priority, estimated)
+            try:
+                self.governor.record('calls')
+                result = await self.llm.ainvoke(input, *args, **kwargs)
+            except Exception as e:
+                self.governor.record('errors')
+                self.governor.refund(estimated)
+                if attempt >= self.max_retries or not is_retriable(e):
+                    raise
+                error = e
+            else:
+                self.governor.settle(estimated, _usage_tokens(result))
+                return result
+            finally:
+                self.governor.release()
+            delay = _retry_delay(attempt)
+            self.governor.record('retries')
+            logger.warning(f"LLM call failed ({type(error).__name__}: {error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def astream(self, input, *args, **kwargs):
+        estimated = _estimate_tokens(input)
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            started = False
+            await self.governor.acquire(priority, estimated)
+            try:
+                self.governor.record('calls')
+                async for chunk in self.llm.astream(input, *args, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.governor.record('errors')
+                if not started:
+                    self.governor.refund(estimated)
+                # Once output was sent, a retry would duplicate it
+                if started or attempt >= self.max_retries or not is_retriable(e):
+                    raise
+                error = e
+            else:
+                self.governor.settle(estimated)
+                return
+            finally:
+                self.governor.release()
+            delay = _retry_delay(attempt)
+            self.governor.record('retries')
+            logger.warning(f"LLM stream failed ({type(error).__name__}: {error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def invoke(self, input, *args, **kwargs):
+        estimated = _estimate_tokens(input)
+        for attempt in range(self.max_retries + 1):
+            self.governor.reserve_sync(estimated)
+            try:
+                self.governor.record('calls')
+                result = self.llm.invoke(input, *args, **kwargs)
+            except Exception as e:
+                self.governor.record('errors')
+                self.governor.refund(estimated)
+                if attempt >= self.max_retries or not is_retriable(e):
+                    raise
+                delay = _retry_delay(attempt)
+                self.governor.record('retries')
+                logger.warning(f"LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                self.governor.settle(estimated, _usage_tokens(result))
+                return result
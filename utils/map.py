@@ -1,8 +1,19 @@
+import asyncio
 import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Optional
+from uuid import uuid4
+import aiohttp
 import requests
 import folium
-import os
+from folium.plugins import MarkerCluster
+from utils.cache_utils import SQLiteTTLCache
+from utils.geo_utils import covering_grid_size, geohash_bounds, geohash_encode, haversine_m, simplify_line
+from utils.poi_index import POI_TTL, get_poi_index
 
 # Configure logging
 logging.basicConfig(
@@ -11,26 +22,170 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+MAP_CACHE_PATH = os.environ.get('MAP_CACHE_PATH', './map_cache/map_cache.sqlite')
+# Cache lifetimes in seconds: places rarely move, roads change occasionally
+GEOCODE_TTL = float(os.environ.get('MAP_GEOCODE_TTL', 30 * 86400))
+ROUTE_TTL = float(os.environ.get('MAP_ROUTE_TTL', 86400))
+# Route endpoints are rounded to this many decimals for the cache key (4 decimals is about 11 m)
+ROUTE_COORD_DECIMALS = int(os.environ.get('MAP_ROUTE_COORD_DECIMALS', 4))
+# Uncovered POI cells sent to Overpass per request
+POI_CELLS_PER_QUERY = int(os.environ.get('MAP_POI_CELLS_PER_QUERY', 64))
+# Radius queries spanning more index cells than this skip the POI index and make one Overpass
+# radius query instead (cached as a whole); keep it well below MAP_POI_INDEX_MAX_CELLS
+POI_INDEX_MAX_QUERY_CELLS = int(os.environ.get('MAP_POI_INDEX_MAX_QUERY_CELLS', 256))
+# Route polylines are simplified to this deviation in meters before rendering (0 keeps every point)
+ROUTE_SIMPLIFY_TOLERANCE = float(os.environ.get('MAP_ROUTE_SIMPLIFY_TOLERANCE', 5))
+# Worker processes rendering folium maps for the async endpoint
+MAP_RENDER_WORKERS = int(os.environ.get('MAP_RENDER_WORKERS', 2))
+MAP_OUTPUT_DIR = os.environ.get('MAP_OUTPUT_DIR', os.path.join('output', 'maps'))
+# Disk budget of rendered maps in bytes; the oldest maps are deleted beyond it
+MAP_OUTPUT_MAX_BYTES = int(os.environ.get('MAP_OUTPUT_MAX_BYTES', 256 * 1024 ** 2))
+# Seconds a rendered map is kept at most
+MAP_OUTPUT_MAX_AGE = float(os.environ.get('MAP_OUTPUT_MAX_AGE', 7 * 86400))
+# Maps rendered this recently (seconds) are never deleted, so links just returned stay valid
+MAP_OUTPUT_EVICT_GRACE = float(os.environ.get('MAP_OUTPUT_EVICT_GRACE', 300))
+# Nominatim's usage policy allows one request per second
+NOMINATIM_MIN_INTERVAL = float(os.environ.get('NOMINATIM_MIN_INTERVAL', 1.0))
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+OSRM_URL = 'http://router.project-osrm.org/route/v1/driving/{start_lon},{start_lat};{end_lon},{end_lat}'
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+NOMINATIM_HEADERS = {
+    'User-Agent': 'YourAppName/1.0 (your.email@example.com)'  # Replace with your app's name and email
+}
+
+_map_cache = None
+_map_cache_lock = threading.Lock()
+
+
+def get_map_cache() -> SQLiteTTLCache:
+    """Get the process-wide geocode/route/POI cache (opened on first use)"""
+    global _map_cache
+    if _map_cache is None:
+        with _map_cache_lock:
+            if _map_cache is None:
+                _map_cache = SQLiteTTLCache(MAP_CACHE_PATH)
+    return _map_cache
+
+
+def normalize_location(location: str) -> str:
+    """Normalizes a location string for cache lookups (case, whitespace and punctuation spacing)."""
+    location = re.sub(r'\s*,\s*', ', ', location.strip().lower())
+    return re.sub(r'\s+', ' ', location).strip(' ,.')
+
+
+def _route_key(start_coords, end_coords) -> str:
+    return ';'.join(f"{round(c, ROUTE_COORD_DECIMALS)}" for c in (*start_coords, *end_coords))
+
+
+def _amenity_list(amenities: str) -> List[str]:
+    return sorted(set(a.strip().strip('"') for a in amenities.split('|') if a.strip().strip('"')))
+
+
+_nominatim_next = 0.0
+_nominatim_lock = threading.Lock()
+
+
+def _nominatim_delay() -> float:
+    """Reserves the next Nominatim request slot, returning how long to wait for it."""
+    global _nominatim_next
+    with _nominatim_lock:
+        now = time.monotonic()
+        slot = max(now, _nominatim_next)
+        _nominatim_next = slot + NOMINATIM_MIN_INTERVAL
+        return slot - now
+
+
+def _geocode_params(location: str, limit: int) -> dict:
+    return {'q': location, 'format': 'json', 'addressdetails': 1, 'limit': limit}
+
+
+def _parse_geocode(location: str, data) -> List[Tuple[str, float, float]]:
+    if data:
+        probable_locations = [(res['display_name'], float(res['lat']), float(res['lon'])) for res in data]
+        logger.info(f"Found {len(probable_locations)} probable locations for '{location}'.")
+        return probable_locations
+    logger.warning(f"No data found for location: {location}")
+    return []
+
+
+def _route_url(start_coords, end_coords) -> str:
+    start_lat, start_lon = start_coords
+    end_lat, end_lon = end_coords
+    return OSRM_URL.format(start_lon=start_lon, start_lat=start_lat, end_lon=end_lon, end_lat=end_lat)
+
+
+ROUTE_PARAMS = {'overview': 'full', 'geometries': 'geojson', 'steps': 'true'}
+
+
+def _parse_route(osrm_data) -> Optional[dict]:
+    if 'routes' in osrm_data and osrm_data['routes']:
+        logger.info("Route found between start and end coordinates.")
+        return osrm_data['routes'][0]
+    logger.warning("No route found.")
+    return None
+
+
+def _overpass_batches(missing) -> List[Tuple[dict, str]]:
+    """
+    Builds Overpass queries for uncovered cells, returning (cells -> amenities, query) pairs
+    of at most POI_CELLS_PER_QUERY cells each.
+    """
+    cells = list(missing)
+    batches = []
+    for i in range(0, len(cells), POI_CELLS_PER_QUERY):
+        batch = {cell: missing[cell] for cell in cells[i:i + POI_CELLS_PER_QUERY]}
+        statements = []
+        for cell, amenities in batch.items():
+            south, west, north, east = geohash_bounds(cell)
+            pattern = '|'.join(re.escape(a) for a in sorted(amenities))
+            statements.append(f'node["amenity"~"^({pattern})$"]({south},{west},{north},{east});')
+        batches.append((batch, "[out:json];\n(\n" + "\n".join(statements) + "\n);\nout body;"))
+    return batches
+
+
+def _uses_poi_index(location, radius, precision) -> bool:
+    return covering_grid_size(location[0], location[1], radius, precision) <= POI_INDEX_MAX_QUERY_CELLS
+
+
+def _radius_poi_key(location, radius, wanted) -> str:
+    # Centers within the same ~150 m cell share results
+    cell = geohash_encode(location[0], location[1], 7)
+    return f"{cell}|{radius}|{'|'.join(wanted)}"
+
+
+def _radius_query(location, radius, wanted) -> str:
+    pattern = '|'.join(re.escape(a) for a in wanted)
+    return f'[out:json];\nnode["amenity"~"^({pattern})$"](around:{radius},{location[0]},{location[1]});\nout body;'
+
+
+def _parse_radius_pois(location, data) -> List[Tuple[float, float, str]]:
+    pois = [
+        (haversine_m(location[0], location[1], e['lat'], e['lon']), e['lat'], e['lon'], e.get('tags', {}).get('name', 'Unnamed'))
+        for e in data.get('elements', [])
+    ]
+    pois.sort(key=lambda poi: poi[0])
+    return [poi[1:] for poi in pois]
+
+
 # Step 1: Get coordinates from Nominatim (OpenStreetMap API for geocoding) with multiple results
 def get_coordinates(location: str, limit: int = 3) -> List[Tuple[str, float, float]]:
     """
     Retrieves geographic coordinates (latitude, longitude) and display names for a given location using the Nominatim API.
+    Results are cached by normalized location.
     """
-    url = f'https://nominatim.openstreetmap.org/search?q={location}&format=json&addressdetails=1&limit={limit}'
-    headers = {
-        'User-Agent': 'YourAppName/1.0 (your.email@example.com)'  # Replace with your app's name and email
-    }
+    cache_key = f"{normalize_location(location)}|{limit}"
+    cached = get_map_cache().get('geocode', cache_key)
+    if cached is not None:
+        return [tuple(loc) for loc in cached]
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        time.sleep(_nominatim_delay())
+        response = requests.get(NOMINATIM_URL, params=_geocode_params(location, limit), headers=NOMINATIM_HEADERS, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        if data:
-            probable_locations = [(res['display_name'], float(res['lat']), float(res['lon'])) for res in data]
-            logger.info(f"Found {len(probable_locations)} probable locations for '{location}'.")
-            return probable_locations
-        else:
-            logger.warning(f"No data found for location: {location}")
-            return []
+        probable_locations = _parse_geocode(location, response.json())
+        if probable_locations:
+            get_map_cache().set('geocode', cache_key, probable_locations, GEOCODE_TTL)
+        return probable_locations
     except requests.RequestException as e:
         logger.error(f"Request error while getting coordinates for '{location}': {e}")
         return []
@@ -42,23 +197,19 @@ def get_coordinates(location: str, limit: int = 3) -> List[Tuple[str, float, flo
 def get_route(start_coords: Tuple[float, float], end_coords: Tuple[float, float]) -> Optional[dict]:
     """
     Retrieves a driving route between two coordinates using the OSRM API.
+    Routes are cached by rounded endpoint coordinates.
     """
-    start_lat, start_lon = start_coords
-    end_lat, end_lon = end_coords
-    osrm_url = (
-        f'http://router.project-osrm.org/route/v1/driving/'
-        f'{start_lon},{start_lat};{end_lon},{end_lat}?overview=full&geometries=geojson&steps=true'
-    )
+    cache_key = _route_key(start_coords, end_coords)
+    cached = get_map_cache().get('route', cache_key)
+    if cached is not None:
+        return cached
     try:
-        osrm_response = requests.get(osrm_url, timeout=10)
+        osrm_response = requests.get(_route_url(start_coords, end_coords), params=ROUTE_PARAMS, timeout=10)
         osrm_response.raise_for_status()
-        osrm_data = osrm_response.json()
-        if 'routes' in osrm_data and osrm_data['routes']:
-            logger.info("Route found between start and end coordinates.")
-            return osrm_data['routes'][0]
-        else:
-            logger.warning("No route found.")
-            return None
+        route = _parse_route(osrm_response.json())
+        if route:
+            get_map_cache().set('route', cache_key, route, ROUTE_TTL)
+        return route
     except requests.RequestException as e:
         logger.error(f"Request error while getting route: {e}")
         return None
@@ -73,33 +224,132 @@ def get_pois(
     amenities: str = "restaurant|cafe|bar|hotel"
 ) -> List[Tuple[float, float, str]]:
     """
-    Retrieves points of interest (POIs) around a given location using the Overpass API.
-    """
-    lat, lon = location
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json];
-    node
-      [amenity~"{amenities}"]
-      (around:{radius},{lat},{lon});
-    out body;
+    Retrieves points of interest (POIs) around a given location, nearest first.
+    Answered from the local POI index; only geohash cells it does not cover yet are fetched from the Overpass API.
     """
+    index = get_poi_index()
+    wanted = _amenity_list(amenities)
+    if not _uses_poi_index(location, radius, index.precision):
+        return _get_radius_pois(location, radius, wanted)
+    for batch, query in _overpass_batches(index.missing(location, radius, wanted)):
+        try:
+            response = requests.get(OVERPASS_URL, params={'data': query}, timeout=20)
+            response.raise_for_status()
+            index.add(batch, response.json().get('elements', []))
+        except requests.RequestException as e:
+            logger.error(f"Request error while getting POIs: {e}")
+            break
+        except Exception as e:
+            logger.error(f"Unexpected error in get_pois: {e}")
+            break
+    pois = index.search(location, radius, wanted)
+    logger.info(f"Found {len(pois)} POIs near ({location[0]}, {location[1]}).")
+    return pois
+
+
+def _get_radius_pois(location, radius, wanted) -> List[Tuple[float, float, str]]:
+    """get_pois for radii too large for the POI index: one Overpass radius query, cached whole."""
+    cache_key = _radius_poi_key(location, radius, wanted)
+    cached = get_map_cache().get('pois', cache_key)
+    if cached is not None:
+        return [tuple(poi) for poi in cached]
     try:
-        response = requests.get(overpass_url, params={'data': overpass_query}, timeout=20)
+        response = requests.get(OVERPASS_URL, params={'data': _radius_query(location, radius, wanted)}, timeout=20)
         response.raise_for_status()
-        data = response.json()
-        pois = [
-            (element['lat'], element['lon'], element['tags'].get('name', 'Unnamed'))
-            for element in data.get('elements', [])
-        ]
-        logger.info(f"Found {len(pois)} POIs near ({lat}, {lon}).")
-        return pois
-    except requests.RequestException as e:
-        logger.error(f"Request error while getting POIs: {e}")
+        pois = _parse_radius_pois(location, response.json())
+    except Exception as e:
+        logger.error(f"Error while getting POIs: {e}")
         return []
+    get_map_cache().set('pois', cache_key, pois, POI_TTL)
+    logger.info(f"Found {len(pois)} POIs near ({location[0]}, {location[1]}).")
+    return pois
+
+
+# Async client: same caches, aiohttp instead of blocking requests
+async def aget_coordinates(session: aiohttp.ClientSession, location: str, limit: int = 3) -> List[Tuple[str, float, float]]:
+    """Async variant of get_coordinates."""
+    cache_key = f"{normalize_location(location)}|{limit}"
+    cached = await asyncio.to_thread(get_map_cache().get, 'geocode', cache_key)
+    if cached is not None:
+        return [tuple(loc) for loc in cached]
+    try:
+        await asyncio.sleep(_nominatim_delay())
+        async with session.get(NOMINATIM_URL, params=_geocode_params(location, limit), headers=NOMINATIM_HEADERS,
+                               timeout=aiohttp.ClientTimeout(total=10)) as response:
+            response.raise_for_status()
+            probable_locations = _parse_geocode(location, await response.json(content_type=None))
+        if probable_locations:
+            await asyncio.to_thread(get_map_cache().set, 'geocode', cache_key, probable_locations, GEOCODE_TTL)
+        return probable_locations
+    except Exception as e:
+        logger.error(f"Error while getting coordinates for '{location}': {e}")
+        return []
+
+
+async def aget_route(session: aiohttp.ClientSession, start_coords: Tuple[float, float], end_coords: Tuple[float, float]) -> Optional[dict]:
+    """Async variant of get_route."""
+    cache_key = _route_key(start_coords, end_coords)
+    cached = await asyncio.to_thread(get_map_cache().get, 'route', cache_key)
+    if cached is not None:
+        return cached
+    try:
+        async with session.get(_route_url(start_coords, end_coords), params=ROUTE_PARAMS,
+                               timeout=aiohttp.ClientTimeout(total=10)) as response:
+            response.raise_for_status()
+            route = _parse_route(await response.json(content_type=None))
+        if route:
+            await asyncio.to_thread(get_map_cache().set, 'route', cache_key, route, ROUTE_TTL)
+        return route
     except Exception as e:
-        logger.error(f"Unexpected error in get_pois: {e}")
+        logger.error(f"Error while getting route: {e}")
+        return None
+
+
+async def aget_pois(
+    session: aiohttp.ClientSession,
+    location: Tuple[float, float],
+    radius: int = 500,
+    amenities: str = "restaurant|cafe|bar|hotel"
+) -> List[Tuple[float, float, str]]:
+    """Async variant of get_pois."""
+    # SQLite work (and the index lock shared with sync callers) stays off the event loop
+    index = await asyncio.to_thread(get_poi_index)
+    wanted = _amenity_list(amenities)
+    if not _uses_poi_index(location, radius, index.precision):
+        return await _aget_radius_pois(session, location, radius, wanted)
+    missing = await asyncio.to_thread(index.missing, location, radius, wanted)
+    for batch, query in _overpass_batches(missing):
+        try:
+            async with session.get(OVERPASS_URL, params={'data': query},
+                                   timeout=aiohttp.ClientTimeout(total=20)) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            await asyncio.to_thread(index.add, batch, data.get('elements', []))
+        except Exception as e:
+            logger.error(f"Error while getting POIs: {e}")
+            break
+    pois = await asyncio.to_thread(index.search, location, radius, wanted)
+    logger.info(f"Found {len(pois)} POIs near ({location[0]}, {location[1]}).")
+    return pois
+
+
+async def _aget_radius_pois(session, location, radius, wanted) -> List[Tuple[float, float, str]]:
+    """Async variant of _get_radius_pois."""
+    cache_key = _radius_poi_key(location, radius, wanted)
+    cached = await asyncio.to_thread(get_map_cache().get, 'pois', cache_key)
+    if cached is not None:
+        return [tuple(poi) for poi in cached]
+    try:
+        async with session.get(OVERPASS_URL, params={'data': _radius_query(location, radius, wanted)},
+                               timeout=aiohttp.ClientTimeout(total=20)) as response:
+            response.raise_for_status()
+            pois = _parse_radius_pois(location, await response.json(content_type=None))
+    except Exception as e:
+        logger.error(f"Error while getting POIs: {e}")
         return []
+    await asyncio.to_thread(get_map_cache().set, 'pois', cache_key, pois, POI_TTL)
+    logger.info(f"Found {len(pois)} POIs near ({location[0]}, {location[1]}).")
+    return pois
 
 # Step 4: Create and display the map with route and POIs
 def create_map(
@@ -111,33 +361,30 @@ def create_map(
 ) -> folium.Map:
     """
     Creates a Folium map displaying the route between two locations and POIs around the start and end points.
+    The route is simplified (Douglas-Peucker, MAP_ROUTE_SIMPLIFY_TOLERANCE meters) and the POIs are clustered.
     """
     m = folium.Map(location=[start_coords[0], start_coords[1]], zoom_start=13)
     folium.Marker(location=[start_coords[0], start_coords[1]], popup="Start").add_to(m)
     folium.Marker(location=[end_coords[0], end_coords[1]], popup="End").add_to(m)
     try:
         folium.PolyLine(
-            locations=[[lat, lon] for lon, lat in route_coords],
+            locations=[[lat, lon] for lon, lat in simplify_line(route_coords, ROUTE_SIMPLIFY_TOLERANCE)],
             color="blue",
             weight=5
         ).add_to(m)
     except Exception as e:
         logger.error(f"Error adding route polyline: {e}")
 
-    if pois_start:
-        for lat, lon, name in pois_start:
-            folium.Marker(
-                location=[lat, lon],
-                popup=name,
-                icon=folium.Icon(color='green', icon='info-sign')
-            ).add_to(m)
-    if pois_end:
-        for lat, lon, name in pois_end:
+    pois = (pois_start or []) + (pois_end or [])
+    if pois:
+        # Clustered markers keep dense POI sets readable and cheap to draw
+        cluster = MarkerCluster(name="Points of interest").add_to(m)
+        for lat, lon, name in pois:
             folium.Marker(
                 location=[lat, lon],
                 popup=name,
                 icon=folium.Icon(color='green', icon='info-sign')
-            ).add_to(m)
+            ).add_to(cluster)
     return m
 
 # Helper function to automatically fix destinations based on probable locations
@@ -169,6 +416,121 @@ def get_route_directions(route_data: dict) -> str:
         logger.error(f"Error generating route directions: {e}")
     return "\n".join(directions)
 
+START_NOT_FOUND = "Could not determine start location. Else rate limit reached. Try to find on internet or be less specific."
+END_NOT_FOUND = "Could not determine end location. Else rate limit reached. Try to find on internet or be less specific."
+
+
+def _locations_text(start_location, end_location, start_coords, end_coords) -> str:
+    locations = ''
+    if start_location:
+        if not start_coords:
+            logger.error("Could not determine start location.")
+            locations += START_NOT_FOUND
+        else:
+            locations += f"Start location: {start_coords[0]} (Lat: {start_coords[1]}, Lon: {start_coords[2]})\n"
+    if end_location:
+        if not end_coords:
+            logger.error("Could not determine end location.")
+            locations += END_NOT_FOUND
+        else:
+            locations += f"End location: {end_coords[0]} (Lat: {end_coords[1]}, Lon: {end_coords[2]})\n"
+    if not start_location and not end_location:
+        locations = "No start or end location provided."
+    return locations
+
+
+def _missing_endpoints_error(start_coords, end_coords) -> Optional[str]:
+    if not start_coords and not end_coords:
+        logger.error("Neither start nor end location provided or found.")
+        return "Neither start nor end location provided or found. Else rate limit reached"
+    err = ''
+    if not start_coords:
+        logger.error("Could not determine start location.")
+        err += START_NOT_FOUND + " "
+    if not end_coords:
+        logger.error("Could not determine end location.")
+        err += END_NOT_FOUND
+    return err.strip() or None
+
+
+def _prune_map_outputs():
+    """
+    Deletes rendered maps older than MAP_OUTPUT_MAX_AGE, then the oldest ones until the directory
+    fits MAP_OUTPUT_MAX_BYTES. Maps younger than MAP_OUTPUT_EVICT_GRACE are always kept.
+    """
+    now = time.time()
+    maps = []
+    with os.scandir(MAP_OUTPUT_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.startswith('map_') and entry.name.endswith('.html'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                maps.append((stat.st_mtime, entry.path, stat.st_size))
+    maps.sort()
+    total = sum(size for _, _, size in maps)
+    evict = []
+    for mtime, path, size in maps:
+        if mtime >= now - MAP_OUTPUT_EVICT_GRACE:
+            break
+        if total <= MAP_OUTPUT_MAX_BYTES and mtime >= now - MAP_OUTPUT_MAX_AGE:
+            break
+        evict.append(path)
+        total -= size
+    for path in evict:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another render worker got there first
+            pass
+    if evict:
+        logger.info(f"Deleted {len(evict)} old maps ({total} bytes kept)")
+
+
+def _save_route_map(start_coords, end_coords, route_data, pois_start, pois_end) -> str:
+    """Renders the route map to a file of its own, returning the result text (blocking)."""
+    m = create_map(
+        (start_coords[1], start_coords[2]),
+        (end_coords[1], end_coords[2]),
+        route_data['geometry']['coordinates'],
+        pois_start,
+        pois_end
+    )
+    os.makedirs(MAP_OUTPUT_DIR, exist_ok=True)
+    map_path = os.path.join(MAP_OUTPUT_DIR, f"map_{str(uuid4())[:8]}.html")
+    m.save(map_path)
+    logger.info(f"Map generated and saved as '{map_path}'.")
+    try:
+        _prune_map_outputs()
+    except OSError as e:
+        logger.warning(f"Could not prune old maps: {e}")
+    return get_route_directions(route_data) + f"\n\nPoints of interest around start: {pois_start}, end: {pois_end}. Map saved as '{map_path}'." + \
+        "start location: " + str(start_coords) + ", end location: " + str(end_coords[0])
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_map_render_pool() -> ProcessPoolExecutor:
+    """Get the process pool rendering maps off the event loop (started on first use)"""
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(max_workers=MAP_RENDER_WORKERS)
+    return _render_pool
+
+
+def shutdown_map_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False, cancel_futures=True)
+            _render_pool = None
+
+
 # Main function to handle all logic and display map
 def generate_map(
     start_location: Optional[str] = None,
@@ -184,70 +546,73 @@ def generate_map(
     Handles cases where start or end can be None.
     """
     try:
+        start_coords = auto_fix_destination(start_location, limit) if start_location else None
+        end_coords = auto_fix_destination(end_location, limit) if end_location else None
         if task == 'location_only':
-            locations = ''
-            if start_location:
-                start_coords = auto_fix_destination(start_location, limit)
-                if not start_coords:
-                    logger.error("Could not determine start location.")
-                    locations += "Could not determine start location. Else rate limit reached. Try to find on internet or be less specific."
-                else:
-                    locations += f"Start location: {start_coords[0]} (Lat: {start_coords[1]}, Lon: {start_coords[2]})\n"
-            if end_location:
-                end_coords = auto_fix_destination(end_location, limit)
-                if not end_coords:
-                    logger.error("Could not determine end location.")
-                    locations += "Could not determine end location. Else rate limit reached. Try to find on internet or be less specific."
-                else:
-                    locations += f"End location: {end_coords[0]} (Lat: {end_coords[1]}, Lon: {end_coords[2]})\n"
-            if not start_location and not end_location:
-                locations = "No start or end location provided."
-            return locations
+            return _locations_text(start_location, end_location, start_coords, end_coords)
 
         elif task == 'route_and_pois':
-            err = ''
-            start_coords = auto_fix_destination(start_location, limit) if start_location else None
-            end_coords = auto_fix_destination(end_location, limit) if end_location else None
-
-            if not start_coords and not end_coords:
-                logger.error("Neither start nor end location provided or found.")
-                return "Neither start nor end location provided or found. Else rate limit reached"
-
-            if not start_coords:
-                logger.error("Could not determine start location.")
-                err += "Could not determine start location. Else rate limit reached. Try to find on internet or be less specific. "
-
-            if not end_coords:
-                logger.error("Could not determine end location.")
-                err += "Could not determine end location. Else rate limit reached. Try to find on internet or be less specific."
-
-            if not start_coords or not end_coords:
-                logger.error("Could not determine start or end location.")
-                return err.strip()
+            err = _missing_endpoints_error(start_coords, end_coords)
+            if err:
+                return err
 
             route_data = get_route((start_coords[1], start_coords[2]), (end_coords[1], end_coords[2]))
             if not route_data:
                 logger.error("No route data found.")
                 return "No route data found. Else rate limit reached"
 
-            route_coords = route_data['geometry']['coordinates']
             pois_start = get_pois((start_coords[1], start_coords[2]), radius=pois_radius, amenities=amenities)
             pois_end = get_pois((end_coords[1], end_coords[2]), radius=pois_radius, amenities=amenities)
-            m = create_map(
-                (start_coords[1], start_coords[2]),
-                (end_coords[1], end_coords[2]),
-                route_coords,
-                pois_start,
-                pois_end
-            )
-            
-            output_folder = "output"
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-            m.save(os.path.join(output_folder, "map_with_route_and_pois.html"))
-            logger.info("Map generated and saved as 'map_with_route_and_pois.html'.")
-            return get_route_directions(route_data) + f"\n\nPoints of interest around start: {pois_start}, end: {pois_end}. Map saved as 'map_with_route_and_pois.html'." + \
-                "start location: " + str(start_coords) + ", end location: " + str(end_coords[0])
+            return _save_route_map(start_coords, end_coords, route_data, pois_start, pois_end)
+    except Exception as e:
+        logger.error(f"Error in map functions: {e},Else rate limit reached")
+        return f"Error in map functions: {e},Else rate limit reached"
+
+
+async def agenerate_map(
+    start_location: Optional[str] = None,
+    end_location: Optional[str] = None,
+    pois_radius: int = 500,
+    amenities: str = "restaurant|cafe|bar|hotel",
+    limit: int = 3,
+    task: str = "route_and_pois"
+) -> str:
+    """
+    Async variant of generate_map: geocodes start and end concurrently, then fetches the route and
+    the POIs around both ends concurrently (all through the map cache), and renders the map in the
+    map render process pool.
+    """
+    try:
+        async with aiohttp.ClientSession() as session:
+            async def geocode(location):
+                if not location:
+                    return None
+                probable_locations = await aget_coordinates(session, location, limit)
+                if probable_locations:
+                    logger.info(f"Auto-selected location: {probable_locations[0][0]}")
+                    return probable_locations[0]
+                logger.warning(f"Could not auto-fix destination for: {location}")
+                return None
+
+            start_coords, end_coords = await asyncio.gather(geocode(start_location), geocode(end_location))
+            if task == 'location_only':
+                return _locations_text(start_location, end_location, start_coords, end_coords)
+
+            elif task == 'route_and_pois':
+                err = _missing_endpoints_error(start_coords, end_coords)
+                if err:
+                    return err
+                start, end = (start_coords[1], start_coords[2]), (end_coords[1], end_coords[2])
+                route_data, pois_start, pois_end = await asyncio.gather(
+                    aget_route(session, start, end),
+                    aget_pois(session, start, radius=pois_radius, amenities=amenities),
+                    aget_pois(session, end, radius=pois_radius, amenities=amenities),
+                )
+                if not route_data:
+                    logger.error("No route data found.")
+                    return "No route data found. Else rate limit reached"
+                return await asyncio.get_running_loop().run_in_executor(
+                    get_map_render_pool(), _save_route_map, start_coords, end_coords, route_data, pois_start, pois_end)
     except Exception as e:
         logger.error(f"Error in map functions: {e},Else rate limit reached")
-        return f"Error in map functions: {e},Else rate limit reached"
\ No newline at end of file
+        return f"Error in map functions: {e},Else rate limit reached"
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+import fitz
+import pymupdf4llm
+from markdownify import markdownify
+
+logger = logging.getLogger(__name__)
+
+# Pages converted per worker task
+PDF_SHARD_PAGES = int(os.environ.get('PDF_SHARD_PAGES', 16))
+# PDFs with fewer pages are converted in a single task
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 32))
+# Query-time limits for remote PDFs (0 disables the limit)
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 0))
+PDF_DEADLINE_SECONDS = float(os.environ.get('PDF_DEADLINE_SECONDS', 0))
+
+
+def pdf_page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def convert_pdf_pages(path: str, start: int, end: int, markdownify_output: bool = False) -> str:
+    """
+    Converts pages [start, end) of a PDF file to markdown. Runs in a worker process.
+
+    Args:
+        path (str): Path of the PDF file.
+        start (int): First page (0-based, inclusive).
+        end (int): Last page (exclusive).
+        markdownify_output (bool): Pass the result through markdownify, as done for remote PDFs.
+
+    Returns:
+        str: Markdown of the page range.
+    """
+    with fitz.open(path) as doc:
+        text_content = pymupdf4llm.to_markdown(doc, pages=list(range(start, end)))
+    return markdownify(text_content) if markdownify_output else text_content
+
+
+def shard_page_ranges(page_count: int, shard_pages: int = PDF_SHARD_PAGES, min_parallel_pages: int = PDF_PARALLEL_MIN_PAGES):
+    """Splits [0, page_count) into consecutive page ranges, one per worker task."""
+    if page_count <= min_parallel_pages:
+        return [(0, page_count)] if page_count else []
+    shard_pages = max(1, shard_pages)
+    return [(start, min(start + shard_pages, page_count)) for start in range(0, page_count, shard_pages)]
+
+
+async def iter_pdf_markdown(path: str, executor, max_pages: Optional[int] = None, deadline: Optional[float] = None,
+                            markdownify_output: bool = False):
+    """
+    Converts a PDF across the executor in page-range shards and yields the markdown in page order.
+
+    All shards are submitted at once; results are yielded as soon as every earlier shard is done.
+    Conversion stops at `max_pages` pages, and once `deadline` seconds have passed the pages
+    converted so far are kept and the remaining shards are cancelled.
+
+    Args:
+        path (str): Path of the PDF file.
+        executor (concurrent.futures.Executor): Pool the shards run in.
+        max_pages (int, optional): Convert at most this many pages.
+        deadline (float, optional): Time budget in seconds for the whole conversion.
+        markdownify_output (bool): Pass each shard through markdownify.
+
+    Yields:
+        tuple: (start_page, end_page, markdown) for each shard.
+    """
+    loop = asyncio.get_event_loop()
+    page_count = await loop.run_in_executor(None, pdf_page_count, path)
+    if max_pages and page_count > max_pages:
+        logger.info(f"Limiting {path} to {max_pages} of {page_count} pages")
+        page_count = max_pages
+    ranges = shard_page_ranges(page_count)
+    logger.info(f"Converting {page_count} PDF pages in {len(ranges)} shard(s)")
+
+    started = loop.time()
+    futures = [
+        loop.run_in_executor(executor, convert_pdf_pages, path, start, end, markdownify_output)
+        for start, end in ranges
+    ]
+    try:
+        for (start, end), future in zip(ranges, futures):
+            timeout = max(0.0, deadline - (loop.time() - started)) if deadline else None
+            try:
+                markdown_content = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"PDF conversion deadline of {deadline}s reached at page {start} of {page_count}")
+                break
+            except Exception as e:
+                logger.error(f"Error converting PDF pages {start}-{end}: {e}")
+                continue
+            yield start, end, markdown_content
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class PDFConversion(NamedTuple):
+    """Markdown of a PDF and whether every page made it in (no page cap, deadline cut or failed shard)."""
+    markdown: str
+    complete: bool
+
+
+async def pdf_to_markdown_async(path: str, executor, max_pages: Optional[int] = None, deadline: Optional[float] = None,
+                                markdownify_output: bool = False) -> PDFConversion:
+    """
+    Converts a PDF file to markdown using page-parallel conversion (see iter_pdf_markdown).
+
+    Returns:
+        PDFConversion: The markdown of all converted pages, in page order, and whether it is complete.
+    """
+    parts = []
+    converted = 0
+    async for start, end, markdown_content in iter_pdf_markdown(path, executor, max_pages, deadline, markdownify_output):
+        parts.append(markdown_content)
+        converted += end - start
+    page_count = await asyncio.get_event_loop().run_in_executor(None, pdf_page_count, path)
+    return PDFConversion(''.join(parts), converted >= page_count)
+
+
+async def pdf_bytes_to_markdown_async(content: bytes, executor, max_pages: Optional[int] = None,
+                                      deadline: Optional[float] = None, markdownify_output: bool = True) -> PDFConversion:
+    """
+    Converts downloaded PDF bytes to markdown. The bytes are written to a temporary file once
+    so that shards only receive a path instead of a copy of the whole document.
+    """
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        return await pdf_to_markdown_async(path, executor, max_pages, deadline, markdownify_output)
+    finally:
+        os.remove(path)
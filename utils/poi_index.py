@@ -0,0 +1,172 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from utils.geo_utils import EARTH_RADIUS_M, cells_covering, geohash_encode
+
+logger = logging.getLogger(__name__)
+
+POI_INDEX_PATH = os.environ.get('MAP_POI_INDEX_PATH', './map_cache/poi_index.sqlite')
+# Geohash length of the coverage cells (6 characters is about 1.2 km x 0.6 km)
+POI_CELL_PRECISION = int(os.environ.get('MAP_POI_CELL_PRECISION', 6))
+# Seconds before a cell's POIs of an amenity are fetched again
+POI_TTL = float(os.environ.get('MAP_POI_TTL', 7 * 86400))
+# Cells kept in memory; least recently used ones are reloaded from SQLite when needed
+POI_INDEX_MAX_CELLS = int(os.environ.get('MAP_POI_INDEX_MAX_CELLS', 4096))
+
+
+class _Cell:
+    """POIs of one geohash cell as parallel arrays, plus the amenities the cell is covered for."""
+
+    __slots__ = ('lats', 'lons', 'codes', 'names', 'covered')
+
+    def __init__(self, rows, covered: Dict[str, float], vocabulary: Dict[str, int]):
+        self.lats = np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows))
+        self.lons = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        self.codes = np.fromiter((vocabulary.setdefault(r[2], len(vocabulary)) for r in rows),
+                                 dtype=np.uint16, count=len(rows))
+        self.names = [r[3] for r in rows]
+        self.covered = covered
+
+
+class POIIndex:
+    """
+    Local spatial store of Overpass POIs, indexed by geohash cell.
+
+    A cell is "covered" for an amenity once all its nodes of that amenity were fetched, so a
+    radius query only needs the network for the (cell, amenity) pairs it touches that are not
+    covered yet (see `missing`). Everything else is answered by `search` from per-cell arrays.
+    Cells live in SQLite and are loaded into memory on first use. Safe to use from worker threads.
+    """
+
+    def __init__(self, path: str = POI_INDEX_PATH, ttl: float = POI_TTL, precision: int = POI_CELL_PRECISION,
+                 max_cells: int = POI_INDEX_MAX_CELLS):
+        self.path = path
+        self.ttl = ttl
+        self.precision = precision
+        self.max_cells = max_cells
+        self._cells = OrderedDict()
+        self._vocabulary = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pois (cell TEXT, osm_id INTEGER, amenity TEXT, lat REAL, lon REAL, "
+                "name TEXT, PRIMARY KEY (cell, osm_id))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS coverage (cell TEXT, amenity TEXT, fetched_at REAL, "
+                "PRIMARY KEY (cell, amenity))"
+            )
+
+    def _cell(self, cell: str) -> _Cell:
+        # Caller holds the lock
+        entry = self._cells.get(cell)
+        if entry is not None:
+            self._cells.move_to_end(cell)
+            return entry
+        rows = self._db.execute("SELECT lat, lon, amenity, name FROM pois WHERE cell = ?", (cell,)).fetchall()
+        covered = dict(self._db.execute("SELECT amenity, fetched_at FROM coverage WHERE cell = ?", (cell,)))
+        entry = self._cells[cell] = _Cell(rows, covered, self._vocabulary)
+        while len(self._cells) > self.max_cells:
+            self._cells.popitem(last=False)
+        return entry
+
+    def missing(self, location: Tuple[float, float], radius: float, amenities: Iterable[str]) -> Dict[str, Set[str]]:
+        """
+        Finds what a radius query still needs from the network.
+
+        Returns:
+            dict: Geohash cell -> amenities that are not (or no longer) covered in that cell.
+        """
+        fresh_after = time.time() - self.ttl
+        missing = {}
+        with self._lock:
+            for cell in cells_covering(location[0], location[1], radius, self.precision):
+                covered = self._cell(cell).covered
+                stale = {a for a in amenities if covered.get(a, 0) < fresh_after}
+                if stale:
+                    missing[cell] = stale
+        return missing
+
+    def add(self, fetched: Dict[str, Set[str]], elements: List[dict]):
+        """
+        Stores the Overpass nodes fetched for `fetched` (cell -> amenities) and marks those
+        pairs covered. Nodes outside the fetched pairs are ignored.
+        """
+        rows = []
+        for element in elements:
+            tags = element.get('tags', {})
+            amenity = tags.get('amenity')
+            cell = geohash_encode(element['lat'], element['lon'], self.precision)
+            if amenity in fetched.get(cell, ()):
+                rows.append((cell, element['id'], amenity, element['lat'], element['lon'], tags.get('name', 'Unnamed')))
+        pairs = [(cell, amenity) for cell, amenities in fetched.items() for amenity in amenities]
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM pois WHERE cell = ? AND amenity = ?", pairs)
+            self._db.executemany("INSERT OR REPLACE INTO pois VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany("INSERT OR REPLACE INTO coverage VALUES (?, ?, ?)",
+                                 [(cell, amenity, now) for cell, amenity in pairs])
+            for cell in fetched:
+                # Reloaded with the new rows on next use
+                self._cells.pop(cell, None)
+        logger.info(f"Indexed {len(rows)} POIs in {len(fetched)} cells.")
+
+    def search(self, location: Tuple[float, float], radius: float, amenities: Iterable[str]) -> List[Tuple[float, float, str]]:
+        """
+        Returns the stored POIs of `amenities` within `radius` meters of `location`, nearest first.
+        """
+        lat, lon = np.radians(location[0]), np.radians(location[1])
+        found = []
+        with self._lock:
+            codes = [self._vocabulary.setdefault(a, len(self._vocabulary)) for a in amenities]
+            for cell in cells_covering(location[0], location[1], radius, self.precision):
+                entry = self._cell(cell)
+                mask = np.isin(entry.codes, codes)
+                if not mask.any():
+                    continue
+                lats, lons = entry.lats[mask], entry.lons[mask]
+                # Vectorized haversine
+                dphi, dlmb = np.radians(lats) - lat, np.radians(lons) - lon
+                a = np.sin(dphi / 2) ** 2 + np.cos(lat) * np.cos(np.radians(lats)) * np.sin(dlmb / 2) ** 2
+                distances = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+                names = [name for name, keep in zip(entry.names, mask) if keep]
+                for i in np.flatnonzero(distances <= radius):
+                    found.append((distances[i], float(lats[i]), float(lons[i]), names[i]))
+        found.sort(key=lambda poi: poi[0])
+        return [poi[1:] for poi in found]
+
+    def prune(self) -> int:
+        """Deletes expired coverage and its POIs, returning how many (cell, amenity) pairs were removed."""
+        cutoff = time.time() - self.ttl
+        with self._lock, self._db:
+            expired = self._db.execute("SELECT cell, amenity FROM coverage WHERE fetched_at < ?", (cutoff,)).fetchall()
+            self._db.executemany("DELETE FROM pois WHERE cell = ? AND amenity = ?", expired)
+            self._db.execute("DELETE FROM coverage WHERE fetched_at < ?", (cutoff,))
+            self._cells.clear()
+        return len(expired)
+
+
+_poi_index = None
+_poi_index_lock = threading.Lock()
+
+
+def get_poi_index() -> POIIndex:
+    """Get the process-wide POI index (opened on first use)"""
+    global _poi_index
+    if _poi_index is None:
+        with _poi_index_lock:
+            if _poi_index is None:
+                _poi_index = POIIndex()
+                removed = _poi_index.prune()
+                if removed:
+                    logger.info(f"Pruned {removed} expired POI cells")
+    return _poi_index
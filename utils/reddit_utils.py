@@ -1,10 +1,15 @@
-import requests
+import asyncio
+import logging
+import os
 import time
-import random
+import aiohttp
 from utils.config import *
 from utils.utils import *
+from utils.cache_utils import TTLCache
 from rank_bm25 import BM25Okapi
 
+logger = logging.getLogger(__name__)
+
 # Define the user agent and headers
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -19,12 +24,105 @@ url_templates = {
     'url': '{url}.json'
 }
 
+# Sustained request rate and burst size towards reddit.com
+REDDIT_REQUESTS_PER_MINUTE = float(os.environ.get('REDDIT_REQUESTS_PER_MINUTE', 30))
+REDDIT_BURST = int(os.environ.get('REDDIT_BURST', 5))
+# How long listing and comment-thread JSON is reused (seconds)
+REDDIT_LISTING_TTL = float(os.environ.get('REDDIT_LISTING_TTL', 120))
+REDDIT_COMMENTS_TTL = float(os.environ.get('REDDIT_COMMENTS_TTL', 300))
+REDDIT_MAX_RETRIES = int(os.environ.get('REDDIT_MAX_RETRIES', 2))
+REDDIT_TIMEOUT = float(os.environ.get('REDDIT_TIMEOUT', 20))
+
+
+class AsyncTokenBucket:
+    """
+    Async token bucket: `acquire` waits until a request may be sent. Waiters are served in order,
+    and `pause_for` blocks all requests, e.g. until a server-announced rate-limit reset.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause_for(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_bucket = AsyncTokenBucket(REDDIT_REQUESTS_PER_MINUTE, REDDIT_BURST)
+_json_cache = TTLCache(ttl=REDDIT_LISTING_TTL, max_entries=512)
+
+
+def _apply_rate_limit_headers(response_headers):
+    """Pauses requests when Reddit reports the rate-limit window is used up (X-Ratelimit-* headers)."""
+    try:
+        remaining = float(response_headers.get('x-ratelimit-remaining', 'inf'))
+        reset = float(response_headers.get('x-ratelimit-reset', 0))
+    except ValueError:
+        return
+    if remaining < 1 and reset > 0:
+        logger.warning(f"Reddit rate limit reached, pausing requests for {reset:.0f}s")
+        _bucket.pause_for(reset)
+
+
+async def _get_json(session, url, ttl):
+    """GETs Reddit JSON through the cache and the shared token bucket, retrying after 429s."""
+    cached = _json_cache.get(url)
+    if cached is not None:
+        return cached
+    for attempt in range(REDDIT_MAX_RETRIES + 1):
+        await _bucket.acquire()
+        async with session.get(url, headers=headers) as response:
+            _apply_rate_limit_headers(response.headers)
+            if response.status == 429 and attempt < REDDIT_MAX_RETRIES:
+                retry_after = response.headers.get('retry-after') or response.headers.get('x-ratelimit-reset') or 5
+                logger.warning(f"Reddit returned 429 for {url}, retrying in {float(retry_after):.1f}s")
+                _bucket.pause_for(float(retry_after))
+                continue
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        _json_cache.set(url, data, ttl)
+        return data
+
+
+def _reddit_session():
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REDDIT_TIMEOUT))
+
+
+def _parse_comments(thread, limit):
+    comments = []
+    for comment in thread[1]['data']['children'][:limit]:
+        if comment['kind'] == 't1':  # Check if it's a comment (not a more comment or other kind)
+            comments.append(comment['data']['body'])
+    return comments
+
+
 # Function to fetch and parse Reddit posts
-def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='all', custom_url=None, search_query=None, sort_type='relevance'):
+async def fetch_reddit_posts(session, subreddit=None, url_type='hot', limit=10, time_filter='all', custom_url=None, search_query=None, sort_type='relevance', comments_limit=0):
     """
     Fetches posts from Reddit based on the provided subreddit, URL type, and query parameters.
 
     Args:
+        session (aiohttp.ClientSession): Session to fetch with.
         subreddit (str, optional): The subreddit to fetch posts from (e.g., 'python'). Defaults to None.
         url_type (str): The type of posts to fetch ('hot', 'new', 'top', 'search', 'url'). Defaults to 'hot'.
         limit (int, optional): The number of posts to retrieve. Defaults to 10.
@@ -32,6 +130,8 @@ def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='al
         custom_url (str, optional): A custom Reddit URL for fetching posts. Defaults to None.
         search_query (str, optional): Search query to fetch specific posts. Defaults to None.
         sort_type (str, optional): Sorting type for search results ('relevance', 'new', 'top'). Defaults to 'relevance'.
+        comments_limit (int, optional): For 'url', the number of comments taken from the thread that is
+            already fetched. Defaults to 0.
 
     Returns:
         list: A list of dictionaries containing post titles, links, IDs, text, and comments.
@@ -39,15 +139,13 @@ def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='al
     posts = []
     try:
         if url_type == 'url' and custom_url:
-            url = url_templates['url'].format(url=custom_url)
+            url = url_templates['url'].format(url=custom_url.rstrip('/'))
         elif url_type == 'search' and search_query:
             url = url_templates['search'].format(query=search_query, sort_type=sort_type)
         else:
             url = url_templates[url_type].format(subreddit=subreddit, time_filter=time_filter)
         
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        data = await _get_json(session, url, REDDIT_COMMENTS_TTL if url_type == 'url' else REDDIT_LISTING_TTL)
         
         # Parse JSON to get post titles, ids, links, and text
         if url_type == 'url':
@@ -57,8 +155,10 @@ def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='al
                 link = 'https://www.reddit.com' + post_data['permalink']
                 post_id = post_data['id']
                 selftext = post_data.get('selftext', '')
-                posts.append({'title': title, 'link': link, 'id': post_id, 'text': selftext, 'comments': []})
-            except:
+                # The post URL returns the comment thread too, so no second request is needed
+                comments = _parse_comments(data, comments_limit) if comments_limit else []
+                posts.append({'title': title, 'link': link, 'id': post_id, 'text': selftext, 'comments': comments})
+            except Exception:
                 pass
         else:
             # Collect posts with their scores
@@ -72,7 +172,7 @@ def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='al
                 score = post_data.get('score', 0)
                 post_list.append({'title': title, 'link': link, 'id': post_id, 'text': selftext, 'comments': [], 'score': score})
             # Sort posts by score in descending order bm25 lol because reddit doesnt give any # relevance score
-            if search_query:
+            if search_query and post_list:
                 # Prepare corpus and tokenize
                 corpus = [post['title'] + ' ' + post['text'] for post in post_list]
                 tokenized_corpus = [doc.lower().split() for doc in corpus]
@@ -92,47 +192,30 @@ def fetch_reddit_posts(subreddit=None, url_type='hot', limit=10, time_filter='al
         return [{"error": f"Error fetching Reddit posts: {str(e)}"}]
 
 # Function to fetch comments for a given post
-def fetch_post_comments(post_id, limit=5, is_custom_url=False):
+async def fetch_post_comments(session, post_id, limit=5):
     """
     Fetches comments for a specific Reddit post by post ID.
 
     Args:
+        session (aiohttp.ClientSession): Session to fetch with.
         post_id (str): The ID of the Reddit post to fetch comments for.
         limit (int, optional): The number of comments to retrieve. Defaults to 5.
-        is_custom_url (bool, optional): Whether the post was fetched using a custom URL. Defaults to False.
 
     Returns:
         list: A list of comments (as strings) for the given post.
     """
-    comments = []
     try:
-        url = f'https://www.reddit.com/comments/{post_id}.json' if is_custom_url else f'https://www.reddit.com/comments/{post_id}.json'
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Parse JSON to get comments
-        for comment in data[1]['data']['children'][:limit]:
-            if comment['kind'] == 't1':  # Check if it's a comment (not a more comment or other kind)
-                comment_data = comment['data']
-                comments.append(comment_data['body'])
-        
-        return comments
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching comments for post {post_id}: {e}")
-        return comments
-
-# Function to add random delays
-def random_delay():
-    """
-    Introduces a random delay between requests to mimic natural browsing behavior and avoid rate limiting.
-    """
-    time.sleep(random.uniform(1, 5))
+        data = await _get_json(session, f'https://www.reddit.com/comments/{post_id}.json', REDDIT_COMMENTS_TTL)
+        return _parse_comments(data, limit)
+    except Exception as e:
+        logger.error(f"Error fetching comments for post {post_id}: {e}")
+        return []
 
 # Main function to scrape posts and their comments
-def reddit_reader(subreddit=None, url_type='hot', n=10, k=5, custom_url=None, time_filter='all', search_query=None, sort_type='relevance'):
+async def reddit_reader(subreddit=None, url_type='hot', n=10, k=5, custom_url=None, time_filter='all', search_query=None, sort_type='relevance'):
     """
-    Fetches Reddit posts and their associated comments.
+    Fetches Reddit posts and their associated comments. Comment threads are fetched concurrently;
+    pacing comes from the shared token bucket and Reddit's rate-limit headers.
 
     Args:
         subreddit (str, optional): The subreddit to fetch posts from. Defaults to None.
@@ -147,22 +230,18 @@ def reddit_reader(subreddit=None, url_type='hot', n=10, k=5, custom_url=None, ti
     Returns:
         list: A list of posts, each with associated comments.
     """
-    all_posts = []
-
-    print(f"Fetching posts from {url_type} search" if url_type == 'search' else f"Fetching posts from /r/{subreddit}" if subreddit else f"Fetching posts from {custom_url}")
-    posts = fetch_reddit_posts(subreddit=subreddit, url_type=url_type, limit=n, time_filter=time_filter, custom_url=custom_url, search_query=search_query, sort_type=sort_type)
-    for post in posts:
-        print(f"Fetching comments for post: {post['title']}")
-        comments = fetch_post_comments(post['id'], limit=k, is_custom_url=(url_type == 'url'))
-        post['comments'] = comments
-        random_delay()  # Add delay between requests for comments
-        
-    all_posts.extend(posts)
-    random_delay()  # Add delay between requests for posts
+    logger.info(f"Fetching posts from {url_type} search" if url_type == 'search' else f"Fetching posts from /r/{subreddit}" if subreddit else f"Fetching posts from {custom_url}")
+    async with _reddit_session() as session:
+        posts = await fetch_reddit_posts(session, subreddit=subreddit, url_type=url_type, limit=n, time_filter=time_filter, custom_url=custom_url, search_query=search_query, sort_type=sort_type, comments_limit=k)
+        pending = [post for post in posts if 'id' in post and not post['comments']]
+        if url_type != 'url' and pending:
+            logger.info(f"Fetching comments for {len(pending)} posts")
+            comments = await asyncio.gather(*[fetch_post_comments(session, post['id'], limit=k) for post in pending])
+            for post, post_comments in zip(pending, comments):
+                post['comments'] = post_comments
+    return posts
 
-    return all_posts
-
-def reddit_to_context(prompt, subreddit=None, url_type='hot', n=10, k=5, custom_url=None, time_filter='all', search_query=None, sort_type='relevance'):
+async def reddit_to_context(prompt, subreddit=None, url_type='hot', n=10, k=5, custom_url=None, time_filter='all', search_query=None, sort_type='relevance'):
     """
     Generates a context string by combining Reddit posts and comments into a single string.
 
@@ -180,11 +259,11 @@ def reddit_to_context(prompt, subreddit=None, url_type='hot', n=10, k=5, custom_
     Returns:
         str: The concatenated context string.
     """
-    posts = reddit_reader(subreddit, url_type, n, k, custom_url, time_filter, search_query, sort_type)
+    posts = await reddit_reader(subreddit, url_type, n, k, custom_url, time_filter, search_query, sort_type)
     context = prompt + str(posts)
     return context
 
-def reddit_reader_response(
+async def reddit_reader_response(
                            subreddit:str, 
                            url_type:str, 
                            n:int, k:int,
@@ -206,12 +285,13 @@ def reddit_reader_response(
         time_filter (str, optional): The time filter for top posts (e.g., day, week, month, year, all). Defaults to 'all'.
         search_query (str, optional): The search query for fetching posts. Defaults to None.
         sort_type (str, optional): The sort type for search results (e.g., relevance, new, top,). Defaults to 'relevance'.
+        model: The language model used to summarize the posts.
     Returns:
-        str: The concatenated context string.
+        str: The summary of the posts and comments.
     """       
     # context = reddit_to_context(prompt,subreddit, url_type, n=5, k=5, custom_url=custom_url, time_filter=time_filter)
     prompt = prompts['reddit_summary_prompt'].format(search_query=search_query)
-    context = reddit_to_context(prompt, subreddit, url_type, n, k, custom_url=custom_url, time_filter=time_filter, search_query=search_query, sort_type=sort_type)
-    response = model.invoke(context).content
-    return response
+    context = await reddit_to_context(prompt, subreddit, url_type, n, k, custom_url=custom_url, time_filter=time_filter, search_query=search_query, sort_type=sort_type)
+    response = await model.ainvoke(context)
+    return response.content
 
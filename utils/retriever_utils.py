@@ -168,6 +168,49 @@ def create_vectorstore(docs, collection_name, hf_embeddings, top_k, ensemble_wei
     unique_collection_name = f"{collection_name}_{timestamp}"
     return _create_vectorstore_sync(docs, unique_collection_name, hf_embeddings, top_k, ensemble_weights)
 
+async def update_vectorstore_async(docs, collection_name, hf_embeddings, remove_urls=None, persist_directory="./chroma_db"):
+    """
+    Asynchronously updates an existing persisted collection in place.
+    Chunks whose 'url' metadata is in `remove_urls` are deleted, then `docs` are embedded and added.
+
+    Args:
+        docs (list): New documents to add to the collection.
+        collection_name (str): Name of the existing collection.
+        hf_embeddings (object): The embedding model used for the collection.
+        remove_urls (list, optional): URLs whose previously stored chunks should be removed.
+        persist_directory (str): Directory of the persistent ChromaDB store.
+    """
+    loop = asyncio.get_event_loop()
+    with ThreadPoolExecutor() as executor:
+        await loop.run_in_executor(
+            executor,
+            _update_vectorstore_sync,
+            docs, collection_name, hf_embeddings, remove_urls or [], persist_directory
+        )
+
+def _update_vectorstore_sync(docs, collection_name, hf_embeddings, remove_urls, persist_directory="./chroma_db", delete_batch_size=100):
+    """
+    Synchronous helper for update_vectorstore_async, run in a thread pool.
+    """
+    client = chromadb.PersistentClient(
+        path=persist_directory,
+        settings=Settings(
+            anonymized_telemetry=False,
+            allow_reset=True
+        )
+    )
+    collection = client.get_collection(collection_name)
+    for i in range(0, len(remove_urls), delete_batch_size):
+        collection.delete(where={"url": {"$in": remove_urls[i:i + delete_batch_size]}})
+    if docs:
+        vectorstore = Chroma(
+            client=client,
+            collection_name=collection_name,
+            embedding_function=hf_embeddings
+        )
+        vectorstore.add_documents(docs)
+    logger.info(f"Updated collection {collection_name}: removed chunks of {len(remove_urls)} URLs, added {len(docs)} chunks")
+
 async def cleanup_old_collections_async(max_collections=20):
     """
     Asynchronously clean up old ChromaDB collections to prevent memory buildup.
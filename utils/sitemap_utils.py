@@ -0,0 +1,224 @@
+import gzip
+import heapq
+import io
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_CACHE_TTL = float(os.environ.get('SITEMAP_CACHE_TTL', 3600))
+SITEMAP_MAX_FILES = int(os.environ.get('SITEMAP_MAX_FILES', 50))
+SITEMAP_MAX_WORKERS = int(os.environ.get('SITEMAP_MAX_WORKERS', 8))
+
+# Fallback locations probed when robots.txt does not list any sitemap
+DEFAULT_SITEMAP_PATHS = ('/sitemap.xml', '/sitemap_index.xml')
+
+# host -> (timestamp, entries); entries are (url, lastmod) sorted newest first
+_sitemap_cache = {}
+_sitemap_cache_lock = threading.Lock()
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a sitemap <lastmod> value (W3C datetime) into a UTC epoch timestamp.
+
+    Args:
+        value (str): Value such as '2024-05-01' or '2024-05-01T10:00:00+00:00'.
+
+    Returns:
+        float or None: Epoch seconds, or None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_sitemap(sitemap_url: str, headers: dict, timeout: int = 15):
+    """
+    Streams a sitemap or sitemap index and yields its entries without loading the whole file.
+
+    Gzipped sitemaps (.xml.gz or gzip payloads) are decompressed on the fly and parsed
+    incrementally with iterparse; parsed elements are cleared as soon as they are read.
+
+    Args:
+        sitemap_url (str): URL of the sitemap.
+        headers (dict): HTTP headers for the request.
+        timeout (int): Request timeout in seconds.
+
+    Yields:
+        tuple: (kind, url, lastmod) where kind is 'url' for pages and 'sitemap' for nested sitemaps.
+    """
+    with requests.get(sitemap_url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            logger.info(f"Sitemap {sitemap_url} returned status {response.status_code}")
+            return
+        response.raw.decode_content = True
+        stream = io.BufferedReader(response.raw)
+        # .xml.gz files are usually served without Content-Encoding, so sniff the gzip magic
+        if stream.peek(2)[:2] == b'\x1f\x8b':
+            stream = gzip.GzipFile(fileobj=stream)
+
+        root = None
+        level = 0
+        loc, lastmod = None, None
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                level += 1
+                continue
+            level -= 1
+            name = _local_name(elem.tag)
+            # Only direct children of <url>/<sitemap>; extensions such as <image:loc> are nested deeper
+            if level == 2 and name == 'loc':
+                loc = (elem.text or '').strip()
+            elif level == 2 and name == 'lastmod':
+                lastmod = parse_lastmod(elem.text)
+            elif level == 1 and name in ('url', 'sitemap'):
+                if loc:
+                    yield name, loc, lastmod
+                loc, lastmod = None, None
+                # Drop parsed entries so memory stays flat for 50k-URL files
+                root.clear()
+
+
+def discover_sitemaps(base_url: str, headers: dict, timeout: int = 10) -> List[str]:
+    """
+    Finds the sitemaps of a site from robots.txt `Sitemap:` entries, falling back to /sitemap.xml.
+
+    Args:
+        base_url (str): Any URL on the site.
+        headers (dict): HTTP headers for the request.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        List[str]: Sitemap URLs to read.
+    """
+    sitemaps = []
+    try:
+        response = requests.get(urljoin(base_url, '/robots.txt'), headers=headers, timeout=timeout)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                key, _, value = line.partition(':')
+                if key.strip().lower() == 'sitemap' and value.strip():
+                    sitemaps.append(urljoin(base_url, value.strip()))
+    except Exception as e:
+        logger.info(f"Could not read robots.txt for {base_url}: {e}")
+    if not sitemaps:
+        sitemaps = [urljoin(base_url, path) for path in DEFAULT_SITEMAP_PATHS]
+    return list(dict.fromkeys(sitemaps))
+
+
+def _read_sitemap(sitemap_url: str, headers: dict, host: str, url_keyword: Optional[str]):
+    pages, children = [], []
+    try:
+        for kind, url, lastmod in iter_sitemap(sitemap_url, headers):
+            if kind == 'sitemap':
+                children.append(url)
+            elif urlparse(url).netloc == host and (not url_keyword or url_keyword.lower() in url.lower()):
+                pages.append((url, lastmod))
+        logger.info(f"Read {len(pages)} URLs and {len(children)} nested sitemaps from {sitemap_url}")
+    except Exception as e:
+        logger.info(f"No sitemap found or error parsing {sitemap_url}: {e}")
+    return pages, children
+
+
+def get_sitemap_entries(
+    base_url: str,
+    headers: dict,
+    max_urls: Optional[int] = None,
+    url_keyword: Optional[str] = None,
+    max_sitemaps: int = SITEMAP_MAX_FILES,
+    max_workers: int = SITEMAP_MAX_WORKERS,
+    use_cache: bool = True
+) -> List[Tuple[str, Optional[float]]]:
+    """
+    Collects page URLs from all sitemaps of a site, following sitemap indexes concurrently.
+
+    Results are ordered by lastmod (newest first, undated entries last) and cached per host
+    for SITEMAP_CACHE_TTL seconds. With max_urls only the newest entries are retained while
+    reading, so very large sitemaps do not have to be held in memory.
+
+    Args:
+        base_url (str): Any URL on the site.
+        headers (dict): HTTP headers for the requests.
+        max_urls (int, optional): Maximum number of entries to return.
+        url_keyword (str, optional): Only retain page URLs containing this keyword.
+        max_sitemaps (int): Maximum number of sitemap files to read.
+        max_workers (int): Number of sitemaps fetched in parallel.
+        use_cache (bool): Whether to use the per-host cache.
+
+    Returns:
+        List[Tuple[str, Optional[float]]]: (url, lastmod) pairs.
+    """
+    host = urlparse(base_url).netloc
+    cache_key = (host, max_urls, (url_keyword or '').lower())
+    if use_cache:
+        with _sitemap_cache_lock:
+            cached = _sitemap_cache.get(cache_key)
+        if cached and time.time() - cached[0] < SITEMAP_CACHE_TTL:
+            logger.info(f"Using cached sitemap entries for {host}")
+            return list(cached[1])
+
+    # Min-heap on (lastmod, url) keeps the newest max_urls entries
+    newest = []
+    seen_urls = set()
+    visited = set()
+    pending = discover_sitemaps(base_url, headers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending and len(visited) < max_sitemaps:
+            batch = [url for url in dict.fromkeys(pending) if url not in visited][:max_sitemaps - len(visited)]
+            visited.update(batch)
+            pending = []
+            for pages, children in executor.map(lambda u: _read_sitemap(u, headers, host, url_keyword), batch):
+                pending.extend(children)
+                for url, lastmod in pages:
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                    item = (lastmod if lastmod is not None else float('-inf'), url)
+                    if max_urls is None or len(newest) < max_urls:
+                        heapq.heappush(newest, item)
+                    elif item > newest[0]:
+                        seen_urls.discard(heapq.heappushpop(newest, item)[1])
+
+    entries = [(url, None if lastmod == float('-inf') else lastmod) for lastmod, url in sorted(newest, reverse=True)]
+    logger.info(f"Found {len(entries)} URLs in {len(visited)} sitemaps for {host}")
+    if use_cache:
+        with _sitemap_cache_lock:
+            _sitemap_cache[cache_key] = (time.time(), entries)
+    return list(entries)
+
+
+def get_sitemap_urls(base_url: str, headers: dict, max_urls: Optional[int] = None) -> List[str]:
+    """
+    Attempt to fetch and parse the site's sitemaps for additional URLs, newest first.
+    """
+    return [url for url, _ in get_sitemap_entries(base_url, headers, max_urls=max_urls)]
+
+
+def clear_sitemap_cache():
+    with _sitemap_cache_lock:
+        _sitemap_cache.clear()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # keep reverse proxies from buffering the stream
+}
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class ProgressStream:
+    """
+    Collects pipeline progress events and LLM token deltas for one streaming request.
+
+    Producers call `emit` (or `token`) from the pipeline; `sse_events` drains the events as SSE
+    strings while the pipeline runs.
+    """
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self.closed = False
+
+    def emit(self, event: str, **data):
+        if not self.closed:
+            self._queue.put_nowait((event, data))
+
+    def token(self, delta: str):
+        if delta:
+            self.emit("token", delta=delta)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._queue.put_nowait(None)
+
+    async def sse_events(self, pipeline: Awaitable) -> AsyncIterator[str]:
+        """
+        Runs `pipeline` and yields its events as SSE strings until it finishes.
+
+        Exceptions of the pipeline become an 'error' event. If the client disconnects, the
+        generator is closed and the pipeline task is cancelled.
+
+        Args:
+            pipeline (awaitable): The coroutine producing events on this stream; it should emit
+                a final 'done' event with its result.
+
+        Yields:
+            str: Formatted SSE events.
+        """
+        async def run():
+            try:
+                await pipeline
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Streaming pipeline failed: {e}")
+                self.emit("error", message=str(e))
+            finally:
+                self.close()
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                yield format_sse(*item)
+        finally:
+            if not task.done():
+                logger.info("Client disconnected, cancelling streaming pipeline")
+                task.cancel()
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, 'content', chunk)
+    if isinstance(content, list):
+        # Some providers stream content blocks instead of plain strings
+        return ''.join(c.get('text', '') if isinstance(c, dict) else str(c) for c in content)
+    return content if isinstance(content, str) else str(content)
+
+
+async def astream_text(llm, prompt, stream: Optional[ProgressStream] = None) -> str:
+    """
+    Generates text with `llm.astream`, forwarding each delta to `stream` as a 'token' event.
+
+    Args:
+        llm: LangChain chat model.
+        prompt: Prompt passed to the model.
+        stream (ProgressStream, optional): Where token deltas are emitted.
+
+    Returns:
+        str: The complete generated text.
+    """
+    parts = []
+    async for chunk in llm.astream(prompt):
+        delta = _chunk_text(chunk)
+        if delta:
+            parts.append(delta)
+            if stream is not None:
+                stream.token(delta)
+    return ''.join(parts)
@@ -0,0 +1,115 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_STORE_PATH = os.environ.get('TRANSCRIPT_STORE_PATH', './transcript_store/transcripts.sqlite')
+# Transcripts older than this are fetched again (days)
+TRANSCRIPT_TTL_DAYS = float(os.environ.get('TRANSCRIPT_TTL_DAYS', 30))
+# Tokens per stored transcript chunk; transcripts longer than one chunk are summarized map-reduce
+TRANSCRIPT_CHUNK_TOKENS = int(os.environ.get('TRANSCRIPT_CHUNK_TOKENS', 3000))
+
+_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """
+    Extracts the video ID from a YouTube URL (watch?v=, youtu.be/, /shorts/, /embed/, /live/).
+
+    Returns:
+        str or None: The 11-character video ID.
+    """
+    parsed = urlparse(url if '://' in url else f'https://{url}')
+    host = parsed.netloc.lower()
+    if host.endswith('youtu.be'):
+        candidate = parsed.path.strip('/').split('/')[0]
+    elif 'v' in parse_qs(parsed.query):
+        candidate = parse_qs(parsed.query)['v'][0]
+    else:
+        parts = [p for p in parsed.path.split('/') if p]
+        candidate = parts[1] if len(parts) > 1 and parts[0] in ('shorts', 'embed', 'live', 'v') else ''
+    return candidate if _VIDEO_ID.match(candidate or '') else None
+
+
+class TranscriptStore:
+    """
+    SQLite store of YouTube transcripts keyed by video ID. Transcripts are kept as ordered token
+    chunks so long videos can be summarized chunk by chunk without re-splitting.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, path: str = TRANSCRIPT_STORE_PATH, ttl_days: float = TRANSCRIPT_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, title TEXT, source TEXT, "
+                "num_chunks INTEGER, fetched_at REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (video_id TEXT, idx INTEGER, text TEXT, PRIMARY KEY (video_id, idx))"
+            )
+
+    def get(self, video_id: str) -> Optional[List[str]]:
+        """Returns the stored transcript chunks of a video, or None if missing or expired."""
+        with self._lock:
+            row = self._db.execute("SELECT num_chunks, fetched_at FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return None
+            num_chunks, fetched_at = row
+            if self.ttl and time.time() - fetched_at > self.ttl:
+                return None
+            chunks = [r[0] for r in self._db.execute(
+                "SELECT text FROM chunks WHERE video_id = ? ORDER BY idx", (video_id,))]
+        return chunks if len(chunks) == num_chunks else None
+
+    def put(self, video_id: str, chunks: List[str], title: str = '', source: str = ''):
+        """Stores (or replaces) the transcript chunks of a video."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks WHERE video_id = ?", (video_id,))
+            self._db.executemany("INSERT INTO chunks VALUES (?, ?, ?)",
+                                 [(video_id, i, text) for i, text in enumerate(chunks)])
+            self._db.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?)",
+                             (video_id, title, source, len(chunks), time.time()))
+
+    def delete(self, video_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks WHERE video_id = ?", (video_id,))
+            self._db.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+
+    def prune(self) -> int:
+        """Deletes expired transcripts, returning how many were removed."""
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock, self._db:
+            expired = [r[0] for r in self._db.execute("SELECT video_id FROM videos WHERE fetched_at < ?", (cutoff,))]
+            self._db.executemany("DELETE FROM chunks WHERE video_id = ?", [(v,) for v in expired])
+            self._db.executemany("DELETE FROM videos WHERE video_id = ?", [(v,) for v in expired])
+        return len(expired)
+
+
+_transcript_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """Get the process-wide transcript store (opened on first use)"""
+    global _transcript_store
+    if _transcript_store is None:
+        with _store_lock:
+            if _transcript_store is None:
+                _transcript_store = TranscriptStore()
+                removed = _transcript_store.prune()
+                if removed:
+                    logger.info(f"Pruned {removed} expired transcripts")
+    return _transcript_store
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join('output', 'tts_cache'))
+# Disk budget of the cache in bytes; least recently used audio is deleted beyond it
+TTS_CACHE_MAX_BYTES = int(os.environ.get('TTS_CACHE_MAX_BYTES', 1024 ** 3))
+# Files used this recently (seconds) are never evicted, so responses being sent are not deleted
+TTS_CACHE_EVICT_GRACE = float(os.environ.get('TTS_CACHE_EVICT_GRACE', 300))
+
+
+def tts_cache_key(text: str, voice: str, lang: str, speed: float = 1.0) -> str:
+    """Content hash of a synthesis request (whitespace-normalized text, voice, language, speed)."""
+    payload = json.dumps([re.sub(r'\s+', ' ', text).strip(), voice, lang, round(float(speed), 3)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def combined_cache_key(keys) -> str:
+    """Content hash of a sequence of cache keys, e.g. the segments of a podcast."""
+    return hashlib.sha256('|'.join(keys).encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized audio on disk.
+
+    Segments (single synthesis calls) are kept as float WAV under `segments/` and whole outputs
+    (a basic TTS file or a full podcast) under `outputs/`, both named by their cache key. Files
+    are evicted least recently used first once the directory exceeds `max_bytes`.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES,
+                 evict_grace: float = TTS_CACHE_EVICT_GRACE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_grace = evict_grace
+        self._lock = threading.Lock()
+        # path -> size, least recently used first
+        self._files = OrderedDict()
+        self._last_used = {}
+        self.total_bytes = 0
+        for kind in ('segments', 'outputs'):
+            os.makedirs(os.path.join(directory, kind), exist_ok=True)
+        existing = []
+        for kind in ('segments', 'outputs'):
+            with os.scandir(os.path.join(directory, kind)) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith('.wav'):
+                        stat = entry.stat()
+                        existing.append((stat.st_mtime, entry.path, stat.st_size))
+        for mtime, path, size in sorted(existing):
+            self._files[path] = size
+            self._last_used[path] = mtime
+            self.total_bytes += size
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, f"{key}.wav")
+
+    def _touch(self, path: str) -> bool:
+        with self._lock:
+            if path not in self._files:
+                return False
+            self._files.move_to_end(path)
+            self._last_used[path] = time.time()
+        try:
+            # Recency survives restarts through the modification time
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(path)
+            return False
+        return True
+
+    def _forget(self, path: str):
+        with self._lock:
+            size = self._files.pop(path, None)
+            self._last_used.pop(path, None)
+            if size is not None:
+                self.total_bytes -= size
+
+    def _add(self, path: str):
+        size = os.path.getsize(path)
+        with self._lock:
+            self.total_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            self._last_used[path] = time.time()
+            evict = []
+            cutoff = time.time() - self.evict_grace
+            for candidate, candidate_size in self._files.items():
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if self._last_used[candidate] >= cutoff:
+                    break
+                evict.append(candidate)
+                self.total_bytes -= candidate_size
+            for candidate in evict:
+                del self._files[candidate]
+                del self._last_used[candidate]
+        for candidate in evict:
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+        if evict:
+            logger.info(f"Evicted {len(evict)} cached audio files ({self.total_bytes} bytes kept)")
+
+    def get_segment(self, key: str) -> Optional[Tuple[np.ndarray, int]]:
+        """Returns the cached (samples, sample_rate) of a segment, or None."""
+        path = self._path('segments', key)
+        if not self._touch(path):
+            return None
+        try:
+            return sf.read(path, dtype='float32')
+        except Exception as e:
+            logger.warning(f"Unreadable cached segment {path}: {e}")
+            self._forget(path)
+            return None
+
+    def put_segment(self, key: str, samples: np.ndarray, sample_rate: int):
+        path = self._path('segments', key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        sf.write(tmp_path, samples, sample_rate, subtype='FLOAT', format='WAV')
+        os.replace(tmp_path, path)
+        self._add(path)
+
+    def get_output(self, key: str) -> Optional[str]:
+        """Returns the path of a cached output file, or None."""
+        path = self._path('outputs', key)
+        return path if self._touch(path) else None
+
+    def output_path(self, key: str) -> str:
+        """Where an output with this key is stored; write it elsewhere and `put_output` it."""
+        return self._path('outputs', key)
+
+    def put_output(self, key: str, source_path: str) -> str:
+        """Moves a finished output file into the cache, returning its cached path."""
+        path = self._path('outputs', key)
+        os.replace(source_path, path)
+        self._add(path)
+        return path
+
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Get the process-wide TTS audio cache (scanned on first use)"""
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                _tts_cache = TTSCache()
+    return _tts_cache
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TTS_MODEL_PATH = os.environ.get('TTS_MODEL_PATH', 'kokoro-v1.0.onnx')
+TTS_VOICES_PATH = os.environ.get('TTS_VOICES_PATH', 'voices-v1.0.bin')
+# Synthesis threads; ONNX Runtime releases the GIL, so threads share one loaded model
+TTS_WORKERS = int(os.environ.get('TTS_WORKERS', max(1, min(4, (os.cpu_count() or 2) // 2))))
+# Synthesis jobs admitted at once (running + queued); further jobs wait for a slot
+TTS_MAX_PENDING = int(os.environ.get('TTS_MAX_PENDING', 32))
+# Seconds a job waits for a slot before the request is rejected as busy
+TTS_QUEUE_TIMEOUT = float(os.environ.get('TTS_QUEUE_TIMEOUT', 30))
+# Load the model when the app starts instead of on the first TTS request
+TTS_PRELOAD = os.environ.get('TTS_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+
+class TTSBusyError(RuntimeError):
+    """Raised when a synthesis job cannot get a slot within TTS_QUEUE_TIMEOUT."""
+
+
+class TTSEngine:
+    """
+    Process-wide Kokoro text-to-speech service.
+
+    The ONNX model and voice bank are loaded once (at startup via `start`, or on first use) and
+    shared by a pool of `workers` synthesis threads. At most `max_pending` jobs are admitted at
+    once; callers beyond that wait up to `queue_timeout` seconds and then get TTSBusyError.
+    """
+
+    def __init__(self, model_path: str = TTS_MODEL_PATH, voices_path: str = TTS_VOICES_PATH,
+                 workers: int = TTS_WORKERS, max_pending: int = TTS_MAX_PENDING,
+                 queue_timeout: float = TTS_QUEUE_TIMEOUT):
+        self.model_path = model_path
+        self.voices_path = voices_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._kokoro = None
+        self._load_lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.pending = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._kokoro is not None
+
+    def _model(self):
+        if self._kokoro is None:
+            with self._load_lock:
+                if self._kokoro is None:
+                    from kokoro_onnx import Kokoro
+                    self._kokoro = Kokoro(self.model_path, self.voices_path)
+                    logger.info("Initialized Kokoro TTS engine.")
+        return self._kokoro
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts')
+        return self._executor
+
+    async def start(self):
+        """Creates the worker pool and loads the model in it (skipped if the model files are missing)."""
+        if not (os.path.exists(self.model_path) and os.path.exists(self.voices_path)):
+            logger.warning(f"TTS model files not found ({self.model_path}, {self.voices_path}), not preloading")
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._pool(), self._model)
+        except Exception as e:
+            logger.error(f"Failed to load TTS model: {e}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _create(self, text: str, voice: str, speed: float, lang: str) -> Tuple[np.ndarray, int]:
+        return self._model().create(text, voice=voice, speed=speed, lang=lang)
+
+    async def synthesize(self, text: str, voice: str, speed: float = 1.0, lang: str = 'en-us',
+                         timeout: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """
+        Synthesizes speech in the worker pool.
+
+        Args:
+            text (str): Text to speak.
+            voice (str): Kokoro voice name.
+            speed (float): Speech rate.
+            lang (str): Language code.
+            timeout (float, optional): Seconds to wait for a slot (defaults to queue_timeout).
+
+        Returns:
+            tuple: (samples, sample_rate)
+
+        Raises:
+            TTSBusyError: If no slot frees up in time.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise TTSBusyError("Text-to-speech is busy, try again later") from None
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), self._create, text, voice, speed, lang)
+        finally:
+            self.pending -= 1
+            self._slots.release()
+
+
+_tts_engine = TTSEngine()
+
+
+def get_tts_engine() -> TTSEngine:
+    """Get the process-wide TTS engine"""
+    return _tts_engine
@@ -9,8 +9,15 @@ import soundfile as sf
 import asyncio
 import re
 import os
+import shutil
+import time
+from contextlib import aclosing
 from uuid import uuid4
-from kokoro_onnx import Kokoro
+from utils.tts_cache import combined_cache_key, get_tts_cache, tts_cache_key
+from utils.tts_engine import TTSBusyError, get_tts_engine
+
+# Podcast segments synthesized ahead of the one being written
+PODCAST_SEGMENT_CONCURRENCY = int(os.environ.get('PODCAST_SEGMENT_CONCURRENCY', 2 * get_tts_engine().workers))
 
 def random_pause(min_duration=0.5, max_duration=2.0, sample_rate=None):
     """
@@ -65,52 +72,156 @@ async def parse_podcast(text: str, voice_choices:list) -> list[dict]:
     logger.info(f"Parsed podcast segments: {result}")
     return result
 
-async def podcasting(sentences, filename):
+async def segment_audio(text, voice, lang="en-us", speed=1.0):
     """
-    Generate a podcast audio file from the given sentences.
+    Synthesizes one segment through the TTS segment cache.
+
+    Returns:
+        tuple: (samples, sample_rate)
+    """
+    cache = get_tts_cache()
+    key = tts_cache_key(text, voice, lang, speed)
+    cached = await asyncio.to_thread(cache.get_segment, key)
+    if cached is not None:
+        return cached
+    logger.info(f"Creating audio with {voice}: {text}")
+    samples, sample_rate = await get_tts_engine().synthesize(text, voice=voice, speed=speed, lang=lang)
+    await asyncio.to_thread(cache.put_segment, key, samples, sample_rate)
+    return samples, sample_rate
+
+
+async def podcast_audio(sentences, concurrency=None):
     """
+    Synthesizes podcast segments in parallel and yields their audio in transcript order.
+
+    Up to `concurrency` segments are synthesized ahead of the one being consumed, so only that
+    window is held in memory. Segments come from the TTS cache when possible. A segment that
+    fails is logged and skipped.
+
+    Args:
+        sentences (list): {"voice", "text"} dicts from parse_podcast.
+        concurrency (int, optional): Segments in flight (defaults to PODCAST_SEGMENT_CONCURRENCY).
+
+    Yields:
+        tuple: (samples, sample_rate) of each segment, followed by a random pause.
+    """
+    concurrency = max(1, concurrency or PODCAST_SEGMENT_CONCURRENCY)
+
+    def start(sentence):
+        return asyncio.ensure_future(segment_audio(sentence["text"], sentence["voice"]))
+
+    pending = [start(sentence) for sentence in sentences[:concurrency]]
+    upcoming = iter(sentences[concurrency:])
     try:
-        kokoro = Kokoro("kokoro-v1.0.onnx", "voices-v1.0.bin")
-        logger.info("Initialized Kokoro TTS engine.")
-        audio = []
-        for sentence in sentences:
-            voice = sentence["voice"]
-            text = sentence["text"]
-            logger.info(f"Creating audio with {voice}: {text}")
-            samples, sample_rate = kokoro.create(
-                text,
-                voice=voice,
-                speed=1.0,
-                lang="en-us",
-            )
-            audio.append(samples)
+        while pending:
+            task = pending.pop(0)
+            nxt = next(upcoming, None)
+            if nxt is not None:
+                pending.append(start(nxt))
+            try:
+                samples, sample_rate = await task
+            except TTSBusyError:
+                raise
+            except Exception as e:
+                logger.error(f"Error synthesizing podcast segment, skipping it: {e}")
+                continue
+            yield samples, sample_rate
             # Add random silence after each sentence
-            audio.append(random_pause(sample_rate=sample_rate))
-
-        # Concatenate all audio parts
-        audio = np.concatenate(audio)
-        
-        # Save the generated audio to file
-        sf.write(f"{filename}", audio, sample_rate)
-        await asyncio.sleep(5)
-        logger.info(f"Created {filename}")
+            yield random_pause(sample_rate=sample_rate).astype(samples.dtype), sample_rate
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def podcasting(sentences, filename=None):
+    """
+    Generate a podcast audio file from the given sentences.
+    Segments are synthesized in parallel and appended to the WAV file as they complete, in order.
+    Finished podcasts are cached by the content of their segments, so repeating a transcript with the
+    same voices returns the cached file.
+
+    Returns:
+        str or None: Path of the podcast (`filename` if given, else the cached file).
+    """
+    started = time.monotonic()
+    cache = get_tts_cache()
+    key = combined_cache_key([tts_cache_key(s["text"], s["voice"], "en-us", 1.0) for s in sentences])
+    cached = cache.get_output(key)
+    if cached is not None:
+        logger.info(f"Podcast served from cache: {cached}")
+        return await _deliver(cached, filename)
+
+    tmp_path = f"{cache.output_path(key)}.{str(uuid4())[:8]}.tmp"
+    audio_file = None
+    pieces = 0
+    try:
+        # Closed on any error here too, so in-flight segment syntheses are cancelled right away
+        async with aclosing(podcast_audio(sentences)) as audio:
+            async for samples, sample_rate in audio:
+                if audio_file is None:
+                    audio_file = sf.SoundFile(tmp_path, mode='w', samplerate=sample_rate, channels=1, format='WAV')
+                    logger.info(f"First podcast audio after {time.monotonic() - started:.2f}s")
+                await asyncio.to_thread(audio_file.write, samples)
+                pieces += 1
+        if audio_file is None:
+            logger.error("No podcast audio was generated")
+            return None
+        audio_file.close()
+        if pieces == 2 * len(sentences):
+            path = await asyncio.to_thread(cache.put_output, key, tmp_path)
+        else:
+            # Some segments were skipped, so the result is not cached as this transcript
+            path = filename or os.path.join("output", "podcasts", f"podcast_{str(uuid4())[:8]}.wav")
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            os.replace(tmp_path, path)
+            filename = None
+        logger.info(f"Created {path} in {time.monotonic() - started:.2f}s")
+        return await _deliver(path, filename)
+    except TTSBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error occurred while creating podcast: {e}")
+        return None
+    finally:
+        if audio_file is not None:
+            audio_file.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 
-async def text_to_speech(text, voice, filename, lang):
+async def _deliver(path, filename=None):
+    """Copies a cached file to `filename` when the caller asked for a specific path."""
+    if not filename or os.path.abspath(filename) == os.path.abspath(path):
+        return path
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    await asyncio.to_thread(shutil.copyfile, path, filename)
+    return filename
+
+
+async def text_to_speech(text, voice, filename=None, lang="en-us"):
     """
     Convert text to speech using the specified voice and save it to a file.
+    Outputs are cached by content (text, voice, language, speed).
+
+    Returns:
+        str or None: Path of the audio file (`filename` if given, else the cached file).
     """
-    kokoro = Kokoro("kokoro-v1.0.onnx", "voices-v1.0.bin")
-    samples, sample_rate = kokoro.create(
-        text, voice=voice, speed=1.0, lang=lang
-    )
-    try:
-        sf.write(filename, samples, sample_rate)
-        return filename
-    except Exception as e:
-        logger.error(f"Error occurred while saving audio file: {e}")
-        
+    cache = get_tts_cache()
+    key = tts_cache_key(text, voice, lang, 1.0)
+    cached = cache.get_output(key)
+    if cached is None:
+        samples, sample_rate = await get_tts_engine().synthesize(
+            text, voice=voice, speed=1.0, lang=lang
+        )
+        tmp_path = f"{cache.output_path(key)}.{str(uuid4())[:8]}.tmp"
+        try:
+            await asyncio.to_thread(sf.write, tmp_path, samples, sample_rate, format='WAV')
+            cached = await asyncio.to_thread(cache.put_output, key, tmp_path)
+        except Exception as e:
+            logger.error(f"Error occurred while saving audio file: {e}")
+            return None
+    return await _deliver(cached, filename)
+
 async def podcasting_from_text(text,theme,llm):
     system_prompt = f"""You are an experienced podcaster who can create engaging episodes on any topic.
     Your style makes complex concepts simple, clear, and enjoyable to listen to.
@@ -145,11 +256,7 @@ async def podcasting_from_text(text,theme,llm):
                      ]
     podcast_segments = await parse_podcast(result.content, voice_choices)
 
-    if os.path.exists("output/podcasts") is False:
-        os.makedirs("output/podcasts")
-    
-    file_path = f"output/podcasts/podcast_{str(uuid4())[:8]}.wav"
-    _ = await podcasting(podcast_segments, filename=file_path)
+    file_path = await podcasting(podcast_segments)
     print(f"Current working directory: {os.getcwd()}")
     print(f"Podcast file created at: {file_path}")
     return file_path
\ No newline at end of file
@@ -21,7 +21,6 @@ from langchain_community.document_loaders import WebBaseLoader
 from langchain_community.retrievers import BM25Retriever
 from langchain_community.utilities import SearxSearchWrapper
 from langchain_chroma import Chroma
-from langchain_text_splitters import MarkdownHeaderTextSplitter, TokenTextSplitter, RecursiveCharacterTextSplitter
 from markdownify import markdownify as md
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_search import YoutubeSearch
@@ -42,7 +41,16 @@ from chromadb.config import Settings
 from utils.utils import *
 from utils.answer_generation import *
 from utils.reddit_utils import *
-from utils.process_content import process_content
+from utils.process_content import process_content, process_shared_content
+from utils.ipc_utils import shared_payload, text_from_shared
+from utils.fetch_utils import ContentTooLargeError, UnsupportedContentError, fetch_content
+from utils.converters import converter_semaphore, get_converter, get_converter_cache
+from utils.chunking_utils import chunk_documents, chunk_markdown, get_token_splitter, markdown_to_docs, split_text_on_tokens
+from utils.context_packing import pack_context
+from utils.streaming_utils import astream_text
+from utils.transcript_store import TRANSCRIPT_CHUNK_TOKENS, get_transcript_store, youtube_video_id
+from utils.dedup_utils import dedup_docs_map, dedup_documents, filter_near_duplicates, section_text
+from utils.pdf_utils import PDF_DEADLINE_SECONDS, PDF_MAX_PAGES, pdf_bytes_to_markdown_async, pdf_to_markdown_async
 
 chromadb.api.client.SharedSystemClient.clear_system_cache()
 
@@ -58,6 +66,9 @@ if not logger.hasHandlers():
 # Global blacklist for unreachable domains
 UNREACHABLE_DOMAINS_BLACKLIST = set()
 
+# Videos summarized concurrently by youtube_transcript_response
+YOUTUBE_SUMMARY_CONCURRENCY = int(os.environ.get('YOUTUBE_SUMMARY_CONCURRENCY', 3))
+
 # No in-memory caching for retrievers/rerankers; always create fresh instances per request
 
 
@@ -264,7 +275,7 @@ async def process_url(
         try:
             logger.info(f"Processing Reddit URL with wait: {url}")
             await asyncio.sleep(random.randint(1, 3))  # Async sleep to avoid rate limiting
-            response = reddit_reader_response(
+            response = await reddit_reader_response(
                 subreddit=None, url_type='url', n=5, k=5,
                 custom_url=url, time_filter=None,
                 search_query=None, sort_type=None,
@@ -278,12 +289,19 @@ async def process_url(
         logger.info("YouTube URL detected")
         try:
             logger.info(f"Processing YouTube URL: {url}")
-            response = youtube_transcript_response(url, f"Summarise for {subquery}", model)
+            response = await youtube_transcript_response(url, f"Summarise for {subquery}", model)
             docs.append(Document(response, metadata={'source': url, 'url': url}))
             logger.info(f"Appended YouTube transcript for {url}")
         except Exception as e:
             logger.error(f"Error processing YouTube URL {url}: {e}")
 
+    if not docs:
+        logger.info(f"No documents left to embed for {url}")
+        profiler = get_profiler()
+        if profiler:
+            profiler.end_url_processing(url=url, docs_count=0, context_length=0, status="failed", error="no documents")
+        return None, None, None, url
+
     if split:
         try:
             # docs = text_splitter.split_documents(docs)
@@ -452,7 +470,7 @@ async def context_to_docs(
     if profiler:
         profiler.start_step("url_collection", "Collecting and preparing URLs for processing")
     
-    text_splitter = TokenTextSplitter(chunk_size=128, chunk_overlap=32)
+    text_splitter = get_token_splitter(chunk_size=128, chunk_overlap=32)
     contexts = []
     rtr_docs = []
     used_urls = []
@@ -486,13 +504,14 @@ async def context_to_docs(
         sorted_urls = ''.join(sorted(all_urls_flat))
         collection_name = f"rag-chroma-{hashlib.md5(f'{sorted_urls}'.encode()).hexdigest()[:8]}"
         
-        # Process docs (needed for BM25 even if collection exists)
+        # Process docs (needed for BM25 even if collection exists). Mirrored/syndicated pages and
+        # repeated boilerplate sections are embedded only once
         all_docs = []
-        for docs in docs_map.values():
+        for docs in dedup_docs_map(docs_map).values():
             all_docs.extend(docs)
         
         if split:
-            all_docs = text_splitter.split_documents(all_docs)
+            all_docs = dedup_documents(chunk_documents(all_docs, chunk_size=128, chunk_overlap=32))
         
         if not all_docs:
             logger.warning("No documents found in local mode")
@@ -574,6 +593,13 @@ async def context_to_docs(
         
         return final_context, rtr_docs, total_docs
 
+    # Near-duplicates are dropped within each subquery's URLs only, so a page mirrored under
+    # another subquery still reaches this subquery's retrieval
+    subquery_docs_maps = [
+        dedup_docs_map({url: docs_map[url] for url in dict.fromkeys(urls or []) if url in docs_map})
+        for urls in urls_list
+    ]
+
     # Create async tasks for parallel URL processing (for non-local mode)
     async def process_url_async_wrapper(url, subquery_idx):
         """Async wrapper for process_url to handle individual URL processing"""
@@ -581,7 +607,7 @@ async def context_to_docs(
             logger.info(f"Starting async processing for URL: {url}")
             
             # Fetch docs from prefetch map if available, otherwise None (process_url will fetch)
-            pre_docs = docs_map.get(url) if docs_map else None
+            pre_docs = subquery_docs_maps[subquery_idx].get(url) if docs_map else None
             # Call the async version of process_url with pre-fetched docs
             context, retrieved_docs, docs, processed_url = await process_url(
                 url=url,
@@ -1018,7 +1044,8 @@ async def query_web_response(
     local_mode=False,
     split=True,
     vectordb=None,
-    quick_answer=False
+    quick_answer=False,
+    stream=None
 ):
     """
     Performs a web search and retrieves results, then generates a response based on those results.
@@ -1039,6 +1066,8 @@ async def query_web_response(
         local_mode (bool, optional): Whether to process local documents. Defaults to False.
         split (bool, optional): Whether to split documents into chunks. Defaults to True.
         quick_answer (bool, optional): Whether to force quick answer mode (disables summary mode). Defaults to False.
+        stream (ProgressStream, optional): If given, pipeline progress events and the answer's token
+            deltas are emitted on it. Defaults to None.
 
     Returns:
         tuple: Generated response, sources, search results, retrieved documents, and context.
@@ -1066,6 +1095,8 @@ async def query_web_response(
         search_response = [text.replace('"', '') for text in search_response]
         logger.info(f"Search phrases for query '{query}': {search_response}")
         profiler.add_metric('search_queries_generated', len(search_response))
+        if stream is not None:
+            stream.emit("progress", stage="plan", queries=search_response, summary=bool(is_summary))
     except Exception as e:
         logger.error(f"Error generating search response for query '{query}': {e}")
         profiler.end_step("Failed with error")
@@ -1196,6 +1227,8 @@ async def query_web_response(
             logger.info(f"Search results fetched for query '{query}'.")
             profiler.end_step(f"Found {len(search_results_urls)} URL groups with {sum(len(urls) for urls in search_results_urls)} total URLs")
             profiler.add_metric('urls_found', sum(len(urls) for urls in search_results_urls))
+            if stream is not None:
+                stream.emit("progress", stage="search", urls=[u for urls in search_results_urls for u in urls])
         except Exception as e:
             logger.error(f"Error fetching search results for query '{query}': {e}")
             profiler.end_step("Failed with error")
@@ -1223,6 +1256,9 @@ async def query_web_response(
         profiler.end_step(f"Generated context with {len(total_docs)} total documents")
         profiler.add_metric('docs_retrieved', len(total_docs))
         profiler.add_metric('context_length', len(context) if context else 0)
+        if stream is not None:
+            pages = {d.metadata.get('url') for d in total_docs if d.metadata.get('url')}
+            stream.emit("progress", stage="fetched", pages=len(pages), documents=len(total_docs))
     except Exception as e:
         logger.error(f"Error generating context for query '{query}': {e}")
         profiler.end_step("Failed with error")
@@ -1236,12 +1272,22 @@ async def query_web_response(
             logger.info(f"Generating Answer for query '{query}' using async response gen.")
             logger.info("Deduplicating context before response generation.")
             context = context.split("</content>")
-            context = " ".join(deduplicate_context([k+"</content>" for k in context]))
-           
-            response_1, sources = await response_gen(text_model, query, context)
+            context = pack_context(deduplicate_context([k+"</content>" for k in context]))
+            if stream is not None:
+                stream.emit("progress", stage="retrieval", sections=len(context))
+            context = " ".join(context)
+
+            if stream is not None:
+                response_1, sources = await response_gen_stream(text_model, query, context, stream)
+                used = dict.fromkeys(d.metadata.get('url') for d in total_docs if d.metadata.get('url'))
+                sources = '\n'.join([f'[{i}]. ' + s + '\n' for i, s in enumerate(used)])
+            else:
+                response_1, sources = await response_gen(text_model, query, context)
         else:
             logger.info(f"Generating summary for query '{query}' using async summarizer.")
-            response_1 = await summarizer(query, total_docs, text_model, 4)
+            if stream is not None:
+                stream.emit("progress", stage="retrieval", documents=len(total_docs))
+            response_1 = await summarizer(query, total_docs, text_model, stream=stream)
             sources = str(search_results_urls)
         try:
             log_results(query, context, '', '')
@@ -1260,15 +1306,19 @@ async def query_web_response(
     
     return response_1, sources, search_response, search_results, rtr_docs, total_docs, context
 
-async def url_to_markdown(url, executor, local_mode=False):
+async def url_to_markdown(url, executor, local_mode=False, pdf_max_pages=None, pdf_deadline=None):
     """
     Asynchronously converts a URL or local file to markdown using process_content.
     Handles both local files and HTTP URLs, with logging and error handling.
+    PDFs are converted page-parallel across the executor (see utils.pdf_utils).
 
     Args:
         url (str): The URL or local file path to process.
         executor (concurrent.futures.Executor): The executor for running blocking code.
         local_mode (bool, optional): If True, treat url as a local file. Defaults to False.
+        pdf_max_pages (int, optional): Page limit for PDFs. Defaults to PDF_MAX_PAGES for remote PDFs, none for local files.
+        pdf_deadline (float, optional): Conversion time budget in seconds for PDFs. Defaults to PDF_DEADLINE_SECONDS
+            for remote PDFs, none for local files.
 
     Returns:
         str or None: The processed markdown content, or None if an error occurred.
@@ -1282,24 +1332,62 @@ async def url_to_markdown(url, executor, local_mode=False):
                 logger.error(f"The file {url} does not exist.")
                 raise FileNotFoundError(f"The file {url} does not exist.")
             logger.info(f"Processing local file: {url}")
-            # Run process_content in executor for local file
-            markdown_content = await asyncio.get_event_loop().run_in_executor(
-                executor, process_content, url, content_type, content
-            )
         else:
             # Remote mode: fetch content from URL
             timeout = aiohttp.ClientTimeout(total=30)
             logger.info(f"Fetching URL: {url}")
             async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    content_type = response.headers.get('Content-Type', '')
-                    content = await response.read()
-                    logger.info(f"Fetched content from {url} with type {content_type}")
-                    # Run process_content in executor for URL content
-                    markdown_content = await asyncio.get_event_loop().run_in_executor(
-                        executor, process_content, url, content_type, content
-                    )
+                # Streamed in chunks with per-type size caps (see utils.fetch_utils)
+                content_type, content = await fetch_content(session, url)
+                logger.info(f"Fetched {len(content)} bytes from {url} with type {content_type}")
+
+        converter = get_converter(url, '' if local_mode else content_type)
+        cache = get_converter_cache()
+        cache_key = cache.key(converter, url, content, local=local_mode)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached markdown for: {url}")
+            return converter.prefix(url) + cached
+
+        semaphore = converter_semaphore(converter)
+        complete = True
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            if converter.name == 'pdf' and local_mode:
+                conversion = await pdf_to_markdown_async(
+                    url, executor, max_pages=pdf_max_pages, deadline=pdf_deadline
+                )
+                markdown_content = converter.prefix(url) + conversion.markdown
+                complete = conversion.complete
+            elif converter.name == 'pdf':
+                conversion = await pdf_bytes_to_markdown_async(
+                    content, executor,
+                    max_pages=PDF_MAX_PAGES if pdf_max_pages is None else pdf_max_pages,
+                    deadline=PDF_DEADLINE_SECONDS if pdf_deadline is None else pdf_deadline
+                )
+                markdown_content = converter.prefix(url) + conversion.markdown
+                complete = conversion.complete
+            elif local_mode:
+                # Run process_content in executor for local file
+                markdown_content = await asyncio.get_event_loop().run_in_executor(
+                    executor, process_content, url, content_type, content
+                )
+            else:
+                # Run process_content in executor for URL content; large bodies go through shared memory
+                with shared_payload(content) as payload:
+                    markdown_content = text_from_shared(await asyncio.get_event_loop().run_in_executor(
+                        executor, process_shared_content, url, content_type, payload
+                    ))
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        if complete:
+            # Cached without the URL prefix: other URLs serving the same bytes share the entry
+            cache.put(cache_key, markdown_content.removeprefix(converter.prefix(url)))
+        else:
+            # A page cap or deadline cut must not be served to later calls without those limits
+            logger.info(f"Not caching truncated PDF markdown for: {url}")
         logger.info(f"Processed markdown for: {url}")
         return markdown_content
     except FileNotFoundError as fnf:
@@ -1308,12 +1396,15 @@ async def url_to_markdown(url, executor, local_mode=False):
     except aiohttp.ClientError as ce:
         logger.error(f"HTTP error for {url}: {ce}")
         return None
+    except (ContentTooLargeError, UnsupportedContentError) as skip:
+        logger.warning(str(skip))
+        return None
     except Exception as e:
         logger.error(f"An error occurred processing {url}: {e}")
         # TODO: Add more granular error handling if needed (e.g., for content parsing)
         return None
 
-async def urls_to_docs(urls, local_mode=False, split=True):
+async def urls_to_docs(urls, local_mode=False, split=True, chunk_size=None, chunk_overlap=128):
     """
     Asynchronously converts a list of URLs to document objects, optionally from local files.
     Uses async and ProcessPoolExecutor for efficient parallel processing.
@@ -1321,6 +1412,10 @@ async def urls_to_docs(urls, local_mode=False, split=True):
     Args:
         urls (list): List of URLs to process.
         local_mode (bool, optional): Whether to process local files. Defaults to False.
+        split (bool, optional): Whether to split pages on markdown headers. Defaults to True.
+        chunk_size (int, optional): If given, pages are header- and token-chunked in one pass
+            (`chunk_markdown`) into chunks of at most this many tokens, and `split` is ignored.
+        chunk_overlap (int, optional): Token overlap between chunks. Defaults to 128.
 
     Returns:
         list: List of processed document objects.
@@ -1358,32 +1453,10 @@ async def urls_to_docs(urls, local_mode=False, split=True):
 
             try:
               
-                headers_to_split_on = [
-                    ("#", "Header 1"),
-                    ("##", "Header 2"),
-                    ("###", "Header 3"),
-                    
-                
-                ]
-                markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-                # Further split for granular sections using regex (e.g., tables, code blocks)
-                
-                if split:
-                    split_docs = markdown_splitter.split_text(result)
+                if chunk_size:
+                    split_docs = chunk_markdown(result, url, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
                 else:
-                    split_docs = [Document(page_content=result)]
-                
-                # if split:
-                #     split_docs = markdown_splitter.split_text(result)
-                    
-                # else:
-                #     split_docs = [Document(page_content=result)]
-                for i, d in enumerate(split_docs):
-                    split_docs[i].metadata['source'] = url + ' Section: ' + split_docs[i].metadata.get('Header 1', '') +\
-                        ' ' + split_docs[i].metadata.get('Header 2', '') + ' ' + split_docs[i].metadata.get('Header 3', '') 
-                    split_docs[i].metadata['url'] = url
-                    split_docs[i].page_content = ' Section: ' + split_docs[i].metadata.get('Header 1', '') +\
-                        ' ' + split_docs[i].metadata.get('Header 2', '') + ' ' + split_docs[i].metadata.get('Header 3', '') + '<content>' + split_docs[i].page_content.strip() + '</content>'
+                    split_docs = markdown_to_docs(result, url, split=split)
 
                 docs_map[url].extend(split_docs)
                
@@ -1413,58 +1486,124 @@ async def urls_to_docs(urls, local_mode=False, split=True):
     logger.info(f"urls_to_docs completed in {urls_total_time:.3f}s: {total_docs} documents from {len(unique_urls)} {mode_str}, avg {avg_words:.1f} words/doc")
     return docs_map
 
-def youtube_transcript_response(query, task, model,n=3):
+def _fetch_transcript(url, video_id):
+    """Downloads a video's transcript (blocking, run in a thread). Returns (text, source) or (None, None)."""
+    try:
+        md = MarkItDown(enable_plugins=False) # Set to True to enable plugins
+        result = md.convert(url)
+        return result.text_content, 'markitdown'
+    except Exception:
+        try:
+            srt = YouTubeTranscriptApi.get_transcript(video_id)
+            return ' '.join([s['text'] for s in srt]), 'transcript_api'
+        except Exception as e:
+            logger.error(f"Error fetching transcript for {url}: {e}")
+            return None, None
+
+
+def _load_transcript(url, video_id, title=''):
+    """Returns the transcript chunks of a video from the transcript store, downloading and storing them if needed."""
+    store = get_transcript_store() if video_id else None
+    if store is not None:
+        chunks = store.get(video_id)
+        if chunks is not None:
+            logger.info(f"Transcript store hit for video {video_id} ({len(chunks)} chunks)")
+            return chunks
+    text, source = _fetch_transcript(url, video_id)
+    if not text:
+        return None
+    chunks = split_text_on_tokens(text, chunk_size=TRANSCRIPT_CHUNK_TOKENS, chunk_overlap=0, use_cache=False)
+    if store is not None:
+        store.put(video_id, chunks, title=title, source=source)
+    return chunks
+
+
+_transcript_tasks = {}
+
+
+async def get_video_transcript(url, video_id, title=''):
+    """
+    Returns a video's transcript as token chunks. Concurrent requests for the same video share one download.
+
+    Args:
+        url (str): The video URL.
+        video_id (str): The YouTube video ID (key of the transcript store).
+        title (str, optional): Video title stored alongside the transcript.
+
+    Returns:
+        list or None: The transcript chunks, or None if no transcript is available.
+    """
+    key = video_id or url
+    task = _transcript_tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(asyncio.to_thread(_load_transcript, url, video_id, title))
+        _transcript_tasks[key] = task
+        task.add_done_callback(lambda _: _transcript_tasks.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _summarize_video(url, video_id, task, model, semaphore, title=''):
+    chunks = await get_video_transcript(url, video_id, title)
+    if not chunks:
+        return None
+    try:
+        async with semaphore:
+            if len(chunks) == 1:
+                prompt = prompts['youtube_summary_prompt'].format(task=task, transcript=chunks[0])
+                response = await model.ainvoke(prompt)
+                return response.content
+            # Long transcript: map-reduce over its chunks
+            logger.info(f"Summarizing long transcript of {url} ({len(chunks)} chunks)")
+            docs = [Document(chunk, metadata={'source': url}) for chunk in chunks]
+            summary = await summarizer(task, docs, model)
+            return None if summary == 'SUMMARIZATION FAILED' else summary
+    except Exception as e:
+        logger.error(f"Error summarizing YouTube video {url}: {e}")
+        return None
+
+
+async def youtube_transcript_response(query, task, model, n=3):
+    """
+    Summarizes YouTube videos for a task: the video linked in `query`, or the top `n` search results
+    for it. Transcripts come from the transcript store or are fetched concurrently in threads, and
+    videos are summarized concurrently (at most YOUTUBE_SUMMARY_CONCURRENCY at once); transcripts
+    longer than one stored chunk are summarized map-reduce.
+
+    Args:
+        query (str): A YouTube URL or a search query.
+        task (str): What to do with the transcripts (e.g. "Summarise for ...").
+        model: The language model used for summarization.
+        n (int, optional): Number of videos to summarize for a search query. Defaults to 3.
+
+    Returns:
+        str: The summaries of the videos.
+    """
+    semaphore = asyncio.Semaphore(YOUTUBE_SUMMARY_CONCURRENCY)
     overall_context = ''
     if "youtube.com" in query:
-        try:
-            md = MarkItDown(enable_plugins=False) # Set to True to enable plugins
-            result = md.convert(query)
-            prompt = result.text_content 
-            prompt = prompts['youtube_summary_prompt'].format(task=task, transcript=prompt)
-        except:
-            try:
-                video_id = query.split("=")[1]
-                srt = YouTubeTranscriptApi.get_transcript(video_id)
-                transcript = ' '.join([s['text'] for s in srt])
-                prompt = prompts['youtube_summary_prompt'].format(task=task, transcript=transcript)
-            except Exception as e:
-                logger.error(f"Error summarizing URL {url}: {e}")
-                return "Error generating summary."
-        response = model.invoke(prompt)
-        response = response.content
+        video_id = youtube_video_id(query)
+        response = await _summarize_video(query, video_id, task, model, semaphore)
+        if response is None:
+            return "Error generating summary."
         overall_context = overall_context + f"\n\nVideo: {query}\nTranscript Summary: {response}\n\n"
     else:
         try:
-            videos = json.loads(YoutubeSearch(query, max_results=10).to_json())['videos'][:n]
-        except:
+            search = await asyncio.to_thread(lambda: YoutubeSearch(query, max_results=10).to_json())
+            videos = json.loads(search)['videos'][:n]
+        except Exception:
             logger.error("error with youtube search")
             return "Error generating summary."
-        for k in videos:
-            video_id = k['id']
-            title = k['title']  
-            channel = k['channel']
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            logger.info(f"Found YouTube video: {title} by {channel} at {url}")
-            try:
-                md = MarkItDown(enable_plugins=False) # Set to True to enable plugins
-                result = md.convert(url)
-                prompt = result.text_content 
-                prompt = prompts['youtube_summary_prompt'].format(task=task, transcript=prompt)
-            except:
-                try:
-                    srt = YouTubeTranscriptApi.get_transcript(video_id)
-                    transcript = ' '.join([s['text'] for s in srt])
-                    prompt = prompts['youtube_summary_prompt'].format(task=task, transcript=transcript)
-                    
-                except:
-                    logger.error("error with youtube video")
-            try:
-                response = model.invoke(prompt)
-                response = response.content
-            except:
-                logger.error("error with LLM")
-            overall_context += f"\n\nVideo: {title} by {channel}\nURL: {url}\nTranscript Summary: {response}\n\n"
-    print(f"Generated YouTube context for query '{query}': {overall_context}")
+        urls = [f"https://www.youtube.com/watch?v={k['id']}" for k in videos]
+        for k, url in zip(videos, urls):
+            logger.info(f"Found YouTube video: {k['title']} by {k['channel']} at {url}")
+        responses = await asyncio.gather(*[
+            _summarize_video(url, k['id'], task, model, semaphore, title=k['title']) for k, url in zip(videos, urls)
+        ])
+        for k, url, response in zip(videos, urls, responses):
+            if response is None:
+                continue
+            overall_context += f"\n\nVideo: {k['title']} by {k['channel']}\nURL: {url}\nTranscript Summary: {response}\n\n"
+    logger.info(f"Generated YouTube context for query '{query}': {len(overall_context)} characters")
     return overall_context
 
 def generate_doc_hash(text):
@@ -1479,7 +1618,7 @@ def generate_doc_hash(text):
     """
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-async def summary_of_url(query, url, model, local_mode=False):
+async def summary_of_url(query, url, model, local_mode=False, stream=None):
     """
     Generates a summary of the content at the specified URL or local file path.
 
@@ -1488,6 +1627,8 @@ async def summary_of_url(query, url, model, local_mode=False):
         url (str): The URL or local file path to summarize.
         model: The language model to use for generating the summary.
         local_mode (bool, optional): If True, treat url as a local file. Defaults to False.
+        stream (ProgressStream, optional): If given, progress events and the summary's token
+            deltas are emitted on it. Defaults to None.
 
     Returns:
         str: The generated summary of the content.
@@ -1504,10 +1645,15 @@ async def summary_of_url(query, url, model, local_mode=False):
         if not docs:
             logger.warning(f"No documents found for URL: {url}")
             return "No content found to summarize."
+        if stream is not None:
+            stream.emit("progress", stage="fetched", pages=len(urls), documents=len(docs))
         content= ''
         for d in docs:
             content = content + 'source:' + url  + '\n<content>' + d.page_content + '</content>'
-        summary = await model.ainvoke(f"Summarise the following content to answer {query}:\n{content}")
+        prompt = f"Summarise the following content to answer {query}:\n{content}"
+        if stream is not None:
+            return await astream_text(model, prompt, stream)
+        summary = await model.ainvoke(prompt)
         return summary.content
     except Exception as e:
         logger.error(f"Error summarizing URL {url}: {e}")
@@ -1599,15 +1745,16 @@ def deduplicate_context(context):
     Deduplicates sections in the context based on their content.
     content is in page_content and in <content></content> tags. in sequence, first one stays
     and connects later duplicates are removed. there can be content before and after content so first extract the content
+    Exact duplicates are dropped by hash, near-duplicates (mirrored or lightly edited text) by MinHash.
     """
     seen_hashes = set()
     deduped_context = []
     for doc in context:     
-        content_match = re.search(r'<content>(.*?)</content>', doc, re.DOTALL)
-        content_text = content_match.group(1).strip() if content_match else doc.strip()
+        content_text = section_text(doc)
         doc_hash = generate_doc_hash(content_text)
         if doc_hash not in seen_hashes:
             seen_hashes.add(doc_hash)
             deduped_context.append(doc)
+    deduped_context = filter_near_duplicates(deduped_context, section_text)
     logger.info(f"Deduplicated context: {len(context)} -> {len(deduped_context)} documents")
     return deduped_context
\ No newline at end of file